@@ -0,0 +1,100 @@
+"""
+Memory benchmark of the copy-on-write hot path: tracemalloc peak and wall time of
+road.map.calculate_differences and transit.simwrapper_table.append_group_totals on
+synthetic inputs, with pandas copy-on-write off and on. Each mode runs in its own
+process, as copy-on-write has to be set before the frames are built.
+
+    python benchmarks/memory_copy_on_write.py --links 100000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+time_periods = ['AM', 'MD', 'PM', 'EV', 'EA', 'Daily']
+
+
+def synthetic_counts(n_links, rng):
+    # Estimated and observed volumes of the same count links, node ids as read from csv
+    est_df = pd.DataFrame({'A': rng.integers(1, 10**6, n_links), 'B': rng.integers(1, 10**6, n_links)})
+    for period in time_periods:
+        est_df[period] = rng.random(n_links) * 1000
+    est_df['Loc Type'] = rng.choice(['SF', 'Other'], n_links)
+    obs_df = est_df.copy()
+    obs_df[time_periods] = obs_df[time_periods] * 1.1
+    return est_df, obs_df
+
+
+def synthetic_stations(n_stations, n_groups, rng):
+    # BART station table and station groups of `n_groups` stations each
+    stations = [f'S{i}' for i in range(n_stations)]
+    df = pd.DataFrame({
+        'Station': stations,
+        'Observed': rng.random(n_stations) * 10000,
+        'Modeled': rng.random(n_stations) * 10000,
+    })
+    groups = {f'Group {i}': list(rng.choice(stations, min(n_groups, n_stations), replace=False))
+              for i in range(n_groups)}
+    return df, groups
+
+
+def measure(func, *args):
+    # Peak traced memory (MB) of one call, and wall time (s) of an untraced call, as
+    # tracing slows down the allocation-heavy csv writer many times over
+    start = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6, seconds
+
+
+def run_mode(copy_on_write, n_links, n_stations, n_groups):
+    pd.set_option('mode.copy_on_write', copy_on_write)
+    from road.map import calculate_differences
+    from transit.simwrapper_table import append_group_totals
+
+    rng = np.random.default_rng(0)
+    est_df, obs_df = synthetic_counts(n_links, rng)
+    stations_df, station_groups = synthetic_stations(n_stations, n_groups, rng)
+    results = {}
+    results['calculate_differences'] = measure(calculate_differences, est_df, obs_df, os.devnull)
+    results['append_group_totals'] = measure(append_group_totals, stations_df, station_groups)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='tracemalloc benchmark of copy-on-write on the hot path.')
+    parser.add_argument('--links', type=int, default=100000, help='Number of synthetic count links.')
+    parser.add_argument('--stations', type=int, default=50000, help='Number of synthetic BART stations.')
+    parser.add_argument('--groups', type=int, default=50, help='Number of station groups.')
+    parser.add_argument('--mode', choices=['on', 'off'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Worker process of one copy-on-write mode
+        print(json.dumps(run_mode(args.mode == 'on', args.links, args.stations, args.groups)))
+        sys.exit()
+
+    rows = []
+    for mode in ['off', 'on']:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--links', str(args.links),
+             '--stations', str(args.stations), '--groups', str(args.groups)],
+            check=True, capture_output=True, text=True).stdout
+        for function, (peak, seconds) in json.loads(output.splitlines()[-1]).items():
+            rows.append({'Function': function, 'Copy-on-write': mode, 'Peak MB': round(peak, 1),
+                         'Seconds': round(seconds, 2)})
+    print(pd.DataFrame(rows).sort_values(['Function', 'Copy-on-write'], ascending=[True, False])
+          .to_string(index=False))
@@ -1,14 +1,38 @@
 import toml
+import copy
 import string
 import pandas as pd
 import argparse
 import sys, os, subprocess
+from functools import partial
 from pathlib import Path
-from road.dataprocess import generate_loaded_network_file_names, filter_and_aggregate
-from road.scatter import compute_and_save_errors, generate_vega_lite_json_est, generate_vega_lite_json_diffpercent
-from road.stats import prepare_time_period_dfs, generate_and_save_tables
-from road.map import calculate_differences, process_geospatial_data
+from road.dataprocess import (generate_loaded_network_file_names, filter_and_aggregate, read_base_counts,
+                              aggregate_loaded_network, map_at_ft_groups, apply_count_crosswalk)
+from road.scatter import compute_and_save_errors, compute_and_save_period_errors, generate_vega_lite_json_est, generate_vega_lite_json_diffpercent
+from road.stats import prepare_time_period_dfs, generate_and_save_tables, percent_rmse_summary
+from road.bootstrap import save_bootstrap_tables
+from road.map import calculate_differences, process_geospatial_data, export_zoom_levels
 from road.screenline import generate_screenline_data
+from road.snap import build_count_crosswalk
+from road.manifest import (frame_fingerprint, load_manifest, report_stages, run_stage, save_manifest,
+                           stage_key)
+from shared.inputs import load_static_inputs, network_fingerprint, read_static_csv, set_static_inputs
+from shared.runtime import (batch_run_name, run_batch, serve_validation, watch_files, write_run_comparison)
+from transit.engine import set_backend
+
+# Copy-on-write: selections and derived frames share memory until one of them is modified
+pd.set_option('mode.copy_on_write', True)
+
+# Groups of the headline %RMSE metrics of a run (batch comparison and service summaries)
+summary_group_vars = ['FT Group', 'AT Group']
+
+# Stages of validation_road tracked in the manifest, and the cache of the loaded frames
+road_stages = ['snap', 'frames', 'scatter', 'stats', 'map', 'screenline']
+road_frames_cache = os.path.join('.cache', 'road_frames.pkl')
+snapped_counts_cache = os.path.join('.cache', 'snapped_counts.csv')
+
+def road_module(name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'road', f'{name}.py')
 
 def csv_col_letter_to_num(letter):
     num = 0
@@ -27,6 +51,36 @@ def scatter_plot_output(est_df, obs_df, chosen_timeperiod, combined_df_cols, cla
     select_time_period_loc_df, classification_col_types, file_name = compute_and_save_errors(
         est_df, obs_df, chosen_timeperiod, combined_df_cols, classification_col, output_file_name)
 
+    scatter_specs_output(file_name, classification_col, classification_col_types,
+                         fields1, nominal_fields1, x_field1, y_field1, name1,
+                         fields2, nominal_fields2, x_field2, y_field2, name2,
+                         vega_est_output_path, vega_diffpercent_output_path)
+
+
+def period_scatter_plot_output(est_df, obs_df, periods, combined_df_cols, classification_col, output_file_name,
+                               fields1, nominal_fields1, x_field1, y_field1, name1, 
+                               fields2, nominal_fields2, x_field2, y_field2, name2,
+                               vega_est_output_path, vega_diffpercent_output_path):
+
+    # Calculate the metrics of all periods into one long dataset
+    period_loc_df, classification_col_types, file_name = compute_and_save_period_errors(
+        est_df, obs_df, periods, combined_df_cols, classification_col, output_file_name)
+
+    # Generate the Scatter plots of each period, filtered from the same dataset
+    for period in periods:
+        scatter_specs_output(file_name, classification_col, classification_col_types,
+                             fields1, nominal_fields1, x_field1, y_field1, name1,
+                             fields2, nominal_fields2, x_field2, y_field2, name2,
+                             vega_est_output_path, vega_diffpercent_output_path,
+                             period=period)
+
+
+def scatter_specs_output(file_name, classification_col, classification_col_types,
+                         fields1, nominal_fields1, x_field1, y_field1, name1,
+                         fields2, nominal_fields2, x_field2, y_field2, name2,
+                         vega_est_output_path, vega_diffpercent_output_path,
+                         period=None):
+
     # Generate the Scatter plots required files
     for types in classification_col_types:
         # Generate est vs obs scatter plot
@@ -39,7 +93,8 @@ def scatter_plot_output(est_df, obs_df, chosen_timeperiod, combined_df_cols, cla
             fields1,
             nominal_fields1,
             name1,
-            vega_est_output_path)
+            vega_est_output_path,
+            period=period)
         # Generate percent errors vs obs scatter plot
         generate_vega_lite_json_diffpercent(
             file_name,
@@ -50,7 +105,8 @@ def scatter_plot_output(est_df, obs_df, chosen_timeperiod, combined_df_cols, cla
             fields2,
             nominal_fields2,
             name2,
-            vega_diffpercent_output_path)
+            vega_diffpercent_output_path,
+            period=period)
 
     # Generate scatter plots for all data
     generate_vega_lite_json_est(
@@ -63,7 +119,8 @@ def scatter_plot_output(est_df, obs_df, chosen_timeperiod, combined_df_cols, cla
         nominal_fields1,
         name1,
         vega_est_output_path,
-        include_all_data=True)
+        include_all_data=True,
+        period=period)
     
     generate_vega_lite_json_diffpercent(
         file_name,
@@ -75,7 +132,8 @@ def scatter_plot_output(est_df, obs_df, chosen_timeperiod, combined_df_cols, cla
         nominal_fields2,
         name2,
         vega_diffpercent_output_path,
-        include_all_data=True,)
+        include_all_data=True,
+        period=period)
 
 
 
@@ -91,11 +149,37 @@ def scatter_plot(est_df, obs_df, chosen_timeperiod, combined_df_cols, classifica
     return
 
 
-def validation_road(config):
-    # Output directory
-    outdir = config['OUTPUT']['directory']
-    Path(outdir).mkdir(parents=True, exist_ok=True)
-    
+def at_ft_mappings(config):
+    # Load mappings from the config file
+    at_mapping = config['AT']
+    ft_mapping = config['FT']
+    # Assuming 'AT' and 'FT' contain integer keys or some keys you can map
+    at_mapping_dict = {int(k): v for k, v in at_mapping.items()}
+    ft_mapping_dict = {int(k): v for k, v in ft_mapping.items()}
+    return at_mapping_dict, ft_mapping_dict
+
+
+def convert_loaded_network(loaded_network_directory, loaded_network_file):
+    # CHAMP writes the loaded networks as LOAD{tod}_FINAL.NET, converted to csv with NETtoCSV_TNC.s
+    # when the csv is missing or older than the .NET (e.g. left by a previous run)
+    p = Path(loaded_network_directory) / loaded_network_file
+    net = p.with_suffix('.NET')
+    if not p.exists() or (net.exists() and net.stat().st_mtime > p.stat().st_mtime):
+        # CUBENET is passed to this runtpp only, served runs convert their networks on concurrent threads
+        env = {**os.environ, 'CUBENET': loaded_network_file.replace('.csv','')}
+        cmd = "runtpp {}/scripts/summarize/NETtoCSV_TNC.s".format(os.environ['CHAMPVERSION'])
+        proc = subprocess.Popen( cmd, 
+                                 cwd=loaded_network_directory, 
+                                 env=env,
+                                 stdout=subprocess.PIPE, 
+                                 stderr=subprocess.PIPE,
+                                 shell=True )
+        r = proc.wait()
+        print(r)
+    return p
+
+
+def load_road_frames(config):
     # Extract the CHAMP input file names
     loaded_network_directory = config['LOADED_NETWORK']['path']
     loaded_network_files_time = config['LOADED_NETWORK']['timeperiods']
@@ -105,23 +189,8 @@ def validation_road(config):
     loaded_network_files = generate_loaded_network_file_names(loaded_network_files_time)
     
     for f in loaded_network_files:
-        p = Path(loaded_network_directory) / f
-        if not p.exists():
-            os.environ['CUBENET'] = f.replace('.csv','')
-            cmd = "runtpp {}/scripts/summarize/NETtoCSV_TNC.s".format(os.environ['CHAMPVERSION'])
-            proc = subprocess.Popen( cmd, 
-                                     cwd=loaded_network_directory, 
-                                     stdout=subprocess.PIPE, 
-                                     stderr=subprocess.PIPE,
-                                     shell=True )
-            r = proc.wait()
-            print(r)
-    # Load mappings from the config file
-    at_mapping = config['AT']
-    ft_mapping = config['FT']
-    # Assuming 'AT' and 'FT' contain integer keys or some keys you can map
-    at_mapping_dict = {int(k): v for k, v in at_mapping.items()}
-    ft_mapping_dict = {int(k): v for k, v in ft_mapping.items()}
+        convert_loaded_network(loaded_network_directory, f)
+    at_mapping_dict, ft_mapping_dict = at_ft_mappings(config)
 
     # Extract the observed file name and tab
     obs_filepath = config['OBSERVED_COUNTS']['obs_filepath']
@@ -131,7 +200,7 @@ def validation_road(config):
     obs_usecols = config['OBSERVED_COUNTS']['obs_usecols']
 
     # Read the Obs data and the CHAMP estimation data
-    obs_df = pd.read_csv(
+    obs_df = read_static_csv(
         obs_filepath,
         usecols=obs_usecols)
     est_df = filter_and_aggregate(
@@ -142,13 +211,101 @@ def validation_road(config):
         loaded_network_files_time,
         extra_columns,
         at_mapping_dict,
-        ft_mapping_dict)
+        ft_mapping_dict,
+        config['LOADED_NETWORK'].get('chunksize'))
+    return obs_df, est_df
+
+
+def road_summary(config, obs_df, est_df, period='Daily'):
+    # Headline metrics of a run: %RMSE by FT and AT group (daily by default)
+    time_period_dfs = prepare_time_period_dfs(
+        est_df, obs_df, [period], config['STATS_INPUT']['combined_df_cols'])
+    return percent_rmse_summary(time_period_dfs, summary_group_vars, period)
+
+
+def road_stage_key(config, tables, files=(), upstream=()):
+    # Content address of a road.py stage, the road modules it runs are part of its input files
+    return stage_key({table: config[table] for table in tables}, files, upstream)
+
+
+def cached_road_frames(config, manifest, outdir):
+    # The Obs data and the CHAMP estimation data, reused from the frames cache when the
+    # observed counts and loaded networks are unchanged. The AT/FT groups are mapped again,
+    # so editing the mappings does not aggregate the loaded networks again. The .NET files
+    # are converted first, so a CHAMP rerun is not keyed on the csvs of the previous run
+    loaded_network_files = [
+        convert_loaded_network(config['LOADED_NETWORK']['path'], f)
+        for f in generate_loaded_network_file_names(config['LOADED_NETWORK']['timeperiods'])]
+    key = road_stage_key(
+        config, ['LOADED_NETWORK', 'OBSERVED_COUNTS'],
+        [config['OBSERVED_COUNTS']['obs_filepath'], *loaded_network_files, road_module('dataprocess')])
+    cache_path = os.path.join(outdir, road_frames_cache)
+    Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+    run_stage(manifest, 'frames', key, outdir,
+              lambda: pd.to_pickle(load_road_frames(config), cache_path))
+    obs_df, est_df = pd.read_pickle(cache_path)
+    return obs_df, map_at_ft_groups(est_df, *at_ft_mappings(config))
+
+
+def snapped_counts_config(config, force=False):
+    # With [SNAP], the counts are located by their coordinates: they are snapped to the freeflow
+    # links (rebuilt only when the counts, the network or [SNAP] change), and the config returned
+    # reads the counts with the A/B of the count crosswalk
+    if 'SNAP' not in config:
+        return config
+    outdir = config['OUTPUT']['directory']
+    Path(outdir, snapped_counts_cache).parent.mkdir(parents=True, exist_ok=True)
+    manifest_name = config['OUTPUT'].get('manifest')
+    manifest_path = os.path.join(outdir, manifest_name) if manifest_name else None
+    manifest = {} if force else load_manifest(manifest_path)
+
+    obs_filepath = config['OBSERVED_COUNTS']['obs_filepath']
+    freeflow_path = config['MAP_INPUT']['freeflow_dir']
+    crosswalk_path = os.path.join(outdir, config['SNAP'].get('crosswalk', 'count_crosswalk.csv'))
+    run_stage(manifest, 'snap',
+              road_stage_key(config, ['SNAP'], [obs_filepath, road_module('snap')],
+                             [network_fingerprint(freeflow_path)]),
+              outdir, lambda: build_count_crosswalk(obs_filepath, freeflow_path, config['SNAP'], crosswalk_path))
+    if manifest_path:
+        save_manifest(manifest_path, manifest)
+
+    snapped_config = copy.deepcopy(config)
+    snapped_config['OBSERVED_COUNTS']['obs_filepath'] = apply_count_crosswalk(
+        obs_filepath, crosswalk_path, config['SNAP'].get('id_column', 'Source ID'),
+        os.path.join(outdir, snapped_counts_cache))
+    return snapped_config
+
+
+def validation_road(config, frames=None, force=False):
+    set_backend(**config.get('ENGINE', {}))
+
+    # Output directory
+    outdir = config['OUTPUT']['directory']
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+
+    # Manifest of the stage inputs of the previous run, stages with unchanged inputs are skipped
+    manifest_name = config['OUTPUT'].get('manifest')
+    manifest_path = os.path.join(outdir, manifest_name) if manifest_name else None
+    manifest = {} if force else load_manifest(manifest_path)
+
+    # The Obs data and the CHAMP estimation data, unless already loaded
+    if frames is not None:
+        obs_df, est_df = frames
+    elif manifest_path:
+        obs_df, est_df = cached_road_frames(config, manifest, outdir)
+    else:
+        obs_df, est_df = load_road_frames(config)
+    frames_fingerprint = frame_fingerprint(obs_df, est_df)
+    obs_filepath = config['OBSERVED_COUNTS']['obs_filepath']
 
     # Part 1 - Scatter Plot Variables
     chosen_timeperiod = config['SCATTER_INPUT']['chosen_period']
     classification_col = config['SCATTER_INPUT']['classification_col']
     combined_df_cols = config['SCATTER_INPUT']['combined_df_cols']
     output_file_name = os.path.join(outdir, config['SCATTER_INPUT']['output_file_name'])
+    # Optional multi-period scatter: one long dataset with a 'Period' column for all periods
+    scatter_periods = config['SCATTER_INPUT'].get('periods', [])
+    period_output_file_name = os.path.join(outdir, config['SCATTER_INPUT'].get('period_output_file_name', 'scatter_periods.csv'))
 
     fields1 = config['EST_SCATTER_PLOT']['fields']
     nominal_fields1 = config['EST_SCATTER_PLOT']['nominal_fields']
@@ -168,36 +325,157 @@ def validation_road(config):
 
     # Part 2 - Validation Stats Variables
     combined_df_cols_stats = config['STATS_INPUT']['combined_df_cols']
-    group_vars = ['Observed Volume Category', 'Loc Type', 'AT Group', 'FT Group']
+    group_vars = config['STATS_INPUT'].get('group_vars', ['Observed Volume Category', 'Loc Type', 'AT Group', 'FT Group'])
+    stats_workers = config['STATS_INPUT'].get('workers')
     times = ['Daily', 'AM', 'MD', 'PM', 'EV', 'EA']
     output_file_name = os.path.join(outdir, config['STATS_INPUT']['output_file_name'])
+    bootstrap_resamples = config['STATS_INPUT'].get('bootstrap_resamples', 0)
 
     # Part 3 - Map Variables
     freeflow_path = config['MAP_INPUT']['freeflow_dir']
     shp_output_path = os.path.join(outdir, config['MAP_INPUT']['shp_out_dir'])
     output_name = os.path.join(outdir, config['MAP_INPUT']['output_filename'])
+    map_format = config['MAP_INPUT'].get('map_format')
+    zoom_levels = config['MAP_INPUT'].get('zoom_levels', [])
+    zoom_summary_path = os.path.join(outdir, config['MAP_INPUT'].get('zoom_summary', 'map_zoom_levels.csv'))
     
     # Part 1 - Scatter Plot
-    scatter_plot(est_df, obs_df, chosen_timeperiod, combined_df_cols, classification_col, output_file_name,
-                 fields1, nominal_fields1, x_field1, y_field1, name1, 
-                 fields2, nominal_fields2, x_field2, y_field2, name2,
-                 vega_est_output_path, vega_diffpercent_output_path)
+    def scatter_stage():
+        scatter_plot(est_df, obs_df, chosen_timeperiod, combined_df_cols, classification_col, output_file_name,
+                     fields1, nominal_fields1, x_field1, y_field1, name1, 
+                     fields2, nominal_fields2, x_field2, y_field2, name2,
+                     vega_est_output_path, vega_diffpercent_output_path)
+        if scatter_periods:
+            period_scatter_plot_output(est_df, obs_df, scatter_periods, combined_df_cols, classification_col, period_output_file_name,
+                                       fields1, nominal_fields1, x_field1, y_field1, name1, 
+                                       fields2, nominal_fields2, x_field2, y_field2, name2,
+                                       vega_est_output_path, vega_diffpercent_output_path)
 
     # Part 2 - Validation Stats
     time_period_dfs = prepare_time_period_dfs(
         est_df, obs_df, times, combined_df_cols_stats)
-    generate_and_save_tables(outdir, time_period_dfs, group_vars)
+
+    def stats_stage():
+        generate_and_save_tables(outdir, time_period_dfs, group_vars, stats_workers)
+        if bootstrap_resamples:
+            save_bootstrap_tables(outdir, time_period_dfs, group_vars, bootstrap_resamples,
+                                  config['STATS_INPUT'].get('bootstrap_confidence', 0.95),
+                                  config['STATS_INPUT'].get('bootstrap_seed', 0))
 
     # Part 3 - Map
+    def map_stage():
+        map_gdf = process_geospatial_data(merged_df, freeflow_path, shp_output_path, map_format)
+        if zoom_levels:
+            export_zoom_levels(map_gdf, shp_output_path, zoom_levels, zoom_summary_path, map_format)
+
+    run_stage(manifest, 'scatter',
+              road_stage_key(config, ['OUTPUT', 'SCATTER_INPUT', 'EST_SCATTER_PLOT', 'PERCENT_SCATTER_PLOT'],
+                             [road_module('scatter'), road_module('validation_road_utils')], [frames_fingerprint]),
+              outdir, scatter_stage)
+    run_stage(manifest, 'stats',
+              road_stage_key(config, ['OUTPUT', 'STATS_INPUT'],
+                             [road_module('stats'), road_module('bootstrap'), road_module('validation_road_utils')],
+                             [frames_fingerprint]),
+              outdir, stats_stage)
     merged_df = calculate_differences(est_df, obs_df, output_name)
-    process_geospatial_data(merged_df, freeflow_path, shp_output_path)
-    
+    run_stage(manifest, 'map',
+              road_stage_key(config, ['OUTPUT', 'MAP_INPUT'],
+                             [road_module('map')], [frames_fingerprint, network_fingerprint(freeflow_path)]),
+              outdir, map_stage)
+
     # Part 4 - Screenline
-    generate_screenline_data(obs_filepath, output_name, outdir)
+    run_stage(manifest, 'screenline',
+              road_stage_key(config, ['OUTPUT', 'OBSERVED_COUNTS'],
+                             [obs_filepath, road_module('screenline')], [frames_fingerprint]),
+              outdir, lambda: generate_screenline_data(obs_filepath, merged_df, outdir))
+
+    if manifest_path:
+        report_stages(manifest, [stage for stage in road_stages if stage in manifest])
+        save_manifest(manifest_path, manifest)
+    return percent_rmse_summary(time_period_dfs, summary_group_vars)
+
+
+def road_run_config(config, run_dir):
+    # Config of one model run of a batch or service, written to <OUTPUT directory>/<run name>
+    run_config = copy.deepcopy(config)
+    run_config['LOADED_NETWORK']['path'] = str(run_dir)
+    run_config['OUTPUT']['directory'] = os.path.join(config['OUTPUT']['directory'], batch_run_name(run_dir))
+    return run_config
+
+
+def validate_road_run(config, run_dir):
+    return validation_road(road_run_config(config, run_dir))
+
+
+def serve_road_run(config, run_dir):
+    # Summary of a run right away, the dashboard outputs are written in the background
+    run_config = road_run_config(config, run_dir)
+    obs_df, est_df = load_road_frames(run_config)
+    summary = road_summary(run_config, obs_df, est_df)
+    return summary, partial(validation_road, run_config, (obs_df, est_df))
+
+
+def watch_road(config, poll_seconds=30, stable_polls=2):
+    # Aggregate each time period's loaded network as soon as CHAMP has finished writing its
+    # LOAD{tod}_FINAL.NET (converted to csv first), with the %RMSE of the periods so far in the
+    # watch progress csv, and run the full validation (Daily totals included) once the last
+    # period has arrived
+    outdir = config['OUTPUT']['directory']
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    progress_path = os.path.join(outdir, config['OUTPUT'].get('watch_progress', 'watch_progress.csv'))
+
+    loaded_network_directory = config['LOADED_NETWORK']['path']
+    loaded_network_files_time = config['LOADED_NETWORK']['timeperiods']
+    loaded_network_column_names = config['LOADED_NETWORK']['columns']
+    loaded_network_files = generate_loaded_network_file_names(loaded_network_files_time)
+    at_mapping_dict, ft_mapping_dict = at_ft_mappings(config)
+
+    obs_filepath = config['OBSERVED_COUNTS']['obs_filepath']
+    obs_df = read_static_csv(obs_filepath, usecols=config['OBSERVED_COUNTS']['obs_usecols'])
+    est_df = read_base_counts(obs_filepath, config['OBSERVED_COUNTS']['obs_extra_columns'], loaded_network_files_time)
+    progress = []
+
+    def aggregate_period(period, loaded_network_net_path):
+        loaded_network_file_path = convert_loaded_network(
+            loaded_network_directory, loaded_network_net_path.with_suffix('.csv').name)
+        aggregate_loaded_network(est_df, loaded_network_file_path, loaded_network_column_names, period,
+                                 config['LOADED_NETWORK'].get('chunksize'))
+        map_at_ft_groups(est_df, at_mapping_dict, ft_mapping_dict)
+        progress.append(road_summary(config, obs_df, est_df, period).rename(period))
+        pd.concat(progress, axis=1).rename_axis('Metric').reset_index().to_csv(progress_path, index=False)
+        print(f"{period} aggregated, progress saved to {progress_path}")
+
+    watch_files(
+        {period: (Path(loaded_network_directory) / f).with_suffix('.NET')
+         for f, period in zip(loaded_network_files, loaded_network_files_time)},
+        aggregate_period, poll_seconds, stable_polls)
+    return validation_road(config, (obs_df, est_df))
+
+
+def road_static_inputs(config):
+    # The observed counts and the freeflow network, read once and shared by all the runs
+    return load_static_inputs(
+        csv_paths=[config['OBSERVED_COUNTS']['obs_filepath']],
+        layer_paths=[config['MAP_INPUT']['freeflow_dir']])
+
+
+def validation_road_batch(config, run_dirs, workers=None):
+    summaries = run_batch(partial(validate_road_run, config), run_dirs, road_static_inputs(config), workers)
+    write_run_comparison(summaries, config['OUTPUT']['directory'],
+                         config['OUTPUT'].get('batch_comparison', 'batch_comparison'))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process TOML configuration file for validation.")
     parser.add_argument("config_path", type=str, help="Path to the TOML configuration file.")
+    parser.add_argument("--runs", nargs="+", help="Model run directories to validate as one batch.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes for --runs.")
+    parser.add_argument("--serve", action="store_true", help="Serve validation requests over a local HTTP API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host of the --serve API.")
+    parser.add_argument("--port", type=int, default=8765, help="Port of the --serve API.")
+    parser.add_argument("--watch", action="store_true", help="Validate each time period as its loaded network lands.")
+    parser.add_argument("--poll-seconds", type=float, default=30, help="Seconds between --watch polls.")
+    parser.add_argument("--stable-polls", type=int, default=2, help="Unchanged polls for a --watch file to be complete.")
+    parser.add_argument("--force", action="store_true", help="Rebuild all stages, ignoring the manifest.")
     
     # Check if the script is running in an interactive environment or not
     if len(sys.argv) > 1 and "ipykernel_launcher" not in sys.argv[0]:
@@ -207,10 +485,21 @@ if __name__ == "__main__":
         # Running in Jupyter or IPython, provide a default path
         default_config_path = r"X:\Projects\Miscellaneous\validation_simwrapper\roads2023\config.toml"  # Replace with your actual default config path
         print(f"Running in an interactive environment. Using default config path: {default_config_path}")
-        args = argparse.Namespace(config_path=default_config_path)
+        args = argparse.Namespace(config_path=default_config_path, runs=None, workers=None, serve=False, watch=False,
+                                  force=False)
 
     # Load the TOML configuration file
     config = toml.load(args.config_path)
+    set_backend(**config.get('ENGINE', {}))
+    config = snapped_counts_config(config, args.force)
 
     # Run the validation function with the loaded configuration
-    validation_road(config)
+    if args.serve:
+        set_static_inputs(road_static_inputs(config))
+        serve_validation(partial(serve_road_run, config), args.host, args.port, args.workers or 1)
+    elif args.runs:
+        validation_road_batch(config, args.runs, args.workers)
+    elif args.watch:
+        watch_road(config, args.poll_seconds, args.stable_polls)
+    else:
+        validation_road(config, force=args.force)
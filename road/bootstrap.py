@@ -0,0 +1,135 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from road.stats import table_file_prefix
+
+# Metrics of the stats tables, in the order returned by group_metrics
+bootstrap_metric_names = ['Percent RMSE', 'Relative Error', 'Est/Obs Ratio']
+
+# Resamples gathered per batch, bounds the memory of the index and value blocks
+bootstrap_batch_size = 100
+
+
+def group_metrics(sum_estimated, sum_observed, sum_squared_errors, count):
+    """
+    %RMSE, relative error and est/obs ratio (in %) from group sums, as in
+    `road.stats.calculate_metrics`. Works element-wise on arrays of any shape; groups
+    without observed volume get NaN.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        valid = sum_observed > 0
+        percent_rmse = np.where(
+            valid, np.sqrt(sum_squared_errors / count) / (sum_observed / count) * 100, np.nan)
+        relative_error = np.where(valid, (sum_estimated - sum_observed) / sum_observed, np.nan)
+        est_obs_ratio = np.where(valid, sum_estimated / sum_observed * 100, np.nan)
+    return percent_rmse, relative_error, est_obs_ratio
+
+
+def resample_indices(sizes, n_resamples, rng):
+    """
+    Index arrays of a stratified bootstrap over groups stored as consecutive rows: each
+    resample draws, with replacement, as many rows from each group as it has.
+
+    Parameters:
+    - sizes (array): Number of rows of each group, in storage order.
+    - n_resamples (int): Number of resamples.
+    - rng (np.random.Generator): Random generator.
+
+    Returns:
+    - np.ndarray: n_resamples x sum(sizes) row positions.
+    """
+    sizes = np.asarray(sizes)
+    starts = np.cumsum(sizes) - sizes
+    draws = rng.random((n_resamples, sizes.sum()))
+    return np.repeat(starts, sizes) + (draws * np.repeat(sizes, sizes)).astype(np.int64)
+
+
+def bootstrap_group_var(time_period_dfs, group_var, n_resamples=2000, confidence=0.95, rng=None):
+    """
+    Bootstrap confidence intervals of every metric, group and time period of one group
+    variable. The rows of each group (and of all locations) are resampled together for
+    all periods, and the metrics of all groups and periods are computed at once on
+    resamples x groups x periods blocks. As in `road.stats.calculate_metrics`, missing
+    volumes are left out of the sums and the locations are counted by their 'Loc Type'
+    (all the rows for all locations).
+
+    Parameters:
+    - time_period_dfs (dict): Time period to its frame, from `prepare_time_period_dfs`.
+    - group_var (str): Column to group the locations by.
+    - n_resamples (int): Number of bootstrap resamples.
+    - confidence (float): Confidence level of the percentile intervals.
+    - rng (np.random.Generator): Random generator, seeded with 0 by default.
+
+    Returns:
+    - DataFrame: One row per group, time period and metric, with the point estimate, the
+      interval bounds and the number of locations.
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    periods = list(time_period_dfs)
+    labels = time_period_dfs[periods[0]][group_var]
+    groups = [group for group in labels.unique() if pd.notna(group)]
+    rows = [np.flatnonzero((labels == group).to_numpy()) for group in groups]
+    rows.append(np.arange(len(labels)))
+    names = groups + ['All Locations']
+    sizes = np.array([len(group_rows) for group_rows in rows])
+    starts = np.cumsum(sizes) - sizes
+
+    # Volumes and squared errors, 3 x rows (grouped) x periods, missing values summed as 0
+    order = np.concatenate(rows)
+    values = np.stack([
+        np.column_stack([time_period_dfs[period][col].to_numpy(dtype=float)[order] for period in periods])
+        for col in ['Estimated Volume', 'Observed Volume', 'Squared Errors']
+    ])
+    values[np.isnan(values)] = 0
+    # Counted locations of each row: those with a 'Loc Type' in the groups, all for all locations
+    counted = time_period_dfs[periods[0]]['Loc Type'].notna().to_numpy()
+    counted = np.concatenate([counted[group_rows] for group_rows in rows[:-1]] + [np.ones(len(labels))])
+    point = group_metrics(*np.add.reduceat(values, starts, axis=1), np.add.reduceat(counted, starts)[:, None])
+
+    # Metrics of each resample, 3 x resamples x groups x periods
+    resampled = []
+    for batch_start in range(0, n_resamples, bootstrap_batch_size):
+        indices = resample_indices(sizes, min(bootstrap_batch_size, n_resamples - batch_start), rng)
+        sums = np.add.reduceat(values[:, indices, :], starts, axis=2)
+        counts = np.add.reduceat(counted[indices], starts, axis=1)[:, :, None]
+        resampled.append(np.stack(group_metrics(*sums, counts)))
+    resampled = np.concatenate(resampled, axis=1)
+
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        # Groups without observed volume have no interval
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower, upper = np.nanquantile(resampled, [alpha, 1 - alpha], axis=1)
+
+    metric_index, group_index, period_index = np.indices(lower.shape).reshape(3, -1)
+    return pd.DataFrame({
+        group_var: np.array(names, dtype=object)[group_index],
+        'Time Period': np.array(periods, dtype=object)[period_index],
+        'Metric': np.array(bootstrap_metric_names, dtype=object)[metric_index],
+        'Estimate': np.stack(point).ravel(),
+        'Lower': lower.ravel(),
+        'Upper': upper.ravel(),
+        'Count': sizes[group_index],
+    })
+
+
+def save_bootstrap_tables(outdir, time_period_dfs, group_vars, n_resamples=2000, confidence=0.95, seed=0):
+    """
+    Writes the bootstrap confidence intervals of the stats tables, one CSV per group
+    variable named like the stats tables (e.g. atgroup_bootstrap.csv).
+
+    Parameters:
+    - outdir (str): Output directory.
+    - time_period_dfs (dict): Time period to its frame, from `prepare_time_period_dfs`.
+    - group_vars (list): Group variables of the stats tables.
+    - n_resamples (int): Number of bootstrap resamples.
+    - confidence (float): Confidence level of the percentile intervals.
+    - seed (int): Seed of the random generator, for reproducible intervals.
+    """
+    rng = np.random.default_rng(seed)
+    for group_var in group_vars:
+        intervals = bootstrap_group_var(time_period_dfs, group_var, n_resamples, confidence, rng)
+        output_path = os.path.join(outdir, f'{table_file_prefix(group_var)}_bootstrap.csv')
+        intervals.to_csv(output_path, index=False)
+        print(f"Bootstrap intervals saved to {output_path}")
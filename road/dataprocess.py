@@ -1,11 +1,110 @@
 import os
 import pandas as pd
 from simpledbf import Dbf5
+from shared.inputs import in_link_keys, link_keys, read_static_csv
+from transit.engine import active_backend, compare_results, engine
+from transit.schema import column_schema
+
+# Rows per chunk when scanning loaded network files
+loaded_network_chunksize = 500000
 
 def generate_loaded_network_file_names(loaded_network_time_periods):
     """Generate a list of loaded_network file names based on time periods."""
     return [f"LOAD{tod}_FINAL.csv" for tod in loaded_network_time_periods]
 
+def read_base_counts(obs_file, extra_columns, time_periods):
+    """Read the observed count locations, with zeroed time period and daily total columns."""
+    base_df = read_static_csv(obs_file, usecols = extra_columns)
+
+    # Initialize columns for time periods and daily total
+    for col in time_periods + ['Daily']:
+        base_df[col] = 0
+    return base_df
+
+def read_loaded_network(loaded_network_file_path, column_names, keys=None, chunksize=None):
+    """
+    Read the needed columns of a loaded network file. With `keys` (packed A/B link keys from
+    `shared.inputs.link_keys`) the file is scanned in chunks of `chunksize` rows and each chunk
+    is filtered on its packed keys, so only the links in `keys` are kept and memory is bounded
+    by the number of count locations rather than the network size.
+    """
+    if keys is None:
+        return pd.read_csv(loaded_network_file_path, usecols=column_names)[column_names]
+
+    backend = active_backend()
+    if backend is not None:
+        # Out-of-core, column-pruned scan in DuckDB or Polars
+        result = backend.read_csv_links(loaded_network_file_path, column_names, keys)
+        if not engine['compare']:
+            return result
+    # Node ids are parsed straight into their compact dtype
+    node_dtypes = {col: column_schema[col] for col in ['A', 'B']}
+    matched = [
+        chunk[in_link_keys(chunk['A'], chunk['B'], keys)]
+        for chunk in pd.read_csv(loaded_network_file_path, usecols=column_names, dtype=node_dtypes,
+                                 chunksize=chunksize)]
+    loaded_network_df = pd.concat(matched, ignore_index=True)[column_names]
+    if backend is not None:
+        compare_results(result, loaded_network_df, loaded_network_file_path)
+    return loaded_network_df
+
+def aggregate_loaded_network(base_df, loaded_network_file_path, column_names, output_column, chunksize=None,
+                             observed_keys=None):
+    """Add one time period of the loaded network to the base dataframe, in place."""
+    if observed_keys is None:
+        observed_keys = link_keys(base_df['A'], base_df['B'])
+    #loaded_network = Dbf5(loaded_network_file_path)
+    #loaded_network_df = loaded_network.to_dataframe()
+    loaded_networkf_df = read_loaded_network(
+        loaded_network_file_path, column_names, observed_keys, chunksize or loaded_network_chunksize)
+
+    # Create a dictionary for quick lookup of loaded_network data
+    loaded_network_dict = {(row['A'], row['B']): row for index,
+                row in loaded_networkf_df.iterrows()}
+
+    # Update the base dataframe with data from the loaded_network file
+    for index, row in base_df.iterrows():
+        key = (row['A'], row['B'])
+        if key in loaded_network_dict:
+            loaded_network_row = loaded_network_dict[key]
+
+            for extra_col in column_names:
+                if extra_col not in ['A', 'B', 'V_1']:
+                    base_df.at[index, extra_col] = loaded_network_row[extra_col]
+
+            base_df.at[index, output_column] = loaded_network_row['V_1']
+
+            base_df.at[index, 'Daily'] += loaded_network_row['V_1']
+    return base_df
+
+def map_at_ft_groups(base_df, at_mapping, ft_mapping):
+    """Map AT and FT values to their groups."""
+    base_df['AT Group'] = base_df['AT'].map(at_mapping)
+    base_df['FT Group'] = base_df['FT'].map(ft_mapping)
+    return base_df
+
+def apply_count_crosswalk(obs_file, crosswalk_file, id_column, output_file):
+    """
+    Write the observed counts with the A/B link of each count from a count crosswalk
+    (see `road.snap.build_count_crosswalk`), dropping the counts that were not snapped.
+    """
+    counts = read_static_csv(obs_file)
+    crosswalk = pd.read_csv(crosswalk_file, usecols=[id_column, 'A', 'B']).dropna(subset=['A', 'B'])
+    crosswalk = crosswalk.astype({'A': 'int64', 'B': 'int64'})
+    # Each count id must name one count and one crosswalk row, or counts would be duplicated
+    for name, ids in [(obs_file, counts[id_column]), (crosswalk_file, crosswalk[id_column])]:
+        duplicated = ids[ids.duplicated()].unique()
+        if len(duplicated):
+            raise ValueError(f"{id_column} is not unique in {name}, duplicated ids: {duplicated[:10].tolist()}")
+    snapped = counts.drop(columns=['A', 'B'], errors='ignore').merge(crosswalk, on=id_column, how='inner',
+                                                                     validate='one_to_one')
+    snapped = snapped[['A', 'B'] + [col for col in snapped.columns if col not in ('A', 'B')]]
+    if len(snapped) < len(counts):
+        print(f"{len(counts) - len(snapped)} counts without a link in {crosswalk_file} were dropped")
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    snapped.to_csv(output_file, index=False)
+    return output_file
+
 def filter_and_aggregate(
         obs_file,
         loaded_network_directory,
@@ -14,43 +113,19 @@ def filter_and_aggregate(
         time_periods,
         extra_columns,
         at_mapping,
-        ft_mapping):
+        ft_mapping,
+        chunksize=None):
     loaded_network_files = generate_loaded_network_file_names(time_periods)
 
     # Read and process the Excel file    
-    base_df = pd.read_csv(obs_file, usecols = extra_columns)
-
-    # Initialize columns for time periods and daily total
-    for col in time_periods + ['Daily']:
-        base_df[col] = 0
+    base_df = read_base_counts(obs_file, extra_columns, time_periods)
+    # Links with observed counts, the only rows kept from the loaded networks
+    observed_keys = link_keys(base_df['A'], base_df['B'])
 
     for loaded_network_file, output_column in zip(loaded_network_files, time_periods):
         loaded_network_file_path = os.path.join(loaded_network_directory, loaded_network_file)
-        #loaded_network = Dbf5(loaded_network_file_path)
-        #loaded_network_df = loaded_network.to_dataframe()
-        loaded_network_df = pd.read_csv(loaded_network_file_path)
-        loaded_networkf_df = loaded_network_df[column_names]
-
-        # Create a dictionary for quick lookup of loaded_network data
-        loaded_network_dict = {(row['A'], row['B']): row for index,
-                    row in loaded_networkf_df.iterrows()}
-
-        # Update the base dataframe with data from the loaded_network file
-        for index, row in base_df.iterrows():
-            key = (row['A'], row['B'])
-            if key in loaded_network_dict:
-                loaded_network_row = loaded_network_dict[key]
-
-                for extra_col in column_names:
-                    if extra_col not in ['A', 'B', 'V_1']:
-                        base_df.at[index, extra_col] = loaded_network_row[extra_col]
-
-                base_df.at[index, output_column] = loaded_network_row['V_1']
-
-                base_df.at[index, 'Daily'] += loaded_network_row['V_1']
+        aggregate_loaded_network(base_df, loaded_network_file_path, column_names, output_column, chunksize,
+                                 observed_keys)
 
     # Map AT and FT values to their groups
-    base_df['AT Group'] = base_df['AT'].map(at_mapping)
-    base_df['FT Group'] = base_df['FT'].map(ft_mapping)
-
-    return base_df
\ No newline at end of file
+    return map_at_ft_groups(base_df, at_mapping, ft_mapping)
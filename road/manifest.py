@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from shared.inputs import file_fingerprint, file_hashes
+
+
+def frame_fingerprint(*dfs):
+    """
+    Content hash of DataFrames (columns, index and values), for stages whose input is an
+    in-memory frame rather than a file.
+    """
+    digest = hashlib.sha256()
+    for df in dfs:
+        digest.update(json.dumps([str(col) for col in df.columns]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def stage_key(config_tables, files=(), upstream=()):
+    """
+    Content address of a stage: hash of the config sub-tables it reads, the fingerprints
+    of its input files (code modules included) and the fingerprints of upstream artifacts.
+
+    Parameters:
+    - config_tables (dict): Name to config sub-table read by the stage.
+    - files (list): Input files of the stage.
+    - upstream (list): Fingerprints of the upstream artifacts used by the stage.
+    """
+    key = {
+        'config': config_tables,
+        'files': {str(path): file_fingerprint(path) for path in files},
+        'upstream': list(upstream),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_manifest(manifest_path):
+    # The file hashes stored with the manifest are reused while the files keep their size and mtime
+    if manifest_path is None or not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    for path, entry in manifest.pop('file_hashes', {}).items():
+        file_hashes.setdefault(path, entry)
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    with open(manifest_path, 'w') as f:
+        json.dump({**manifest, 'file_hashes': file_hashes}, f, indent=2)
+    print(f"Manifest saved to {manifest_path}")
+
+
+def output_snapshot(outdir):
+    # Size and modification time of every file under the output directory
+    snapshot = {}
+    for root, _, files in os.walk(outdir):
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            snapshot[os.path.relpath(path, outdir)] = [stat.st_size, stat.st_mtime_ns]
+    return snapshot
+
+
+def run_stage(manifest, name, key, outdir, build):
+    """
+    Runs a stage unless the manifest has the same key for it and all the outputs it wrote
+    last time still exist. The outputs of a stage are the files under `outdir` it creates
+    or modifies.
+
+    Parameters:
+    - manifest (dict): Manifest of the previous run, updated in place.
+    - name (str): Stage name.
+    - key (str): Content address of the stage inputs, from `stage_key`.
+    - outdir (str): Output directory.
+    - build (callable): Runs the stage.
+
+    Returns:
+    - bool: True if the stage was run, False if its outputs were reused.
+    """
+    entry = manifest.get(name)
+    if entry is not None and entry['key'] == key and all(
+            os.path.exists(os.path.join(outdir, output)) for output in entry['outputs']):
+        entry['reused'] = True
+        print(f"Stage '{name}' inputs unchanged, reusing {len(entry['outputs'])} outputs")
+        return False
+
+    before = output_snapshot(outdir)
+    build()
+    after = output_snapshot(outdir)
+    outputs = sorted(path for path, stamp in after.items() if before.get(path) != stamp)
+    manifest[name] = {'key': key, 'outputs': outputs, 'reused': False}
+    print(f"Stage '{name}' rebuilt, {len(outputs)} outputs written")
+    return True
+
+
+def report_stages(manifest, stages):
+    """Prints which stages were reused and which were rebuilt in this run."""
+    reused = [stage for stage in stages if manifest.get(stage, {}).get('reused')]
+    rebuilt = [stage for stage in stages if stage not in reused]
+    print(f"Reused stages: {', '.join(reused) or 'none'}; rebuilt stages: {', '.join(rebuilt) or 'none'}")
+    return reused, rebuilt
@@ -1,7 +1,61 @@
 import json
+from pathlib import Path
 import pandas as pd
 import geopandas as gpd
 import numpy as np
+import shapely
+from shared.inputs import read_static_layer
+from shared.maps import write_map_layer
+
+def link_id_strings(df):
+    """
+    Returns the rows of a DataFrame with numeric 'A' and 'B' node ids, the ids converted
+    to integer strings (e.g. '12345') for merging. The input DataFrame is not modified.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'A' and 'B' columns, numeric or strings.
+
+    Returns:
+        pd.DataFrame: The rows with valid node ids, with string 'A' and 'B' columns.
+    """
+    a = pd.to_numeric(df['A'], errors='coerce')
+    b = pd.to_numeric(df['B'], errors='coerce')
+    valid = a.notna() & b.notna()
+    return df[valid].assign(A=a[valid].astype(int).astype(str), B=b[valid].astype(int).astype(str))
+
+
+# Per-link metrics of calculate_differences, in their column order within each period
+link_metric_names = ['ratio', 'diff', 'pctdiff', 'absdiff', 'rmse', 'geh']
+
+
+def link_metrics(est, obs):
+    """
+    Computes the per-link comparison metrics of every period at once, on 2-D blocks of
+    estimated and observed volumes (one row per link, one column per period).
+
+    Where the observed volume is zero, ratio and pctdiff are inf (NaN if the estimate is
+    zero too). The GEH statistic, sqrt(2 (est - obs)^2 / (est + obs)), is 0 where both
+    volumes are zero. "rmse", the root of the squared difference of a single link, is the
+    absolute difference.
+
+    Args:
+        est (np.ndarray): Estimated volumes, links x periods.
+        obs (np.ndarray): Observed volumes, links x periods.
+
+    Returns:
+        dict: Metric name (see link_metric_names) to a links x periods array.
+    """
+    est = np.asarray(est, dtype=float)
+    obs = np.asarray(obs, dtype=float)
+    diff = est - obs
+    absdiff = np.abs(diff)
+    total = est + obs
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = est / obs
+        pctdiff = diff / obs
+    geh = np.sqrt(2 * diff ** 2 / np.where(total == 0, 1, total))
+    return {'ratio': ratio, 'diff': diff, 'pctdiff': pctdiff, 'absdiff': absdiff, 'rmse': absdiff, 'geh': geh}
+
 
 def calculate_differences(est_df, obs_df, output):
     """
@@ -14,37 +68,33 @@ def calculate_differences(est_df, obs_df, output):
 
     Returns:
         pd.DataFrame: Merged DataFrame with additional columns for ratio, difference, percentage difference,
-                      absolute difference, and root mean squared error (RMSE) for each time period.
+                      absolute difference, root mean squared error (RMSE) and GEH for each time period.
     """
-    # Step 1: Handle NaN and Infinite Values in 'A' and 'B'
-    est_df['A'] = pd.to_numeric(est_df['A'], errors='coerce')
-    est_df['B'] = pd.to_numeric(est_df['B'], errors='coerce')
-    obs_df['A'] = pd.to_numeric(obs_df['A'], errors='coerce')
-    obs_df['B'] = pd.to_numeric(obs_df['B'], errors='coerce')
-
-    # Drop rows with NaN or inf values in 'A' or 'B' in both DataFrames
-    est_df = est_df.dropna(subset=['A', 'B'])
-    obs_df = obs_df.dropna(subset=['A', 'B'])
-
-    # Step 2: Convert columns 'A' and 'B' to integers, then to strings without decimal places
-    est_df['A'] = est_df['A'].astype(int).astype(str)
-    est_df['B'] = est_df['B'].astype(int).astype(str)
-    obs_df['A'] = obs_df['A'].astype(int).astype(str)
-    obs_df['B'] = obs_df['B'].astype(int).astype(str)
+    # Steps 1-2: Drop rows without numeric 'A' and 'B', and convert them to strings without
+    # decimal places. The caller's DataFrames are left unchanged.
+    est_df = link_id_strings(est_df)
+    obs_df = link_id_strings(obs_df)
 
     # Step 3: Merge the estimated and observed dataframes on columns 'A' and 'B'
     time_periods = ['AM', 'MD', 'PM', 'EV', 'EA', 'Daily']
     merged_df = pd.merge(est_df, obs_df, on=['A', 'B'], suffixes=('_est', '_obs'))
 
-    # Step 4: Calculate difference metrics for each time period
-    for period in time_periods:
-        est_col = f'{period}_est'
-        obs_col = f'{period}_obs'
-        merged_df[f'{period}_ratio'] = merged_df[est_col] / merged_df[obs_col]
-        merged_df[f'{period}_diff'] = merged_df[est_col] - merged_df[obs_col]
-        merged_df[f'{period}_pctdiff'] = merged_df[f'{period}_diff'] / merged_df[obs_col]
-        merged_df[f'{period}_absdiff'] = abs(merged_df[f'{period}_diff'])
-        merged_df[f'{period}_rmse'] = np.sqrt(merged_df[f'{period}_diff'] ** 2)
+    # Step 4: Calculate difference metrics for all time periods at once
+    est_cols = [f'{period}_est' for period in time_periods]
+    obs_cols = [f'{period}_obs' for period in time_periods]
+    metrics = link_metrics(merged_df[est_cols].to_numpy(dtype=float), merged_df[obs_cols].to_numpy(dtype=float))
+    metric_columns = {}
+    for i, period in enumerate(time_periods):
+        # Differences of integer volumes stay integers
+        integer_volumes = all(pd.api.types.is_integer_dtype(merged_df[col])
+                              for col in (est_cols[i], obs_cols[i]))
+        for name in link_metric_names:
+            values = metrics[name][:, i]
+            if integer_volumes and name in ('diff', 'absdiff'):
+                values = values.astype('int64')
+            metric_columns[f'{period}_{name}'] = values
+    # Attach all the metric columns in one concat
+    merged_df = pd.concat([merged_df, pd.DataFrame(metric_columns, index=merged_df.index)], axis=1)
 
     # Step 5: Create 'AB' column for easy identification
     merged_df['AB'] = merged_df['A'] + ' ' + merged_df['B']
@@ -56,20 +106,21 @@ def calculate_differences(est_df, obs_df, output):
     return merged_df
 
 
-def process_geospatial_data(merged_df, freeflow_path, output_path):
+def process_geospatial_data(merged_df, freeflow_path, output_path, map_format=None):
     """
-    Reads a shapefile, merges it with the processed data, and outputs the result as a new shapefile.
+    Reads a shapefile, merges it with the processed data, and outputs the result as a new map layer.
 
     Args:
         merged_df (pd.DataFrame): DataFrame containing the merged data with calculated metrics.
         freeflow_path (str): Path to the shapefile containing freeflow data.
-        output_path (str): Path to save the resulting shapefile.
+        output_path (str): Path to save the resulting map layer.
+        map_format (str): Output format, one of "shp" (default), "geojson", "fgb" or "parquet".
 
     Returns:
-        None
+        gpd.GeoDataFrame: The merged map layer, in EPSG:4326.
     """
     # Step 1: Read the shapefile into a GeoDataFrame
-    gdf_freeflow = gpd.read_file(freeflow_path)
+    gdf_freeflow = read_static_layer(freeflow_path)
     print(f"Shapefile loaded with {len(gdf_freeflow)} rows.")
 
 
@@ -80,39 +131,92 @@ def process_geospatial_data(merged_df, freeflow_path, output_path):
     # Convert to the desired CRS
     gdf_freeflow = gdf_freeflow.to_crs(epsg=4326)  # Use WGS 84 for geographic coordinates
 
-    # Step 3: Clean and Convert Columns for Consistent Data Types
-    # Replace 'nan' strings in merged_df with actual NaN values
-    merged_df['A'] = merged_df['A'].replace('nan', np.nan)
-    merged_df['B'] = merged_df['B'].replace('nan', np.nan)
-    # Drop rows with NaN values in merged_df
-    merged_df = merged_df.dropna(subset=['A', 'B'])
-
-    # Convert to float, then to int, then to str to ensure clean merging
-    merged_df['A'] = merged_df['A'].astype(float).astype(int).astype(str)
-    merged_df['B'] = merged_df['B'].astype(float).astype(int).astype(str)
-
-    # Step 4: Clean and Prepare gdf_freeflow for Merging
-    gdf_freeflow['A'] = gdf_freeflow['A'].replace('nan', np.nan)
-    gdf_freeflow['B'] = gdf_freeflow['B'].replace('nan', np.nan)
-    gdf_freeflow = gdf_freeflow.dropna(subset=['A', 'B'])
-
-    # Convert columns in gdf_freeflow to ensure they match merged_df types
-    gdf_freeflow['A'] = gdf_freeflow['A'].astype(float).astype(int).astype(str)
-    gdf_freeflow['B'] = gdf_freeflow['B'].astype(float).astype(int).astype(str)
+    # Steps 3-4: Drop rows without node ids in both tables and convert the ids to strings
+    # for clean merging, without modifying the caller's DataFrame
+    merged_df = link_id_strings(merged_df)
+    gdf_freeflow = link_id_strings(gdf_freeflow[['A', 'B', 'geometry']])
 
     # Step 5: Create 'AB' Column for Merging Consistency
     gdf_freeflow['AB'] = gdf_freeflow['A'] + ' ' + gdf_freeflow['B']
     merged_df['AB'] = merged_df['A'] + ' ' + merged_df['B']
 
     # Step 6: Merge the GeoDataFrame with the processed DataFrame
-    merged_gdf = gdf_freeflow[['A', 'B', 'AB', 'geometry']].merge(merged_df, on=['A', 'B', 'AB'], how='inner')
+    merged_gdf = gdf_freeflow.merge(merged_df, on=['A', 'B', 'AB'], how='inner')
     print(f"Merged GeoDataFrame has {len(merged_gdf)} rows.")
 
-    # Step 7: Ensure the result is a GeoDataFrame and save it as a new shapefile
+    # Step 7: Ensure the result is a GeoDataFrame and save it as a new map layer
     merged_gdf = gpd.GeoDataFrame(merged_gdf, geometry='geometry')
     
     # Step 8: Save the merged GeoDataFrame to the specified output path
-    merged_gdf.to_file(output_path, index=False)
-    print(f"Shapefile saved to {output_path}.")
+    output_path = write_map_layer(merged_gdf, output_path, map_format, index=False)
+    print(f"Map layer saved to {output_path}.")
+
+    return merged_gdf
+
+
+def zoom_tolerance(zoom, latitude):
+    """
+    Returns the simplification tolerance in feet for a web map zoom level: half the
+    ground size of a 256px-tile pixel at the given latitude, so simplification is
+    not visible at that zoom.
+    """
+    meters_per_pixel = 156543.03392 * np.cos(np.radians(latitude)) / 2 ** zoom
+    return meters_per_pixel / 0.3048 / 2
+
+
+def export_zoom_levels(merged_gdf, output_path, zoom_levels, summary_path, map_format=None):
+    """
+    Writes a pre-simplified copy of the map layer for each zoom level, next to the
+    full-detail layer, and a summary CSV of the tolerance and vertex counts per level.
+
+    Each level is named after the full-detail layer with a `_z{zoom}` suffix (e.g.
+    map/map_z12.geojson) and carries a 'vertices' column with the vertex count of
+    each simplified link.
+
+    Args:
+        merged_gdf (gpd.GeoDataFrame): The map layer returned by process_geospatial_data.
+        output_path (str): Path of the full-detail map layer.
+        zoom_levels (list): Web map zoom levels to simplify for.
+        summary_path (str): Path to save the summary CSV.
+        map_format (str): Output format, one of "shp" (default), "geojson", "fgb" or "parquet".
+
+    Returns:
+        pd.DataFrame: The summary, one row per zoom level plus the full-detail layer.
+    """
+    output_path = Path(output_path)
+    # Simplify in feet (EPSG:2227), once per level
+    projected = merged_gdf.geometry.to_crs(epsg=2227)
+    latitude = merged_gdf.geometry.total_bounds[[1, 3]].mean()
+
+    summary = [{
+        'zoom': 'full',
+        'tolerance_ft': 0.0,
+        'links': len(merged_gdf),
+        'vertices': int(shapely.get_num_coordinates(merged_gdf.geometry.values).sum()),
+    }]
+    for zoom in zoom_levels:
+        tolerance = zoom_tolerance(zoom, latitude)
+        level_gdf = merged_gdf.copy()
+        level_gdf['geometry'] = projected.simplify(tolerance, preserve_topology=True).to_crs(epsg=4326)
+        level_gdf['vertices'] = shapely.get_num_coordinates(level_gdf.geometry.values)
+
+        if output_path.suffix == '':
+            level_path = output_path / f"{output_path.name}_z{zoom}.shp"
+        else:
+            level_path = output_path.with_name(f"{output_path.stem}_z{zoom}{output_path.suffix}")
+        level_path = write_map_layer(level_gdf, level_path, map_format, index=False)
+        print(f"Zoom {zoom} map layer saved to {level_path}.")
+
+        summary.append({
+            'zoom': zoom,
+            'tolerance_ft': round(tolerance, 2),
+            'links': len(level_gdf),
+            'vertices': int(level_gdf['vertices'].sum()),
+        })
+
+    summary = pd.DataFrame(summary)
+    summary.to_csv(summary_path, index=False)
+    print(f"Zoom level summary saved to {summary_path}")
+    return summary
 
 
@@ -2,7 +2,7 @@ import json
 import pandas as pd
 from pathlib import Path
 from sklearn.linear_model import LinearRegression
-from road.validation_road_utils import compute_and_combine_scatter
+from road.validation_road_utils import compute_and_combine_scatter, compute_and_combine_scatter_periods
 def compute_and_save_errors(
         est_df,
         obs_df,
@@ -37,6 +37,42 @@ def compute_and_save_errors(
 
     return select_time_period_loc_df, classification_col_types, file_name
 
+def compute_and_save_period_errors(
+        est_df,
+        obs_df,
+        periods,
+        combined_df_cols,
+        classification_col,
+        file_name):
+    # Compute errors for all periods in one pass, as one long table with a 'Period' column
+    times = ['Daily', 'AM', 'MD', 'PM', 'EV', 'EA']
+    period_loc_df = compute_and_combine_scatter_periods(est_df, obs_df, times, combined_df_cols, periods)
+
+    # Drop duplicates within each period
+    period_loc_df = period_loc_df.drop_duplicates(
+        subset=['Period', 'A', 'B'], keep='first')
+
+    # Save to CSV
+    period_loc_df.to_csv(file_name, index=False)
+
+    # Get classification column types
+    classification_col_types = period_loc_df[classification_col].dropna().unique()
+
+    return period_loc_df, classification_col_types, file_name
+
+def period_filters(period):
+    """Vega-Lite filter on the 'Period' column of a multi-period scatter dataset."""
+    return [] if period is None else [{"filter": f"datum['Period'] == '{period}'"}]
+
+def vega_output_path(output_template, classification_col_types, name, period):
+    """Output path of a Vega-Lite spec; per-period specs are prefixed with the period
+    unless the template has a {period} field."""
+    file_path = Path(output_template.format(
+        classification_col_types=classification_col_types, name=name, period=period))
+    if period is not None and "{period}" not in output_template:
+        file_path = file_path.with_name(f"{period}_{file_path.name}")
+    return file_path
+
 def generate_vega_lite_json_est(
         obs_file,
         classification_col,
@@ -47,8 +83,11 @@ def generate_vega_lite_json_est(
         nominal_fields,
         name,
         output_template,
-        include_all_data=False):
+        include_all_data=False,
+        period=None):
     df = pd.read_csv(obs_file)
+    if period is not None:
+        df = df[df['Period'] == period]
 
     # Adjust the filtering for single value (string) vs list
     if not include_all_data:
@@ -79,7 +118,7 @@ def generate_vega_lite_json_est(
         "$schema": "https://vega.github.io/schema/vega-lite/v5.json",
         "description": "A scatterplot with a regression line",
         "data": {"url": obs_file},
-        "transform": [] if include_all_data else [{"filter": f"datum['{classification_col}'] == '{classification_col_types}'"}],
+        "transform": period_filters(period) + ([] if include_all_data else [{"filter": f"datum['{classification_col}'] == '{classification_col_types}'"}]),
         "layer": [
             {
                 "mark": {
@@ -136,7 +175,7 @@ def generate_vega_lite_json_est(
         ]
     }
 
-    file_path = Path(output_template.format(classification_col_types=classification_col_types, name=name))
+    file_path = vega_output_path(output_template, classification_col_types, name, period)
     with open(file_path, 'w') as file:
         json.dump(vega_lite_config, file, indent=4)
 
@@ -151,7 +190,8 @@ def generate_vega_lite_json_diffpercent(
         nominal_fields,
         name,
         output_template,
-        include_all_data=False):
+        include_all_data=False,
+        period=None):
 
     tooltip_config = [{"field": field,
                        "type": "nominal" if field in nominal_fields else "quantitative",
@@ -161,9 +201,9 @@ def generate_vega_lite_json_diffpercent(
         "description": "A scatterplot",
         "data": {
             "url": obs_file},
-        "transform": [] if include_all_data else [
+        "transform": period_filters(period) + ([] if include_all_data else [
             {
-                "filter": f"datum['{classification_col}'] == '{classification_col_types}'"}],
+                "filter": f"datum['{classification_col}'] == '{classification_col_types}'"}]),
         "layer": [
             {
                 "mark": {
@@ -184,6 +224,6 @@ def generate_vega_lite_json_diffpercent(
                         "type": "quantitative"},
                     "tooltip": tooltip_config}}]}
 
-    file_path = Path(output_template.format(classification_col_types=classification_col_types, name=name))
+    file_path = vega_output_path(output_template, classification_col_types, name, period)
     with open(file_path, 'w') as file:
         json.dump(vega_lite_config, file, indent=4)
\ No newline at end of file
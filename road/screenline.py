@@ -1,7 +1,57 @@
+import re
 import pandas as pd
 from pathlib import Path
+from shared.inputs import read_static_csv
 from transit.utils import format_numeric, format_percentage, dataframe_to_markdown
 
+tod_order = ["EA", "AM", "MD", "PM", "EV"]
+
+# Output file prefix per screenline; other screenlines use their name in snake case
+screenline_file_prefixes = {
+    "Bay Bridge": "baybridge",
+    "Golden Gate Bridge": "ggb",
+    "San Mateo County Line": "sfsm",
+}
+direction_file_suffixes = {"Inbound": "ib", "Outbound": "ob"}
+
+
+def format_screenline_table(merged_df, file_path=None):
+    """
+    Adds the total row, difference and percent difference to a per-TOD screenline table,
+    formats it and saves it (without the total row) to a CSV file.
+
+    Parameters:
+    - merged_df (DataFrame): Observed and modeled volumes with columns 'TOD', 'Observed' and 'Modeled'.
+    - file_path (str, optional): Path to save the CSV file.
+
+    Returns:
+    - DataFrame: The formatted table with total row, difference, and percent difference.
+    """
+    merged_df = merged_df[["TOD", "Observed", "Modeled"]].reset_index(drop=True)
+
+    # Calculate total row dynamically
+    total_row = pd.DataFrame(merged_df.iloc[:, 1:].sum()).T
+    total_row["TOD"] = "Total"
+    
+    # Append the total row
+    merged_df = pd.concat([merged_df, total_row], ignore_index=True)
+    
+    # Compute difference and percent difference
+    merged_df['Diff'] = merged_df['Modeled'] - merged_df['Observed']
+    merged_df['Percent Diff'] = (merged_df['Diff'] / merged_df['Observed'])*100
+    merged_df["TOD"] = pd.Categorical(merged_df["TOD"], categories=tod_order + ["Total"], ordered=True)
+    merged_df = merged_df.sort_values("TOD").reset_index(drop=True)
+    numeric_cols = ["Observed", "Modeled", "Diff"]
+    for col in numeric_cols:
+        merged_df[col] = merged_df[col].apply(lambda x: format_numeric(x))
+        
+    merged_df['Percent Diff'] = merged_df['Percent Diff'].apply(lambda x: format_percentage(x))
+    if file_path is not None:
+        merged_df[~merged_df["TOD"].isin(["Total"])].to_csv(file_path)
+    
+    return merged_df
+
+
 def process_screenline_data(model_df, observed_df, direction=None, screenline=None, file_path=None):
     """
     Processes and merges modeled and observed screenline data based on given filters.
@@ -31,122 +81,75 @@ def process_screenline_data(model_df, observed_df, direction=None, screenline=No
     
     # Merge observed and modeled data
     merged_df = pd.merge(observed_grouped, model_grouped, how='left', on='TOD')
-    
-    # Calculate total row dynamically
-    total_row = pd.DataFrame(merged_df.iloc[:, 1:].sum()).T
-    total_row["TOD"] = "Total"
-    
-    # Append the total row
-    merged_df = pd.concat([merged_df, total_row], ignore_index=True)
-    
-    # Compute difference and percent difference
-    tod_order = ["EA", "AM", "MD", "PM", "EV"]
-    merged_df['Diff'] = merged_df['Modeled'] - merged_df['Observed']
-    merged_df['Percent Diff'] = (merged_df['Diff'] / merged_df['Observed'])*100
-    merged_df["TOD"] = pd.Categorical(merged_df["TOD"], categories=tod_order + ["Total"], ordered=True)
-    merged_df = merged_df.sort_values("TOD").reset_index(drop=True)
-    numeric_cols = ["Observed", "Modeled", "Diff"]
-    for col in numeric_cols:
-        merged_df[col] = merged_df[col].apply(lambda x: format_numeric(x))
-        
-    merged_df['Percent Diff'] = merged_df['Percent Diff'].apply(lambda x: format_percentage(x))
-    merged_df[~merged_df["TOD"].isin(["Total"])].to_csv(file_path)
-    
-    return merged_df
+    return format_screenline_table(merged_df, file_path)
 
-def generate_screenline_data(obs_filepath, counts_modeled, dir_path):
-    df = pd.read_csv(obs_filepath)
-    df_modeled = pd.read_csv(counts_modeled)
-    df_observed = df[df['Screenline'].notna()]
-    df_screenline_node = df_observed[['A', 'B', 'Screenline','Direction']]
-    df_merged = df_screenline_node.merge(df_modeled, on=['A', 'B'], how='left')
-    model_screenline = df_merged[['Screenline', 'Direction', 'EA_est', 'AM_est', 'MD_est', 'PM_est', 'EV_est']].rename(
-        columns={
-            'AM_est': 'AM',
-            'MD_est': 'MD',
-            'PM_est': 'PM',
-            'EV_est': 'EV',
-            'EA_est': 'EA'
-        }
-    )
 
-    observed_screenline = df_merged[['Screenline', 'Direction', 'EA_obs', 'AM_obs', 'MD_obs', 'PM_obs', 'EV_obs']].rename(
-        columns={
-            'AM_obs': 'AM',
-            'MD_obs': 'MD',
-            'PM_obs': 'PM',
-            'EV_obs': 'EV',
-            'EA_obs': 'EA'
-        }
-    )
-    model_screenline = model_screenline.melt(id_vars=["Screenline", "Direction"], 
-                        var_name="TOD", 
-                        value_name="Modeled")
-    observed_screenline = observed_screenline.melt(id_vars=["Screenline", "Direction"], 
-                        var_name="TOD", 
-                        value_name="Observed")
-    screenline_ib = process_screenline_data(model_screenline, observed_screenline, direction="Inbound", file_path=dir_path + "/screenline_ib.csv")
-    screenline_ob = process_screenline_data(model_screenline, observed_screenline, direction="Outbound", file_path=dir_path + "/screenline_ob.csv")
-    baybridge_screenline_ib = process_screenline_data(model_screenline, observed_screenline, direction="Inbound", screenline="Bay Bridge", file_path=dir_path + "/baybridge_screenline_ib.csv")
-    baybridge_screenline_ob = process_screenline_data(model_screenline, observed_screenline, direction="Outbound", screenline="Bay Bridge", file_path=dir_path + "/baybridge_screenline_ob.csv")
-    ggb_screenline_ib = process_screenline_data(model_screenline, observed_screenline, direction="Inbound", screenline="Golden Gate Bridge", file_path=dir_path + "/ggb_screenline_ib.csv")
-    ggb_screenline_ob = process_screenline_data(model_screenline, observed_screenline, direction="Outbound", screenline="Golden Gate Bridge", file_path=dir_path + "/ggb_screenline_ob.csv")
-    sfsm_screenline_ib = process_screenline_data(model_screenline, observed_screenline, direction="Inbound", screenline="San Mateo County Line", file_path=dir_path + "/sfsm_screenline_ib.csv")
-    sfsm_screenline_ob = process_screenline_data(model_screenline, observed_screenline, direction="Outbound", screenline="San Mateo County Line", file_path=dir_path + "/sfsm_screenline_ob.csv")
-    dataframe_to_markdown(
-    screenline_ib,
-    file_name=dir_path + "/screenline_ib.md",
-    highlight_rows=[len(screenline_ib) - 1],
-    center_align_columns=None,
-    column_widths=70,
-    )
-    dataframe_to_markdown(
-        screenline_ob,
-        file_name=dir_path + "/screenline_ob.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        baybridge_screenline_ib,
-        file_name=dir_path + "/baybridge_screenline_ib.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        baybridge_screenline_ob,
-        file_name=dir_path + "/baybridge_screenline_ob.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        ggb_screenline_ib,
-        file_name=dir_path + "/ggb_screenline_ib.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        ggb_screenline_ob,
-        file_name=dir_path + "/ggb_screenline_ob.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        sfsm_screenline_ib,
-        file_name=dir_path + "/sfsm_screenline_ib.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
-    )
-    dataframe_to_markdown(
-        sfsm_screenline_ob,
-        file_name=dir_path + "/sfsm_screenline_ob.md",
-        highlight_rows=[len(screenline_ib) - 1],
-        center_align_columns=None,
-        column_widths=70,
+def aggregate_screenlines(screenline_df):
+    """
+    Sums observed and modeled volumes of the screenline links by (Screenline, Direction, TOD)
+    in a single grouped pass.
+
+    Parameters:
+    - screenline_df (DataFrame): One row per screenline link with 'Screenline', 'Direction'
+      and the '{TOD}_obs' / '{TOD}_est' volume columns.
+
+    Returns:
+    - DataFrame: Long table with columns 'Screenline', 'Direction', 'TOD', 'Observed' and 'Modeled'.
+    """
+    keys = ['Screenline', 'Direction']
+    wide = screenline_df.groupby(keys)[
+        [f'{tod}_obs' for tod in tod_order] + [f'{tod}_est' for tod in tod_order]
+    ].sum()
+    wide.columns = pd.MultiIndex.from_tuples(
+        [(('Observed' if col.endswith('_obs') else 'Modeled'), col.rsplit('_', 1)[0]) for col in wide.columns],
+        names=[None, 'TOD'],
     )
+    return wide.stack('TOD', future_stack=True).reset_index()
+
+
+def screenline_file_prefix(screenline):
+    """Returns the output file prefix of a screenline, e.g. 'baybridge' for 'Bay Bridge'."""
+    if screenline in screenline_file_prefixes:
+        return screenline_file_prefixes[screenline]
+    return re.sub(r'[^0-9a-z]+', '_', str(screenline).lower()).strip('_')
+
+
+def generate_screenline_data(obs_filepath, counts_modeled, dir_path):
+    """
+    Writes the inbound/outbound screenline tables (CSV and markdown) for all screenlines
+    combined and for every screenline in the observed counts.
+
+    Parameters:
+    - obs_filepath (str): Observed counts CSV with 'A', 'B', 'Screenline' and 'Direction' columns.
+    - counts_modeled (DataFrame or str): The merged frame from calculate_differences, or the path of
+      the CSV it was saved to.
+    - dir_path (str): Output directory.
+    """
+    df_observed = read_static_csv(obs_filepath, usecols=['A', 'B', 'Screenline', 'Direction'])
+    df_observed = df_observed[df_observed['Screenline'].notna()]
+    if isinstance(counts_modeled, pd.DataFrame):
+        df_modeled = counts_modeled
+    else:
+        df_modeled = pd.read_csv(counts_modeled)
+    # calculate_differences keeps A/B as strings, the CSV reads them back as numbers
+    df_modeled = df_modeled.assign(A=pd.to_numeric(df_modeled['A']), B=pd.to_numeric(df_modeled['B']))
+    df_merged = df_observed.merge(df_modeled, on=['A', 'B'], how='left')
+
+    screenlines = aggregate_screenlines(df_merged)
+    tables = {}
+    for direction, suffix in direction_file_suffixes.items():
+        by_direction = screenlines[screenlines['Direction'] == direction]
+        tables[f"screenline_{suffix}"] = by_direction.groupby('TOD', sort=False)[['Observed', 'Modeled']].sum().reset_index()
+        for screenline in df_observed['Screenline'].unique():
+            prefix = screenline_file_prefix(screenline)
+            tables[f"{prefix}_screenline_{suffix}"] = by_direction[by_direction['Screenline'] == screenline]
 
+    for name, table in tables.items():
+        table = format_screenline_table(table, file_path=dir_path + f"/{name}.csv")
+        dataframe_to_markdown(
+            table,
+            file_name=dir_path + f"/{name}.md",
+            highlight_rows=[len(table) - 1],
+            center_align_columns=None,
+            column_widths=70,
+        )
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shared.inputs import read_static_csv, read_static_layer, static_input_key
+
+# Compass bearing (0 north, 90 east) of the count direction codes
+direction_bearings = {'NB': 0.0, 'EB': 90.0, 'SB': 180.0, 'WB': 270.0}
+
+# Freeflow links and their STRtree, by layer, built once and reused (e.g. by the runs of a batch)
+link_indexes = {}
+
+
+def link_index(freeflow_path):
+    """
+    The freeflow links with a geometry and the STRtree of their geometries, built on first use.
+
+    Parameters:
+    - freeflow_path (str): Freeflow network layer with 'A' and 'B' columns.
+
+    Returns:
+    - tuple: (GeoDataFrame of the links, shapely.STRtree of their geometries).
+    """
+    key = static_input_key(freeflow_path)
+    if key not in link_indexes:
+        links = read_static_layer(freeflow_path)
+        if links.crs is None:
+            # The freeflow network is in EPSG:2227, as assumed by road/map.py
+            links = links.set_crs('epsg:2227')
+        links = links[links.geometry.notna() & ~links.geometry.is_empty].reset_index(drop=True)
+        link_indexes[key] = (links, shapely.STRtree(links.geometry.values))
+    return link_indexes[key]
+
+
+def count_bearings(directions):
+    """Compass bearings of count directions: bearings in degrees or codes of `direction_bearings`, NaN otherwise."""
+    numeric = pd.to_numeric(directions, errors='coerce')
+    named = directions.astype(str).str.strip().str.upper().map(direction_bearings)
+    return numeric.fillna(named).to_numpy(dtype=float) % 360
+
+
+def local_bearings(lines, points, step):
+    """
+    Compass bearings of lines in their digitized (A to B) direction, measured around the
+    point of each line nearest to the matching point, so curved links are matched on
+    their local direction.
+    """
+    position = shapely.line_locate_point(lines, points)
+    length = shapely.length(lines)
+    start = shapely.line_interpolate_point(lines, np.clip(position - step, 0, length))
+    end = shapely.line_interpolate_point(lines, np.clip(position + step, 0, length))
+    dx = shapely.get_x(end) - shapely.get_x(start)
+    dy = shapely.get_y(end) - shapely.get_y(start)
+    return np.degrees(np.arctan2(dx, dy)) % 360
+
+
+def snap_points(points, bearings, links, tree, max_distance, max_angle=60, bearing_step=20,
+                direction_fallback=False):
+    """
+    Snaps points to their nearest link in bulk: one STRtree query returns all the links
+    within `max_distance` of every point, and the nearest link running in the point's
+    direction (within `max_angle` degrees) is kept. Points without a direction get the
+    nearest link. Points without a link in their direction are left unsnapped, or get
+    the nearest link with `direction_fallback`.
+
+    Parameters:
+    - points (np.ndarray): Point geometries, in the CRS of the links.
+    - bearings (np.ndarray): Compass bearing of each point's direction, NaN if unknown.
+    - links (GeoDataFrame): Links, from `link_index`.
+    - tree (shapely.STRtree): STRtree of the link geometries.
+    - max_distance (float): Search radius, in the units of the links CRS.
+    - max_angle (float): Largest angle between a link and the point direction.
+    - bearing_step (float): Half-length of the link piece the local bearing is measured on.
+    - direction_fallback (bool): Snap points without a link in their direction to the
+      nearest link running the other way.
+
+    Returns:
+    - DataFrame: One row per point with the position of its link in `links` (-1 if none),
+      the distance to it and whether the link runs in the point's direction.
+    """
+    point_positions, link_positions = tree.query(points, predicate='dwithin', distance=max_distance)
+    candidate_points = points[point_positions]
+    candidate_links = links.geometry.values[link_positions]
+    wanted = bearings[point_positions]
+    angle = np.abs((local_bearings(candidate_links, candidate_points, bearing_step) - wanted + 180) % 360 - 180)
+    candidates = pd.DataFrame({
+        'point': point_positions,
+        'link': link_positions,
+        'distance': shapely.distance(candidate_points, candidate_links),
+        'direction_miss': ~np.isnan(wanted) & ~(angle <= max_angle),
+    })
+    if not direction_fallback:
+        candidates = candidates[~candidates['direction_miss']]
+    best = candidates.sort_values(['point', 'direction_miss', 'distance'], kind='stable').drop_duplicates('point')
+
+    snapped = pd.DataFrame({'link': -1, 'distance': np.nan, 'direction_matched': False}, index=range(len(points)))
+    snapped.loc[best['point'], 'link'] = best['link'].to_numpy()
+    snapped.loc[best['point'], 'distance'] = best['distance'].to_numpy()
+    snapped.loc[best['point'], 'direction_matched'] = ~best['direction_miss'].to_numpy() & ~np.isnan(bearings[best['point']])
+    return snapped
+
+
+def build_count_crosswalk(obs_file, freeflow_path, snap_config, output_path):
+    """
+    Snaps the observed count locations to the freeflow links and writes the count to A/B
+    crosswalk used by `road.dataprocess.apply_count_crosswalk`.
+
+    Parameters:
+    - obs_file (str): Observed counts CSV with an id column and point coordinates.
+    - freeflow_path (str): Freeflow network layer with 'A' and 'B' columns.
+    - snap_config (dict): The [SNAP] config table: id_column, x_column, y_column, crs,
+      direction_column, max_distance, max_angle and direction_fallback.
+    - output_path (str): Crosswalk CSV to write.
+
+    Returns:
+    - DataFrame: The crosswalk, one row per count with its 'A', 'B' (empty if it was not
+      snapped), 'Snap Distance' and 'Direction Matched'.
+    """
+    links, tree = link_index(freeflow_path)
+    counts = read_static_csv(obs_file)
+    id_column = snap_config.get('id_column', 'Source ID')
+
+    points = gpd.GeoSeries(
+        gpd.points_from_xy(counts[snap_config.get('x_column', 'X')], counts[snap_config.get('y_column', 'Y')]),
+        crs=snap_config.get('crs', links.crs)).to_crs(links.crs).values
+    direction_column = snap_config.get('direction_column')
+    bearings = count_bearings(counts[direction_column]) if direction_column else np.full(len(counts), np.nan)
+
+    snapped = snap_points(np.asarray(points), bearings, links, tree, snap_config.get('max_distance', 300),
+                          snap_config.get('max_angle', 60),
+                          direction_fallback=snap_config.get('direction_fallback', False))
+    nodes = links[['A', 'B']].reindex(snapped['link'].to_numpy()).astype('Int64').reset_index(drop=True)
+    crosswalk = pd.DataFrame({
+        id_column: counts[id_column].to_numpy(),
+        'A': nodes['A'],
+        'B': nodes['B'],
+        'Snap Distance': snapped['distance'],
+        'Direction Matched': snapped['direction_matched'],
+    })
+    crosswalk.to_csv(output_path, index=False)
+    print(f"{nodes['A'].notna().sum()} of {len(crosswalk)} counts snapped "
+          f"({crosswalk['Direction Matched'].sum()} in their direction), crosswalk saved to {output_path}")
+    return crosswalk
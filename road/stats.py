@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import numpy as np
 import json
@@ -87,6 +89,13 @@ def reorder_dataframe(df, group_var):
 
     return df
 
+def table_file_prefix(group_var):
+    # Prefix of the output files of a group variable's tables
+    if group_var == 'Observed Volume Category':
+        return "observedvolume"
+    return f"{group_var.replace(' ', '').lower()}"
+
+
 def calculate_metrics(df, group_var_column, period):
     # Get unique groups for reindexing
     unique_groups = df[group_var_column].unique()
@@ -138,102 +147,141 @@ def calculate_metrics(df, group_var_column, period):
 
 
 
-def generate_and_save_tables(outdir, time_period_dfs, group_vars):
-    import os
+def percent_rmse_summary(time_period_dfs, group_vars, period='Daily'):
+    # Headline %RMSE of one period by group, in the order of the percent_rmse tables
+    summary = {}
+    for group_var in group_vars:
+        percent_rmse, _, _, total_percent_rmse, _, _ = calculate_metrics(
+            time_period_dfs[period], group_var, period
+        )
+        percent_rmse_df = pd.DataFrame({period: percent_rmse})
+        percent_rmse_df.loc['All Locations', period] = total_percent_rmse
+        percent_rmse_df = reset_index_and_rename(percent_rmse_df, group_var)
+        percent_rmse_df = reorder_dataframe(percent_rmse_df, group_var)
+        for group, value in zip(percent_rmse_df[group_var], percent_rmse_df[period]):
+            summary[f'%RMSE {group_var}: {group}'] = round(value, 1)
+    return pd.Series(summary)
+
 
-    # Ensure the output directory exists
-    os.makedirs(outdir, exist_ok=True)
+def save_group_var_tables(outdir, time_period_dfs, group_var):
+    # Count, metric, melted and Vega-Lite files of one group variable
+    percent_rmse_df = pd.DataFrame()
+    relative_error_df = pd.DataFrame()
+    est_obs_ratio_df = pd.DataFrame()
 
-    # Loop through each group variable
+    for period, df in time_period_dfs.items():
+        # Calculate metrics
+        percent_rmse, relative_error, est_obs_ratio, total_percent_rmse, total_relative_error, total_est_obs_ratio = calculate_metrics(
+            df, group_var, period
+        )
+        percent_rmse_df[period] = percent_rmse
+        relative_error_df[period] = relative_error
+        est_obs_ratio_df[period] = est_obs_ratio
     
-    for group_var in group_vars:
-        percent_rmse_df = pd.DataFrame()
-        relative_error_df = pd.DataFrame()
-        est_obs_ratio_df = pd.DataFrame()
-
-        for period, df in time_period_dfs.items():
-            # Calculate metrics
-            percent_rmse, relative_error, est_obs_ratio, total_percent_rmse, total_relative_error, total_est_obs_ratio = calculate_metrics(
-                df, group_var, period
-            )
-            percent_rmse_df[period] = percent_rmse
-            relative_error_df[period] = relative_error
-            est_obs_ratio_df[period] = est_obs_ratio
-        
-
-            # # Add totals for all locations
-            percent_rmse_df.loc['All Locations', period] = total_percent_rmse
-            relative_error_df.loc['All Locations', period] = total_relative_error
-            est_obs_ratio_df.loc['All Locations', period] = total_est_obs_ratio
-
-        # # Reset index and rename columns
-        percent_rmse_df = reset_index_and_rename(percent_rmse_df, group_var)
-        relative_error_df = reset_index_and_rename(relative_error_df, group_var)
-        est_obs_ratio_df = reset_index_and_rename(est_obs_ratio_df, group_var)
 
-        # # Reorder DataFrame based on group_var
-        percent_rmse_df = reorder_dataframe(percent_rmse_df, group_var)
-        relative_error_df = reorder_dataframe(relative_error_df, group_var)
-        est_obs_ratio_df = reorder_dataframe(est_obs_ratio_df, group_var)
+        # # Add totals for all locations
+        percent_rmse_df.loc['All Locations', period] = total_percent_rmse
+        relative_error_df.loc['All Locations', period] = total_relative_error
+        est_obs_ratio_df.loc['All Locations', period] = total_est_obs_ratio
 
+    # # Reset index and rename columns
+    percent_rmse_df = reset_index_and_rename(percent_rmse_df, group_var)
+    relative_error_df = reset_index_and_rename(relative_error_df, group_var)
+    est_obs_ratio_df = reset_index_and_rename(est_obs_ratio_df, group_var)
 
-        counts = df[group_var].value_counts()
+    # # Reorder DataFrame based on group_var
+    percent_rmse_df = reorder_dataframe(percent_rmse_df, group_var)
+    relative_error_df = reorder_dataframe(relative_error_df, group_var)
+    est_obs_ratio_df = reorder_dataframe(est_obs_ratio_df, group_var)
 
 
-        # Create a count DataFrame
-        count_df = pd.DataFrame(counts).reset_index()
-        count_df.columns = [group_var, 'Count']
+    counts = df[group_var].value_counts()
 
-        # Add total count row
-        total_count = count_df['Count'].sum()
-        total_row = pd.DataFrame({group_var: ['All Locations'], 'Count': [total_count]})
-        count_df = pd.concat([count_df, total_row], ignore_index=True)
 
-        # Reorder and reset the DataFrame for output
-        count_df = reorder_dataframe(count_df, group_var)
+    # Create a count DataFrame
+    count_df = pd.DataFrame(counts).reset_index()
+    count_df.columns = [group_var, 'Count']
 
-        # Round the metrics DataFrames for better readability
-        percent_rmse_df = percent_rmse_df.applymap(lambda x: f"{x:.1f}" if isinstance(x, (int, float)) else x)
-        relative_error_df = relative_error_df.applymap(lambda x: f"{x:.2f}" if isinstance(x, (int, float)) else x)
-        est_obs_ratio_df = est_obs_ratio_df.applymap(lambda x: f"{x:.3f}" if isinstance(x, (int, float)) else x)
+    # Add total count row
+    total_count = count_df['Count'].sum()
+    total_row = pd.DataFrame({group_var: ['All Locations'], 'Count': [total_count]})
+    count_df = pd.concat([count_df, total_row], ignore_index=True)
 
-        if group_var == 'Observed Volume Category':
-            file_prefix = "observedvolume"
-        else:
-            file_prefix = f"{group_var.replace(' ', '').lower()}"
+    # Reorder and reset the DataFrame for output
+    count_df = reorder_dataframe(count_df, group_var)
 
+    # Round the metrics DataFrames for better readability
+    percent_rmse_df = percent_rmse_df.applymap(lambda x: f"{x:.1f}" if isinstance(x, (int, float)) else x)
+    relative_error_df = relative_error_df.applymap(lambda x: f"{x:.2f}" if isinstance(x, (int, float)) else x)
+    est_obs_ratio_df = est_obs_ratio_df.applymap(lambda x: f"{x:.3f}" if isinstance(x, (int, float)) else x)
 
-        # Save the DataFrames to CSV
-        count_df.to_csv(f'{outdir}/{file_prefix}_count.csv', index=False)
-        percent_rmse_df.to_csv(f'{outdir}/percent_rmse_{file_prefix}.csv', index=False)
-        relative_error_df.to_csv(f'{outdir}/relative_error_{file_prefix}.csv', index=False)
-        est_obs_ratio_df.to_csv(f'{outdir}/est_obs_ratio_{file_prefix}.csv', index=False)
+    file_prefix = table_file_prefix(group_var)
 
 
-        # Melt dataframes for easier plotting or analysis
-        melted_percent_rmse_df = percent_rmse_df.melt(
-            id_vars=[group_var], var_name='Time Period', value_name='Percent RMSE'
-        )
-        melted_relative_error_df = relative_error_df.melt(
-            id_vars=[group_var], var_name='Time Period', value_name='Relative Error'
-        )
-        melted_est_obs_ratio_df = est_obs_ratio_df.melt(
-            id_vars=[group_var], var_name='Time Period', value_name='Est/Obs Ratio'
-        )
+    # Save the DataFrames to CSV
+    count_df.to_csv(f'{outdir}/{file_prefix}_count.csv', index=False)
+    percent_rmse_df.to_csv(f'{outdir}/percent_rmse_{file_prefix}.csv', index=False)
+    relative_error_df.to_csv(f'{outdir}/relative_error_{file_prefix}.csv', index=False)
+    est_obs_ratio_df.to_csv(f'{outdir}/est_obs_ratio_{file_prefix}.csv', index=False)
 
-        # Save melted dataframes to CSV
-        melted_percent_rmse_df.to_csv(
-            f'{outdir}/{file_prefix}_percent_rmse_melted.csv', index=False
-        )
-        melted_relative_error_df.to_csv(
-            f'{outdir}/{file_prefix}_relative_error_melted.csv', index=False
-        )
-        melted_est_obs_ratio_df.to_csv(
-            f'{outdir}/{file_prefix}_est_obs_ratio_melted.csv', index=False
-        )
 
-        # Generate the Vega-Lite files
-        generate_and_save_vega_lite_configs(outdir, group_var, file_prefix)
+    # Melt dataframes for easier plotting or analysis
+    melted_percent_rmse_df = percent_rmse_df.melt(
+        id_vars=[group_var], var_name='Time Period', value_name='Percent RMSE'
+    )
+    melted_relative_error_df = relative_error_df.melt(
+        id_vars=[group_var], var_name='Time Period', value_name='Relative Error'
+    )
+    melted_est_obs_ratio_df = est_obs_ratio_df.melt(
+        id_vars=[group_var], var_name='Time Period', value_name='Est/Obs Ratio'
+    )
+
+    # Save melted dataframes to CSV
+    melted_percent_rmse_df.to_csv(
+        f'{outdir}/{file_prefix}_percent_rmse_melted.csv', index=False
+    )
+    melted_relative_error_df.to_csv(
+        f'{outdir}/{file_prefix}_relative_error_melted.csv', index=False
+    )
+    melted_est_obs_ratio_df.to_csv(
+        f'{outdir}/{file_prefix}_est_obs_ratio_melted.csv', index=False
+    )
+
+    # Generate the Vega-Lite files
+    generate_and_save_vega_lite_configs(outdir, group_var, file_prefix)
+
+
+# Time period frames of the stats worker processes, installed once per worker
+shared_time_period_dfs = {}
+
+
+def install_time_period_dfs(time_period_dfs):
+    shared_time_period_dfs.update(time_period_dfs)
+
+
+def save_shared_group_var_tables(outdir, group_var):
+    save_group_var_tables(outdir, shared_time_period_dfs, group_var)
+
+
+def generate_and_save_tables(outdir, time_period_dfs, group_vars, workers=None):
+    """
+    Writes the tables of each group variable (built-in or user-defined groupings such as
+    county or screenline). With several workers the group variables are fanned out to a
+    process pool; the time period frames are sent once to each worker and shared
+    read-only by its tasks.
+    """
+    # Ensure the output directory exists
+    os.makedirs(outdir, exist_ok=True)
+
+    workers = min(workers or 1, len(group_vars))
+    if workers <= 1:
+        for group_var in group_vars:
+            save_group_var_tables(outdir, time_period_dfs, group_var)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=install_time_period_dfs,
+                             initargs=(time_period_dfs,)) as pool:
+        list(pool.map(partial(save_shared_group_var_tables, outdir), group_vars))
 
 
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 
 def compute_and_combine_scatter(est_df, obs_df, times, combined_df_cols, chosen_timeperiod):
@@ -24,6 +25,37 @@ def compute_and_combine_scatter(est_df, obs_df, times, combined_df_cols, chosen_
     return combined_df
 
 
+def compute_and_combine_scatter_periods(est_df, obs_df, times, combined_df_cols, periods):
+    # Ensure every period is valid
+    invalid_periods = [period for period in periods if period not in times]
+    if invalid_periods:
+        raise ValueError(f"Invalid time period(s): {invalid_periods}. They must be in {times}.")
+
+    # Compute the errors of all periods at once on (rows x periods) arrays
+    estimated = est_df[periods].to_numpy(dtype=float)
+    observed = obs_df[periods].reindex(est_df.index).to_numpy(dtype=float)
+    error = estimated - observed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        error_percent = error / observed
+    error_percent = np.where(np.isnan(error_percent), 0, error_percent) * 100  # Avoid division by zero
+
+    # Stack the periods into one long DataFrame with a 'Period' column
+    n_rows = len(est_df)
+    combined_df = est_df[combined_df_cols].iloc[np.tile(np.arange(n_rows), len(periods))]
+    combined_df = combined_df.reset_index(drop=True).assign(
+        **{
+            "Period": np.repeat(periods, n_rows),
+            "Estimated Volume": estimated.ravel(order='F'),
+            "Observed Volume": observed.ravel(order='F'),
+            "Errors": error.ravel(order='F'),
+            "Squared Errors": (error ** 2).ravel(order='F'),
+            "Percent Errors": error_percent.ravel(order='F')
+        }
+    )
+
+    return combined_df
+
+
 def compute_and_combine_stats(est_df, obs_df, times, combined_df_cols):
     # Create a base DataFrame using the specified columns
     combined_df = est_df[combined_df_cols].copy()
@@ -0,0 +1,124 @@
+import hashlib
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+# Observed and static inputs preloaded for batch validation, keyed by resolved path
+static_inputs = {}
+# [size, mtime_ns] and content hash of the files fingerprinted, keyed by resolved path
+file_hashes = {}
+
+
+def static_input_key(path):
+    return str(Path(path).resolve())
+
+
+def file_fingerprint(path):
+    """
+    Content hash of a file, or None if it does not exist. The hash is reused from
+    `file_hashes` while the file keeps its size and modification time, so unchanged
+    loaded networks and freeflow layers are not read again.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    key = static_input_key(path)
+    cached = file_hashes.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    file_hashes[key] = [stamp, digest.hexdigest()]
+    return digest.hexdigest()
+
+
+def network_fingerprint(path):
+    """Content hash of a network layer (and of the attribute table of a shapefile)."""
+    path = Path(path)
+    parts = [path, path.with_suffix(".dbf")] if path.suffix.lower() == ".shp" else [path]
+    fingerprints = [file_fingerprint(part) for part in parts]
+    return hashlib.sha256(" ".join(str(f) for f in fingerprints).encode()).hexdigest()
+
+
+def load_static_inputs(csv_paths=(), layer_paths=()):
+    """
+    Reads observed/static CSVs and map layers once, for sharing between batch runs.
+
+    Parameters:
+    csv_paths (list): CSV files to read with `pd.read_csv`.
+    layer_paths (list): Map layers (e.g. the freeflow shapefile) to read with `gpd.read_file`.
+
+    Returns:
+    dict: The frames keyed by `static_input_key`, to be installed with `set_static_inputs`.
+    """
+    inputs = {}
+    for path in csv_paths:
+        inputs[static_input_key(path)] = pd.read_csv(path)
+    for path in layer_paths:
+        inputs[static_input_key(path)] = gpd.read_file(path)
+    print(f"Loaded {len(inputs)} shared static inputs")
+    return inputs
+
+
+def set_static_inputs(inputs):
+    static_inputs.clear()
+    static_inputs.update(inputs)
+
+
+def read_static_csv(path, usecols=None):
+    """
+    `pd.read_csv` for observed/static inputs: returns a copy of the preloaded frame
+    if the file was loaded by `load_static_inputs`, otherwise reads the file.
+    `usecols` keeps the file's column order and raises on missing columns, as
+    `pd.read_csv` does.
+    """
+    key = static_input_key(path)
+    if key not in static_inputs:
+        return pd.read_csv(path, usecols=usecols)
+    df = static_inputs[key]
+    if usecols is not None:
+        missing = [col for col in usecols if col not in df.columns]
+        if missing:
+            raise ValueError(
+                f"Usecols do not match columns, columns expected but not found: {missing}"
+            )
+        df = df[[col for col in df.columns if col in usecols]]
+    return df.copy()
+
+
+def read_static_layer(path):
+    """`gpd.read_file` for static map layers, using the preloaded layer when there is one."""
+    key = static_input_key(path)
+    if key not in static_inputs:
+        return gpd.read_file(path)
+    return static_inputs[key].copy()
+
+
+def pack_link_keys(a, b):
+    """
+    Packs A/B node pairs into one int64 key per link, A in the high and B in the low
+    32 bits, so link sets can be matched with a single hashed column. Links with a
+    missing or non-numeric node get the key -1.
+    """
+    a = pd.to_numeric(pd.Series(a), errors="coerce").to_numpy(dtype="float64")
+    b = pd.to_numeric(pd.Series(b), errors="coerce").to_numpy(dtype="float64")
+    missing = np.isnan(a) | np.isnan(b)
+    keys = (np.where(missing, 0, a).astype("int64") << 32) | np.where(missing, 0, b).astype("int64")
+    return np.where(missing, -1, keys)
+
+
+def link_keys(a, b):
+    """Exact key set (unique packed keys) of the A/B links, e.g. of the observed counts."""
+    keys = np.unique(pack_link_keys(a, b))
+    return keys[keys != -1]
+
+
+def in_link_keys(a, b, keys):
+    """Boolean mask of the A/B links whose packed key is in `keys`, from `link_keys`."""
+    return pd.Series(pack_link_keys(a, b)).isin(keys).to_numpy()
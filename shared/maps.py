@@ -0,0 +1,53 @@
+from pathlib import Path
+
+# Map layer formats: file extension and writer options. "geojson" is written
+# with 6 decimal places, "fgb" (FlatGeobuf) with a packed spatial index.
+map_formats = {
+    "shp": (".shp", {}),
+    "geojson": (".geojson", {"driver": "GeoJSON", "COORDINATE_PRECISION": 6}),
+    "fgb": (".fgb", {"driver": "FlatGeobuf", "SPATIAL_INDEX": "YES"}),
+    "parquet": (".parquet", None),
+}
+
+
+def map_layer_path(path, map_format=None):
+    """
+    Path a map layer is written to in the given format: the extension of `path` is
+    replaced by the format's extension. A shapefile path without an extension is a
+    directory, for the other formats the layer is written inside it as <dir>/<dir>.<ext>.
+    """
+    path = Path(path)
+    map_format = map_format or "shp"
+    if map_format not in map_formats:
+        raise ValueError(
+            f"Unknown map format '{map_format}', expected one of {list(map_formats)}"
+        )
+    extension = map_formats[map_format][0]
+    if map_format == "shp":
+        return path
+    if path.suffix == "":
+        return path / f"{path.name}{extension}"
+    return path.with_suffix(extension)
+
+
+def write_map_layer(gdf, path, map_format=None, index=None):
+    """
+    Write a map layer for SimWrapper in one of `map_formats` (default shapefile).
+
+    Parameters:
+    gdf (GeoDataFrame): The layer to write.
+    path (str or Path): Output path; its extension is replaced to match the format.
+    map_format (str): One of "shp", "geojson", "fgb" or "parquet" (GeoParquet).
+    index (bool): Whether to write the index, as in `GeoDataFrame.to_file`.
+
+    Returns:
+    Path: The path written.
+    """
+    output_path = map_layer_path(path, map_format)
+    options = map_formats[map_format or "shp"][1]
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    if options is None:
+        gdf.to_parquet(output_path, index=index)
+    else:
+        gdf.to_file(output_path, index=index, **options)
+    return output_path
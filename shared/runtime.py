@@ -0,0 +1,197 @@
+import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+from shared.inputs import set_static_inputs
+from transit.utils import dataframe_to_markdown
+
+
+def batch_run_name(run_dir):
+    """Name of a batch run, used for its output directory and comparison column."""
+    return Path(run_dir).resolve().name
+
+
+def run_batch(validate_run, run_dirs, inputs, workers=None):
+    """
+    Validates several model runs in worker processes that share the preloaded inputs.
+
+    Parameters:
+    validate_run (callable): Picklable function validating one run directory and
+        returning its headline metrics as a Series.
+    run_dirs (list): Model run directories.
+    inputs (dict): Shared inputs from `load_static_inputs`, installed once per worker.
+    workers (int): Number of worker processes (default: one per CPU).
+
+    Returns:
+    dict: Run name (`batch_run_name`) to the Series returned by `validate_run`.
+    """
+    run_names = [batch_run_name(run_dir) for run_dir in run_dirs]
+    if len(set(run_names)) < len(run_names):
+        raise ValueError(f"Batch run directories must have distinct names: {run_names}")
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=set_static_inputs, initargs=(inputs,)
+    ) as executor:
+        futures = {
+            run_name: executor.submit(validate_run, run_dir)
+            for run_name, run_dir in zip(run_names, run_dirs)
+        }
+        summaries = {}
+        for run_name, future in futures.items():
+            summaries[run_name] = future.result()
+            print(f"Validated run '{run_name}'")
+    return summaries
+
+
+def write_run_comparison(summaries, output_dir, file_name):
+    """
+    Writes the cross-run comparison of headline metrics, one row per metric and one
+    column per run, as `file_name`.csv and `file_name`.md.
+
+    Parameters:
+    summaries (dict): Run name to a Series of metric values, as returned by `run_batch`.
+    output_dir (str or Path): Output directory.
+    file_name (str): Output file name without extension.
+
+    Returns:
+    DataFrame: The comparison table.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    comparison = pd.DataFrame(summaries)
+    comparison.index.name = "Metric"
+    comparison = comparison.reset_index()
+    comparison.to_csv(output_dir / f"{file_name}.csv", index=False)
+    dataframe_to_markdown(
+        comparison.round(1),
+        file_name=output_dir / f"{file_name}.md",
+        column_widths=100,
+    )
+    return comparison
+
+
+def serve_validation(validate_run, host="127.0.0.1", port=8765, workers=1):
+    """
+    Serves validation requests over a local HTTP API, keeping the interpreter, imports
+    and the preloaded static inputs (`set_static_inputs`) warm between requests.
+
+    POST /validate {"run_dir": ...} returns {"run", "summary"} as soon as the headline
+    metrics are computed; the dashboard outputs are written in the background.
+    GET /runs returns the status of the background outputs of each run:
+    "running", "done" or "failed: <error>". A run that is still being validated or
+    written is rejected with 409, as both requests would write its output directory.
+
+    Parameters:
+    validate_run (callable): Takes a run directory, returns the summary Series and a
+        callable writing the full outputs of the run.
+    host (str): Host to bind, localhost by default.
+    port (int): Port to bind.
+    workers (int): Number of background threads writing outputs.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    runs = {}
+    # Runs being validated or written, requests are handled on concurrent threads
+    active = set()
+    lock = threading.Lock()
+
+    def release(run_name):
+        with lock:
+            active.discard(run_name)
+
+    def run_status(future):
+        if not future.done():
+            return "running"
+        if future.exception() is not None:
+            return f"failed: {future.exception()}"
+        return "done"
+
+    class ValidationHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            if self.path != "/runs":
+                self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+                return
+            self.send_json(200, {name: run_status(future) for name, future in runs.items()})
+
+        def do_POST(self):
+            if self.path != "/validate":
+                self.send_json(404, {"error": f"Unknown path '{self.path}'"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                run_dir = json.loads(self.rfile.read(length) or b"{}")["run_dir"]
+            except (ValueError, KeyError, TypeError):
+                self.send_json(400, {"error": 'Expected a JSON body {"run_dir": ...}'})
+                return
+            run_name = batch_run_name(run_dir)
+            with lock:
+                if run_name in active:
+                    self.send_json(409, {"error": f"Run '{run_name}' is already being validated"})
+                    return
+                active.add(run_name)
+            try:
+                summary, write_outputs = validate_run(run_dir)
+            except Exception as error:
+                release(run_name)
+                self.send_json(500, {"error": str(error)})
+                return
+            runs[run_name] = executor.submit(write_outputs)
+            runs[run_name].add_done_callback(lambda future: release(run_name))
+            summary = summary.astype(object).where(summary.notna(), None)
+            self.send_json(200, {"run": run_name, "summary": summary.to_dict()})
+
+    server = ThreadingHTTPServer((host, port), ValidationHandler)
+    print(f"Serving validation on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown()
+
+
+def watch_files(filepaths, on_ready, poll_seconds=30, stable_polls=2):
+    """
+    Waits for files written one at a time (e.g. one per time period) and processes
+    each as soon as it is complete: a file is complete once it exists and its size
+    and modification time are unchanged for `stable_polls` consecutive polls.
+
+    Parameters:
+    filepaths (dict): Key (e.g. time period) to the file path to wait for.
+    on_ready (callable): Called as on_ready(key, path) for each complete file, in the
+        order the files complete.
+    poll_seconds (float): Seconds between polls.
+    stable_polls (int): Number of unchanged polls for a file to be complete.
+    """
+    pending = {key: Path(path) for key, path in filepaths.items()}
+    last_seen = {}
+    unchanged = dict.fromkeys(pending, 0)
+    waiting_for = None
+    while pending:
+        for key, path in list(pending.items()):
+            if not path.exists():
+                continue
+            stat = path.stat()
+            seen = (stat.st_size, stat.st_mtime)
+            unchanged[key] = unchanged[key] + 1 if last_seen.get(key) == seen else 0
+            last_seen[key] = seen
+            if unchanged[key] >= stable_polls:
+                print(f"{path} is complete")
+                del pending[key]
+                on_ready(key, path)
+        if pending:
+            if list(pending) != waiting_for:
+                waiting_for = list(pending)
+                print(f"Waiting for {', '.join(str(key) for key in pending)}")
+            time.sleep(poll_seconds)
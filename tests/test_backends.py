@@ -0,0 +1,113 @@
+"""
+Parity of the duckdb and polars aggregation backends with pandas, and of the pandas
+aggregations with the CSV outputs of the pandas-only scripts (tests/data/groupby).
+"""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from road.dataprocess import read_loaded_network
+from shared.inputs import link_keys
+from transit import duckdb_backend, polars_backend
+from transit.engine import set_backend
+from transit.schema import compact_dtypes
+from transit.utils import read_dbf_and_groupby_sum
+
+data_dir = Path(__file__).parent / "data"
+
+# Golden file name -> read_dbf_and_groupby_sum arguments
+groupby_cases = {
+    "system_mode_boardings": (None, ["SYSTEM", "MODE"], "AB_BRDA"),
+    "muni_name_boardings": ("SF MUNI", "NAME", "AB_BRDA"),
+    "muni_name_tod_boardings": ("SF MUNI", ["NAME", "TOD"], "AB_BRDA"),
+    "bart_link_volumes": ("BART", ["A", "B"], "AB_VOL"),
+    "system_name_tod_volumes": (None, ["SYSTEM", "NAME", "TOD"], "AB_VOL"),
+    "unmatched_system": ("No Such System", "NAME", "AB_BRDA"),
+}
+
+loaded_network_columns = ["A", "B", "V_1", "AT", "FT"]
+
+
+@pytest.fixture(params=["duckdb", "polars"])
+def backend(request):
+    pytest.importorskip(request.param)
+    yield request.param
+    set_backend("pandas")
+
+
+@pytest.fixture
+def assignment():
+    # The combined assignment as read by read_transit_assignments: categorical strings,
+    # narrow integers, and rows with a missing NAME
+    return compact_dtypes(pd.read_csv(data_dir / "assignment.csv"))
+
+
+@pytest.fixture
+def observed_keys():
+    # Count links: every third link of the file and one link that is not in it
+    links = pd.read_csv(data_dir / "loaded_network.csv").iloc[::3]
+    return link_keys(pd.concat([links["A"], pd.Series([9999])]), pd.concat([links["B"], pd.Series([9999])]))
+
+
+def assert_same_table(result, expected, check_dtype=True):
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True),
+        expected.reset_index(drop=True),
+        check_dtype=check_dtype,
+        check_exact=False,
+        rtol=1e-9,
+    )
+
+
+@pytest.mark.parametrize("case", list(groupby_cases))
+def test_pandas_groupby_matches_golden_csv(assignment, case, tmp_path):
+    result = read_dbf_and_groupby_sum(assignment, *groupby_cases[case])
+    result.to_csv(tmp_path / f"{case}.csv", index=False)
+    assert (tmp_path / f"{case}.csv").read_text() == (data_dir / "groupby" / f"{case}.csv").read_text()
+
+
+@pytest.mark.parametrize("case", list(groupby_cases))
+def test_backend_groupby_matches_pandas(assignment, backend, case):
+    expected = read_dbf_and_groupby_sum(assignment, *groupby_cases[case])
+    set_backend(backend)
+    result = read_dbf_and_groupby_sum(assignment, *groupby_cases[case])
+    assert_same_table(result, expected)
+    # An empty golden CSV reads back with object columns
+    assert_same_table(result, pd.read_csv(data_dir / "groupby" / f"{case}.csv"), check_dtype=not result.empty)
+
+
+@pytest.mark.parametrize("case", list(groupby_cases))
+def test_backend_groupby_compare_mode(assignment, backend, case):
+    # compare = true runs pandas too and raises on a difference
+    set_backend(backend, compare=True)
+    read_dbf_and_groupby_sum(assignment, *groupby_cases[case])
+
+
+def test_backend_groupby_unmatched_filter_is_empty(assignment, backend):
+    set_backend(backend)
+    result = read_dbf_and_groupby_sum(assignment, "No Such System", ["NAME", "TOD"], "AB_BRDA")
+    assert result.empty
+    assert list(result.columns) == ["NAME", "TOD", "AB_BRDA"]
+
+
+def test_backend_read_csv_links_matches_pandas(backend, observed_keys):
+    path = data_dir / "loaded_network.csv"
+    expected = read_loaded_network(path, loaded_network_columns, observed_keys, chunksize=50)
+    module = duckdb_backend if backend == "duckdb" else polars_backend
+    result = module.read_csv_links(path, loaded_network_columns, observed_keys)
+    assert len(expected) == len(observed_keys) - 1
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False
+    )
+
+
+def test_backend_read_loaded_network_matches_pandas(backend, observed_keys):
+    path = data_dir / "loaded_network.csv"
+    expected = read_loaded_network(path, loaded_network_columns, observed_keys, chunksize=50)
+    set_backend(backend)
+    result = read_loaded_network(path, loaded_network_columns, observed_keys, chunksize=50)
+    pd.testing.assert_frame_equal(
+        result.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False
+    )
+    set_backend(backend, compare=True)
+    read_loaded_network(path, loaded_network_columns, observed_keys, chunksize=50)
@@ -1,25 +1,44 @@
+import argparse
+import copy
+from functools import partial
 from pathlib import Path
 
-import toml, sys
+import pandas as pd
+import toml
+from shared.inputs import load_static_inputs, set_static_inputs
+from shared.runtime import (
+    batch_run_name,
+    run_batch,
+    serve_validation,
+    watch_files,
+    write_run_comparison,
+)
 from transit.bart import process_bart_model_outputs
+from transit.engine import set_backend
 from transit.map_data import process_bart_map, process_muni_map
 from transit.muni import process_muni
 from transit.obs import process_obs_data
+from transit.renumber import renumbered_config
+from transit.schema import concat_compact, memory_report
 from transit.screen import save_final_screenline_data
 from transit.simwrapper_table import process_mkd_bart, process_mkd_muni, process_mkd_screenline
-from transit.total_val import process_valTotal_operator, process_valTotal_Submode
-from transit.utils import read_transit_assignments
+from transit.total_val import load_mode_lookup, process_valTotal_operator, process_valTotal_Submode
+from transit.utils import (
+    parse_formatted_number,
+    read_dbf_and_groupby_sum,
+    read_transit_assignment,
+    read_transit_assignments,
+    time_periods,
+    transit_assignment_filepaths,
+)
 
-if __name__ == "__main__":
-    toml_path = Path(sys.argv[1])
-    print(toml_path)
-    
-    try:
-        with open(toml_path, "rb") as f:
-            config = toml.load(f)
-    except:
-        config = toml.load(toml_path)
+# Copy-on-write: selections and derived frames share memory until one of them is modified
+pd.set_option("mode.copy_on_write", True)
 
+
+def validation_transit(config, combined_gdf=None):
+    set_backend(**config.get("engine", {}))
+    config = renumbered_config(config)
     line_rename = Path(config["input"]["support"]["line_rename"])
     
     model_run_dir = Path(config["input"]['model']["dir"])
@@ -168,8 +187,16 @@ if __name__ == "__main__":
 
     time_periods = ["EA", "AM", "MD", "PM", "EV"]
     tod_order = ["EA", "AM", "MD", "PM", "EV", "Total"]
+    mode_lookup = load_mode_lookup(config["total"])
     
-    combined_gdf = read_transit_assignments(model_run_dir, time_periods)
+    if combined_gdf is None:
+        combined_gdf = read_transit_assignments(model_run_dir, time_periods)
+    memory_report_file = config["output"].get("memory_report")
+    if memory_report_file:
+        memory_report({"combined_gdf": combined_gdf}).to_csv(
+            output_dir / memory_report_file, index=False
+        )
+        print(f"Memory report saved to {output_dir / memory_report_file}")
     process_bart_model_outputs(
         combined_gdf,
         output_dir,
@@ -189,6 +216,8 @@ if __name__ == "__main__":
         observed_MUNI_Line,
         output_dir,
         model_MUNI_Line,
+        config["muni"].get("route_modes"),
+        config["muni"].get("directions"),
     )
     save_final_screenline_data(
         combined_gdf,
@@ -335,6 +364,10 @@ if __name__ == "__main__":
         MUNI_IB,
         MUNI_map_IB,
         MUNI_map_OB,
+        config["output"].get("map_format"),
+        config["output"].get("cache_dir", output_dir / ".cache"),
+        config["muni"].get("MUNI_load_profile"),
+        config["muni"].get("MUNI_stops"),
     )
     process_bart_map(
         output_dir,
@@ -356,6 +389,8 @@ if __name__ == "__main__":
         BART_at_pm,
         BART_at_map_pm,
         station_node_match,
+        config["bart"].get("BART_map_layers"),
+        config["output"].get("map_format"),
     )
     process_obs_data(
         transit_input_dir,
@@ -380,7 +415,9 @@ if __name__ == "__main__":
         observed_NTD,
         valTotal_Operator_md,
         valTotal_Operator,
-        model_MUNI_Line
+        model_MUNI_Line,
+        mode_lookup,
+        config["total"].get("ferry_names"),
     )
     process_valTotal_Submode(
         combined_gdf,
@@ -391,5 +428,178 @@ if __name__ == "__main__":
         valTotal_Submode_md,
         valTotal_Service_md,
         valTotal_Service,
-        model_MUNI_Line
+        model_MUNI_Line,
+        mode_lookup,
+        config["total"].get("ferry_names"),
+    )
+
+
+def transit_static_inputs(config, run_dirs):
+    """Observed inputs and the freeflow network(s) of a batch, read once for all the runs."""
+    transit_input_dir = Path(config["input"]["observed"]["dir"])
+    observed = config["input"]["observed"]
+    csv_paths = [Path(config["input"]["support"]["line_rename"])] + [
+        transit_input_dir / observed[name]
+        for name in [
+            "bart_station",
+            "station_node_match",
+            "bart_county",
+            "bart_screenline",
+            "muni_line",
+            "screenline",
+            "ntd",
+            "muni_name_match",
+        ]
+    ]
+    # Runs of one network share the freeflow shapefile, it is loaded once per distinct file
+    layer_paths = list(
+        dict.fromkeys(
+            Path(run_dir) / config["input"]["model"]["freeflow"] for run_dir in run_dirs
+        )
+    )
+    if config["input"].get("renumber"):
+        layer_paths.append(Path(config["input"]["renumber"]["freeflow"]))
+    return load_static_inputs(csv_paths, layer_paths)
+
+
+def transit_run_summary(output_dir, valTotal_Operator):
+    """Headline metrics of a run: modeled boardings and percent difference by operator."""
+    operator = pd.read_csv(output_dir / valTotal_Operator)
+    operator = operator.drop_duplicates(subset="Operator").set_index("Operator")
+    modeled = parse_formatted_number(operator["Modeled"]).add_prefix("Modeled: ")
+    pct_diff = parse_formatted_number(operator["Pct Diff"]).add_prefix("Pct Diff: ")
+    return pd.concat([modeled, pct_diff])
+
+
+def transit_run_config(config, run_dir):
+    """Config of one model run of a batch or service, written to <output dir>/<run name>."""
+    run_config = copy.deepcopy(config)
+    run_config["input"]["model"]["dir"] = str(run_dir)
+    run_config["output"]["dir"] = str(Path(config["output"]["dir"]) / batch_run_name(run_dir))
+    # The runs share the network caches (node crosswalk, route index) of the batch output directory
+    run_config["output"].setdefault("cache_dir", str(Path(config["output"]["dir"]) / ".cache"))
+    return run_config
+
+
+def validate_transit_run(config, run_dir):
+    """Validates one model run of a batch."""
+    run_config = transit_run_config(config, run_dir)
+    validation_transit(run_config)
+    return transit_run_summary(
+        Path(run_config["output"]["dir"]), Path(config["total"]["valTotal_Operator"])
     )
+
+
+def serve_transit_run(config, run_dir):
+    """
+    Operator totals of a run right away (MUNI lines and operator tables only), the
+    dashboard outputs are written in the background from the same assignment tables.
+    """
+    run_config = transit_run_config(config, run_dir)
+    output_dir = Path(run_config["output"]["dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    transit_input_dir = Path(config["input"]["observed"]["dir"])
+    model_MUNI_Line = Path(config["muni"]["model_MUNI_Line"])
+    valTotal_Operator = Path(config["total"]["valTotal_Operator"])
+
+    combined_gdf = read_transit_assignments(run_dir, time_periods)
+    process_muni(
+        combined_gdf,
+        Path(config["input"]["observed"]["muni_name_match"]),
+        Path(config["input"]["support"]["line_rename"]),
+        transit_input_dir,
+        Path(config["input"]["observed"]["muni_line"]),
+        output_dir,
+        model_MUNI_Line,
+        config["muni"].get("route_modes"),
+        config["muni"].get("directions"),
+    )
+    process_valTotal_operator(
+        combined_gdf,
+        transit_input_dir,
+        output_dir,
+        Path(config["input"]["observed"]["ntd"]),
+        Path(config["total"]["valTotal_Operator_md"]),
+        valTotal_Operator,
+        model_MUNI_Line,
+        load_mode_lookup(config["total"]),
+        config["total"].get("ferry_names"),
+    )
+    summary = transit_run_summary(output_dir, valTotal_Operator)
+    return summary, partial(validation_transit, run_config, combined_gdf)
+
+
+def watch_transit(config, poll_seconds=30, stable_polls=2):
+    """
+    Reads each time period's transit assignment as soon as its file is complete, with
+    the boardings by system of the periods so far in the watch progress csv, and runs
+    the full validation once the last period has arrived.
+    """
+    model_run_dir = Path(config["input"]["model"]["dir"])
+    output_dir = Path(config["output"]["dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    progress_path = output_dir / config["output"].get("watch_progress", "watch_progress.csv")
+    assignments = {}
+    progress = []
+
+    def read_period(period, filepath):
+        assignments[period] = read_transit_assignment(filepath, period)
+        boardings = read_dbf_and_groupby_sum(assignments[period], None, ["SYSTEM"], "AB_BRDA")
+        progress.append(boardings.set_index("SYSTEM")["AB_BRDA"].rename(period))
+        pd.concat(progress, axis=1).reset_index().to_csv(progress_path, index=False)
+        print(f"{period} boardings saved to {progress_path}")
+
+    watch_files(
+        transit_assignment_filepaths(model_run_dir, time_periods),
+        read_period,
+        poll_seconds,
+        stable_polls,
+    )
+    combined_gdf = concat_compact([assignments[period] for period in time_periods])
+    validation_transit(config, combined_gdf)
+
+
+def validation_transit_batch(config, run_dirs, workers=None):
+    shared_inputs = transit_static_inputs(config, run_dirs)
+    summaries = run_batch(
+        partial(validate_transit_run, config), run_dirs, shared_inputs, workers
+    )
+    write_run_comparison(
+        summaries,
+        config["output"]["dir"],
+        config["output"].get("batch_comparison", "batch_comparison"),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transit validation from a TOML configuration file.")
+    parser.add_argument("config_path", type=str, help="Path to the TOML configuration file.")
+    parser.add_argument("--runs", nargs="+", help="Model run directories to validate as one batch.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes for --runs.")
+    parser.add_argument("--serve", action="store_true", help="Serve validation requests over a local HTTP API.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host of the --serve API.")
+    parser.add_argument("--port", type=int, default=8766, help="Port of the --serve API.")
+    parser.add_argument("--watch", action="store_true", help="Validate each time period as its assignment lands.")
+    parser.add_argument("--poll-seconds", type=float, default=30, help="Seconds between --watch polls.")
+    parser.add_argument("--stable-polls", type=int, default=2, help="Unchanged polls for a --watch file to be complete.")
+    args = parser.parse_args()
+
+    toml_path = Path(args.config_path)
+    print(toml_path)
+    
+    try:
+        with open(toml_path, "rb") as f:
+            config = toml.load(f)
+    except:
+        config = toml.load(toml_path)
+    set_backend(**config.get("engine", {}))
+
+    if args.serve:
+        set_static_inputs(transit_static_inputs(config, [config["input"]["model"]["dir"]]))
+        serve_validation(partial(serve_transit_run, config), args.host, args.port, args.workers or 1)
+    elif args.runs:
+        validation_transit_batch(config, args.runs, args.workers)
+    elif args.watch:
+        watch_transit(config, args.poll_seconds, args.stable_polls)
+    else:
+        validation_transit(config)
@@ -1,5 +1,6 @@
 import pandas as pd
 import toml
+from shared.inputs import read_static_csv
 from transit.utils import read_dbf_and_groupby_sum, read_transit_assignments, time_periods
 
 station_locations = {
@@ -10,7 +11,7 @@ station_locations = {
 
 def process_bart_data(combined_gdf, transit_input_dir, station_node_match):
     # Process BART data for different routes and columns
-    nodes = pd.read_csv(transit_input_dir / station_node_match)
+    nodes = read_static_csv(transit_input_dir / station_node_match)
     nodes = nodes[["Station", "Node", "County"]]
     # AB_BRDA represents the boarding ridership from A to B
     bart_boarding = read_dbf_and_groupby_sum(
@@ -147,7 +148,7 @@ def determineScreenline(x):
 
 
 def process_bart_sf(combined_gdf, transit_input_dir, station_node_match):
-    nodes = pd.read_csv(transit_input_dir / station_node_match)
+    nodes = read_static_csv(transit_input_dir / station_node_match)
     nodes = nodes[["Station", "Node", "County"]]
 
     lines = ["BART", "EBART", "OAC"]
@@ -0,0 +1,85 @@
+import threading
+import weakref
+
+import pandas as pd
+
+_connection = None
+_registered = {"frame": None}
+# The connection is shared by the threads of the --serve mode
+_lock = threading.Lock()
+
+
+def connection():
+    """The in-memory DuckDB connection, created on first use."""
+    global _connection
+    if _connection is None:
+        try:
+            import duckdb
+        except ImportError as error:
+            raise ImportError(
+                "The duckdb backend needs the duckdb package: pip install duckdb"
+            ) from error
+        _connection = duckdb.connect()
+    return _connection
+
+
+def quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def register_frame(df):
+    """
+    Register a frame as the DuckDB table "frame", without its geometry. The registration
+    is reused while the same frame is queried, e.g. the assignment table by every
+    BART, MUNI, screenline and operator aggregation.
+    """
+    registered = _registered["frame"]
+    if registered is None or registered() is not df:
+        columns = [col for col in df.columns if col != "geometry"]
+        connection().register("frame", pd.DataFrame(df[columns]))
+        _registered["frame"] = weakref.ref(df)
+
+
+def groupby_sum(df, system_filter, groupby_columns, sum_column):
+    """
+    SQL version of `read_dbf_and_groupby_sum`: filter on SYSTEM, group by the columns
+    (rows with a missing key dropped, sorted like pandas) and sum a column.
+    """
+    if isinstance(groupby_columns, str):
+        groupby_columns = [groupby_columns]
+    keys = ", ".join(quote(col) for col in groupby_columns)
+    conditions = [f"{quote(col)} IS NOT NULL" for col in groupby_columns]
+    parameters = []
+    if system_filter is not None:
+        conditions.append('"SYSTEM" = ?')
+        parameters.append(system_filter)
+    query = (
+        f"SELECT {keys}, SUM({quote(sum_column)}) AS {quote(sum_column)} FROM frame "
+        f"WHERE {' AND '.join(conditions)} GROUP BY {keys} ORDER BY {keys}"
+    )
+    with _lock:
+        register_frame(df)
+        result = connection().execute(query, parameters).df()
+    # DuckDB widens integer sums, keep the pandas dtypes
+    for col in groupby_columns + [sum_column]:
+        if len(result) and result[col].dtype != df[col].dtype:
+            result[col] = result[col].astype(df[col].dtype)
+    return result
+
+
+def read_csv_links(path, column_names, keys):
+    """
+    Scan a CSV (e.g. a loaded network) with DuckDB, reading only `column_names` and keeping
+    the rows whose packed A/B key (see `shared.inputs.pack_link_keys`) is in `keys`.
+    """
+    columns = ", ".join(quote(col) for col in column_names)
+    query = (
+        f"SELECT {columns} FROM read_csv_auto(?) "
+        '''WHERE (("A"::BIGINT << 32) | "B"::BIGINT) IN (SELECT "key" FROM link_keys)'''
+    )
+    with _lock:
+        connection().register("link_keys", pd.DataFrame({"key": keys}))
+        result = connection().execute(query, [str(path)]).df()
+        connection().unregister("link_keys")
+    return result
+
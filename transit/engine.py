@@ -0,0 +1,50 @@
+import pandas as pd
+from transit import duckdb_backend, polars_backend
+
+# Aggregation backend of the validation scripts: "pandas" (default), "duckdb" or "polars".
+# With compare, the backend results are checked against the pandas ones, which are returned.
+engine = {"backend": "pandas", "compare": False}
+
+backends = {"duckdb": duckdb_backend, "polars": polars_backend}
+
+
+def set_backend(backend="pandas", compare=False):
+    """
+    Select the aggregation backend, from the [engine]/[ENGINE] config table.
+
+    Parameters:
+    backend (str): "pandas", "duckdb" (an embedded, in-process DuckDB database) or
+        "polars" (multi-threaded Polars lazy queries).
+    compare (bool): Run pandas too and raise if the backend results differ.
+    """
+    if backend not in ("pandas", *backends):
+        raise ValueError(
+            f"Unknown backend '{backend}', expected 'pandas', 'duckdb' or 'polars'"
+        )
+    # The optional package of the backend is imported here, so a missing one fails early
+    if backend == "duckdb":
+        duckdb_backend.connection()
+    if backend == "polars":
+        polars_backend.polars()
+    engine.update(backend=backend, compare=compare)
+
+
+def active_backend():
+    """The module of the selected backend (`groupby_sum`, `read_csv_links`), None for pandas."""
+    return backends.get(engine["backend"])
+
+
+def compare_results(result, expected, description):
+    """Raise if the backend result differs from the pandas one (beyond float summation order)."""
+    try:
+        pd.testing.assert_frame_equal(
+            result.reset_index(drop=True),
+            expected.reset_index(drop=True),
+            check_dtype=False,
+            check_exact=False,
+            rtol=1e-9,
+        )
+    except AssertionError as error:
+        raise AssertionError(
+            f"{engine['backend']} and pandas results differ for {description}: {error}"
+        )
@@ -4,45 +4,11 @@ from pathlib import Path
 import geopandas as gpd
 import pandas as pd
 import toml
-from shapely.geometry import LineString, Point
-from transit.utils import (
-    format_dataframe,
-    read_dbf_and_groupby_sum,
-    read_transit_assignments,
-    time_periods,
-)
-
-
-def sort_dataframe_by_mixed_column(df, column_name):
-    """
-    Sorts a DataFrame by a column that contains mixed numeric-text values. Numeric prefixes are sorted numerically,
-    and text entries are sorted alphabetically. Null values are sorted to the bottom.
-
-    Parameters:
-    df (DataFrame): The DataFrame to sort.
-    column_name (str): The name of the column with mixed numeric-text values to sort by.
-
-    Returns:
-    DataFrame: The sorted DataFrame.
-    """
-    # Extract the numeric part and the text part into separate columns
-    split_columns = df[column_name].str.extract(r"(?:(\d+) - )?(.*)")
-
-    # Convert the numeric part to integers, using a placeholder for sorting null values
-    placeholder_for_sorting = 999999  # Use a large number to sort nulls last
-    split_columns[0] = (
-        pd.to_numeric(split_columns[0], errors="coerce")
-        .fillna(placeholder_for_sorting)
-        .astype(int)
-    )
-
-    # Sort by the numeric part and then by the text part, ensuring null values go to the bottom
-    df_sorted = df.loc[split_columns.sort_values(by=[0, 1], na_position="last").index]
-
-    # Reset the index of the sorted DataFrame
-    df_sorted = df_sorted.reset_index(drop=True)
-
-    return df_sorted
+from shared.inputs import read_static_csv, read_static_layer
+from shared.maps import write_map_layer
+from transit.route_index import route_link_index, route_load_profiles, route_polylines, route_stop_summary
+from transit.routes import route_direction
+from transit.utils import format_dataframe, read_transit_assignments, time_periods
 
 
 def split_dataframe_by_name_ending(df, column_name):
@@ -65,28 +31,31 @@ def split_dataframe_by_name_ending(df, column_name):
     return df_ending_i, df_ending_o
 
 
-def map_name_to_direction(name):
-    if name.endswith("I"):
-        return "IB"
-    elif name.endswith("O"):
-        return "OB"
-    else:
-        return None  # Return None for other cases
-
-
-def concat_ordered_geometries(group):
-    """ Function to concatenate ordered geometries """
-    sorted_geoms = group.sort_values(by="SEQ")["geometry"]
-    return LineString([pt for geom in sorted_geoms for pt in geom.coords])
+def create_station_df(transit_input_dir, station_node_match, crs=None):
+    df_station_name = read_static_csv(transit_input_dir / station_node_match)
+    station = gpd.GeoDataFrame(
+        df_station_name,
+        geometry=gpd.points_from_xy(df_station_name["x"], df_station_name["y"]),
+    )
+    if crs is not None:
+        station = station.set_crs("epsg:2227").to_crs(crs)
+    return station
 
 
-def create_station_df(transit_input_dir, station_node_match):
-    df_station_name = pd.read_csv(transit_input_dir / station_node_match)
-    df_station_name["geometry"] = df_station_name.apply(
-        lambda row: Point(row["x"], row["y"]), axis=1
+def muni_direction_layer(MUNI_df, MUNI_names):
+    """
+    Map layer of one direction: each route of a MUNI_IB/MUNI_OB table with the polyline
+    of its first model line (by Name). Routes with a missing value are left out.
+    """
+    layer = MUNI_df[["Route", "Observed", "Modeled", "Diff", "Percentage Diff"]].merge(
+        MUNI_names, on="Route"
+    )
+    layer = layer.dropna().sort_values("Name", kind="stable").drop_duplicates("Route")
+    layer = layer.sort_values("Route", kind="stable").reset_index(drop=True)
+    return gpd.GeoDataFrame(
+        layer[["Route", "Observed", "Modeled", "Diff", "Percentage Diff", "AB", "Direction", "geometry"]],
+        geometry="geometry",
     )
-    station = gpd.GeoDataFrame(df_station_name, geometry="geometry")
-    return station
 
 
 def process_muni_map(
@@ -102,105 +71,34 @@ def process_muni_map(
     MUNI_IB,
     MUNI_map_IB,
     MUNI_map_OB,
+    map_format=None,
+    cache_dir=None,
+    MUNI_load_profile=None,
+    MUNI_stops=None,
 ):
-    MUNI = read_dbf_and_groupby_sum(
-        combined_gdf, "SF MUNI", ["FULLNAME", "NAME", "AB", "A", "B", "SEQ"], "AB_BRDA"
-    )
-    MUNI = sort_dataframe_by_mixed_column(MUNI, "FULLNAME")
-    MUNI["Direction"] = MUNI["NAME"].apply(map_name_to_direction)
-    MUNI_day = MUNI.groupby(
-        ["FULLNAME", "NAME", "AB", "A", "B", "SEQ", "Direction"], as_index=False
-    )["AB_BRDA"].sum()
-    MUNI_day = MUNI_day.rename(columns={"NAME": "Name"})
-    model_MUNI_line_df = pd.read_csv(output_transit_dir / model_MUNI_Line)
-    MUNI_map = model_MUNI_line_df.merge(MUNI_day, on="Name", how="left")
-    MUNI_map = MUNI_map[["Name", "Line", "AB", "A", "B", "SEQ"]]
-    MUNI_map["Direction"] = MUNI_map["Name"].apply(map_name_to_direction)
+    # Ordered links of every route, from the route index of the network
+    index, positions = route_link_index(combined_gdf, FREEFLOW_SHP, cache_dir)
+    if MUNI_load_profile is not None:
+        profiles = route_load_profiles(index, combined_gdf, positions, "SF MUNI")
+        profiles.to_csv(muni_output_dir / MUNI_load_profile, index=False)
+        if MUNI_stops is not None:
+            route_stop_summary(profiles).to_csv(muni_output_dir / MUNI_stops, index=False)
 
-    MUNI_IB_df = pd.read_csv(muni_output_dir / MUNI_IB)
-    MUNI_map_IN = MUNI_map[MUNI_map["Direction"] == "IB"]
-    MUNI_map_IN = MUNI_map_IN.rename(columns={"Line": "Route"})
-    MUNI_IB_df = MUNI_IB_df.merge(MUNI_map_IN, on="Route", how="left")
-
-    MUNI_map_OUT = MUNI_map[MUNI_map["Direction"] == "OB"]
-    MUNI_map_OUT = MUNI_map_OUT.rename(columns={"Line": "Route"})
-    MUNI_OB_df = pd.read_csv(muni_output_dir / MUNI_OB)
-    MUNI_OB_df = MUNI_OB_df.merge(MUNI_map_OUT, on="Route", how="left")
     # GEO info
-    freeflow = gpd.read_file(FREEFLOW_SHP)
+    freeflow = read_static_layer(FREEFLOW_SHP)
     freeflow.crs = "epsg:2227"
     freeflow = freeflow.to_crs(epsg=4236)
-    # node_geo = freeflow[["N", "geometry"]].copy()
-    node_geo = freeflow[["A", "B", "AB", "geometry"]].copy()
-    MUNI_IB_df = MUNI_IB_df[
-        [
-            "Route",
-            "Name",
-            "Observed",
-            "Modeled",
-            "Diff",
-            "Percentage Diff",
-            "AB",
-            "A", 
-            "B",
-            "SEQ",
-            "Direction",
-        ]
-    ]
-    # MUNI_IB_df['A'] = pd.to_numeric(MUNI_IB_df['A'], errors='coerce').fillna(pd.NA).astype('Int64')
-    # MUNI_IB_df['B'] = pd.to_numeric(MUNI_IB_df['B'], errors='coerce').fillna(pd.NA).astype('Int64')
-    # # Merge MUNI_IB_df with node_geo_df to get A_geometry and B_geometry
-    # muni_ib_df = MUNI_IB_df.merge(node_geo, left_on='A', right_on='N', how='left').rename(columns={'geometry': 'A_geometry'})
-    # muni_ib_df = muni_ib_df.merge(node_geo, left_on='B', right_on='N', how='left').rename(columns={'geometry': 'B_geometry'})
-
-    # # Drop the redundant 'N' columns after the merge
-    # muni_ib_df = muni_ib_df.drop(columns=['N_x', 'N_y']).dropna().drop_duplicates()
-    # muni_ib_df['geometry'] = muni_ib_df.apply(lambda row: LineString([row['A_geometry'], row['B_geometry']]), axis=1)
-    muni_ib_df = (
-        MUNI_IB_df.merge(node_geo, on="AB", how="left").dropna().drop_duplicates()
-    )
-    muni_ib_geo = gpd.GeoDataFrame(muni_ib_df, geometry="geometry")
-    # Apply aggregation function using `apply` instead of `agg`
-    aggregated_muni_ib = (
-        muni_ib_geo.groupby("Name")
-        .apply(
-            lambda x: pd.Series(
-                {
-                    "Route": x["Route"].iloc[0],
-                    "Observed": x["Observed"].iloc[0],
-                    "Modeled": x["Modeled"].iloc[0],
-                    "Diff": x["Diff"].iloc[0],
-                    "Percentage Diff": x["Percentage Diff"].iloc[0],
-                    "AB": x["AB"].iloc[0],
-                    "Direction": x["Direction"].iloc[0],
-                    "geometry": concat_ordered_geometries(x),
-                }
-            )
-        )
-        .reset_index()
-    )
+    model_MUNI_line_df = pd.read_csv(output_transit_dir / model_MUNI_Line)
+    MUNI_names = model_MUNI_line_df[["Name", "Line"]].drop_duplicates()
+    MUNI_names = MUNI_names.rename(columns={"Line": "Route"})
+    MUNI_names["Direction"] = route_direction(MUNI_names["Name"])
+    MUNI_names = MUNI_names.merge(route_polylines(index, freeflow, "SF MUNI"), on="Name")
 
-    aggregated_muni_ib = (
-        aggregated_muni_ib.groupby("Route")
-        .apply(
-            lambda x: pd.Series(
-                {
-                    "Observed": x["Observed"].iloc[0],
-                    "Modeled": x["Modeled"].iloc[0],
-                    "Diff": x["Diff"].iloc[0],
-                    "Percentage Diff": x["Percentage Diff"].iloc[0],
-                    "AB": x["AB"].iloc[0],
-                    "Direction": x["Direction"].iloc[0],
-                    "geometry": x["geometry"].iloc[0],
-                }
-            )
-        )
-        .reset_index()
+    MUNI_IB_df = pd.read_csv(muni_output_dir / MUNI_IB)
+    aggregated_muni_ib = muni_direction_layer(
+        MUNI_IB_df, MUNI_names[MUNI_names["Direction"] == "IB"]
     )
-
-    # Convert to GeoDataFrame
-    aggregated_muni_ib = gpd.GeoDataFrame(aggregated_muni_ib, geometry="geometry")
-    aggregated_muni_ib.to_file(shp_file_dir / muni_ib_shp)
+    write_map_layer(aggregated_muni_ib, shp_file_dir / muni_ib_shp, map_format)
     MUNI_map_IB_df = aggregated_muni_ib[
         ["Route", "Observed", "Modeled", "Diff", "Percentage Diff", "Direction"]
     ].copy()
@@ -221,73 +119,11 @@ def process_muni_map(
     MUNI_map_IB_df = MUNI_map_IB_df.drop_duplicates()
     MUNI_map_IB_df.to_csv(muni_output_dir / MUNI_map_IB, index=False)
 
-    MUNI_OB_df = MUNI_OB_df[
-        [
-            "Route",
-            "Name",
-            "Observed",
-            "Modeled",
-            "Diff",
-            "Percentage Diff",
-            "AB",
-            "A", 
-            "B",
-            "SEQ",
-            "Direction",
-        ]
-    ]
-    # MUNI_OB_df['A'] = pd.to_numeric(MUNI_OB_df['A'], errors='coerce').fillna(pd.NA).astype('Int64')
-    # MUNI_OB_df['B'] = pd.to_numeric(MUNI_OB_df['B'], errors='coerce').fillna(pd.NA).astype('Int64')
-    # # Merge MUNI_IB_df with node_geo_df to get A_geometry and B_geometry
-    # muni_ob_df = MUNI_OB_df.merge(node_geo, left_on='A', right_on='N', how='left').rename(columns={'geometry': 'A_geometry'})
-    # muni_ob_df = muni_ob_df.merge(node_geo, left_on='B', right_on='N', how='left').rename(columns={'geometry': 'B_geometry'})
-
-    # # Drop the redundant 'N' columns after the merge
-    # muni_ob_df = muni_ob_df.drop(columns=['N_x', 'N_y']).dropna().drop_duplicates()
-    # muni_ob_df['geometry'] = muni_ob_df.apply(lambda row: LineString([row['A_geometry'], row['B_geometry']]), axis=1)
-    muni_ob_df = (
-        MUNI_OB_df.merge(node_geo, on="AB", how="left").dropna().drop_duplicates()
-    )
-    muni_ob_geo = gpd.GeoDataFrame(muni_ob_df, geometry="geometry")
-    # Apply aggregation function using `apply` instead of `agg`
-    aggregated_muni_ob = (
-        muni_ob_geo.groupby("Name")
-        .apply(
-            lambda x: pd.Series(
-                {
-                    "Route": x["Route"].iloc[0],
-                    "Observed": x["Observed"].iloc[0],
-                    "Modeled": x["Modeled"].iloc[0],
-                    "Diff": x["Diff"].iloc[0],
-                    "Percentage Diff": x["Percentage Diff"].iloc[0],
-                    "AB": x["AB"].iloc[0],
-                    "Direction": x["Direction"].iloc[0],
-                    "geometry": concat_ordered_geometries(x),
-                }
-            )
-        )
-        .reset_index()
-    )
-
-    aggregated_muni_ob = (
-        aggregated_muni_ob.groupby("Route")
-        .apply(
-            lambda x: pd.Series(
-                {
-                    "Observed": x["Observed"].iloc[0],
-                    "Modeled": x["Modeled"].iloc[0],
-                    "Diff": x["Diff"].iloc[0],
-                    "Percentage Diff": x["Percentage Diff"].iloc[0],
-                    "AB": x["AB"].iloc[0],
-                    "Direction": x["Direction"].iloc[0],
-                    "geometry": x["geometry"].iloc[0],
-                }
-            )
-        )
-        .reset_index()
+    MUNI_OB_df = pd.read_csv(muni_output_dir / MUNI_OB)
+    aggregated_muni_ob = muni_direction_layer(
+        MUNI_OB_df, MUNI_names[MUNI_names["Direction"] == "OB"]
     )
-
-    aggregated_muni_ob.to_file(shp_file_dir / muni_ob_shp)
+    write_map_layer(aggregated_muni_ob, shp_file_dir / muni_ob_shp, map_format)
     MUNI_map_OB_df = aggregated_muni_ob[
         ["Route", "Observed", "Modeled", "Diff", "Percentage Diff", "Direction"]
     ].copy()
@@ -307,38 +143,52 @@ def process_muni_map(
     MUNI_map_OB_df.to_csv(muni_output_dir / MUNI_map_OB, index=False)
 
 
-def bart_map(
-    type,
-    group_by,
-    TOD,
-    obs_BART_line,
-    model_BART_line,
-    csv,
-    shp,
-    station,
-    bart_output_dir,
-    shp_file_dir,
-):
-    obs_condition = pd.Series([True] * len(obs_BART_line))
-    model_condition = pd.Series([True] * len(model_BART_line))
-    # Processing observed data
-    BART_obs = obs_BART_line[obs_condition].groupby(group_by)[type].sum().reset_index()
-    BART_obs.rename(columns={type: "Observed"}, inplace=True)
+def bart_layer_tables(obs_BART_line, model_BART_line, layers):
+    """
+    Compute the observed vs modeled table of every BART map layer from a single
+    (Station, TOD) aggregation of the observed and modeled data.
 
-    # Processing modeled data
-    BART_model = (
-        model_BART_line[model_condition].groupby(group_by)[type].sum().reset_index()
-    )
-    BART_model.rename(columns={type: "Modeled"}, inplace=True)
+    Parameters:
+    obs_BART_line (DataFrame): The observed BART station data.
+    model_BART_line (DataFrame): The modeled BART station data.
+    layers (list of tuples): (type, TOD) per layer, where type is "Boardings" or
+        "Alightings" and TOD is None for the daily layer.
+
+    Returns:
+    list of DataFrame: The table of each layer, in the order of `layers`.
+    """
+    types = list(dict.fromkeys(type for type, _ in layers))
+    obs = obs_BART_line.groupby(["Station", "TOD"], dropna=False)[types].sum()
+    model = model_BART_line.groupby(["Station", "TOD"], dropna=False)[types].sum()
+    daily_obs = obs.groupby("Station")[types].sum()
+    daily_model = model.groupby("Station")[types].sum()
+
+    tables = []
+    for type, TOD in layers:
+        if TOD is None:
+            BART_obs, BART_model, group_by = daily_obs, daily_model, ["Station"]
+        else:
+            BART_obs = obs[
+                (obs.index.get_level_values("TOD") == TOD)
+                & obs.index.get_level_values("Station").notna()
+            ]
+            BART_model, group_by = model, ["Station", "TOD"]
+        BART = pd.merge(
+            BART_obs[type].rename("Observed").reset_index(),
+            BART_model[type].rename("Modeled").reset_index(),
+            on=group_by,
+            how="left",
+        )
+        BART["Diff"] = BART["Modeled"] - BART["Observed"]
+        BART["Percentage Diff"] = BART["Diff"] / BART["Observed"]
+        BART["ABS Percentage Diff"] = abs(BART["Percentage Diff"])
+        BART["ABS Diff"] = abs(BART["Diff"])
+        tables.append(BART)
+    return tables
 
-    BART = pd.merge(BART_obs, BART_model, on=group_by, how="left")
-    BART["Diff"] = BART["Modeled"] - BART["Observed"]
-    BART["Percentage Diff"] = BART["Diff"] / BART["Observed"]
-    BART["ABS Percentage Diff"] = abs(BART["Percentage Diff"])
-    BART["ABS Diff"] = abs(BART["Diff"])
-    if TOD is not None:
-        BART = BART[BART["TOD"] == TOD].copy()
-    BART.to_csv(os.path.join(bart_output_dir, csv), index=False)
+
+def bart_map_layer(BART, station):
+    """Format a BART layer table and join it onto the (projected) station points."""
     BART_2 = BART.copy()
     BART_2["Percentage Diff"] = BART_2["Percentage Diff"] * 100
     numeric_cols = ["Observed", "Modeled", "Diff"]
@@ -346,10 +196,7 @@ def bart_map(
         BART_2, numeric_columns=numeric_cols, percentage_columns=["Percentage Diff"]
     )
     bart_map = bart_map.merge(station, on="Station", how="right")
-    bart_map = gpd.GeoDataFrame(bart_map, geometry="geometry")
-    bart_map.crs = "epsg:2227"
-    bart_map = bart_map.to_crs(epsg=4236)
-    bart_map.to_file(os.path.join(shp_file_dir, shp))
+    return gpd.GeoDataFrame(bart_map, geometry="geometry", crs=station.crs)
 
 
 def process_bart_map(
@@ -372,84 +219,41 @@ def process_bart_map(
     BART_at_pm,
     BART_at_map_pm,
     station_node_match,
+    BART_map_layers=None,
+    map_format=None,
 ):
+    """
+    Write the BART boardings/alightings map layers (daily, AM, PM). Each layer is
+    written as a csv and a map layer in `map_format` (default shapefile); if
+    `BART_map_layers` is given, all layers are also written together as layers of
+    one GeoPackage.
+    """
     # BART
-    station = create_station_df(transit_input_dir, station_node_match)
-    obs_BART_line = pd.read_csv(transit_input_dir / observed_BART)
+    station = create_station_df(transit_input_dir, station_node_match, crs="epsg:4236")
+    obs_BART_line = read_static_csv(transit_input_dir / observed_BART)
     model_BART_line = pd.read_csv(output_transit_dir / model_BART)
 
-    bart_map(
-        "Boardings",
-        ["Station"],
-        None,
-        obs_BART_line,
-        model_BART_line,
-        BART_br,
-        BART_br_map,
-        station,
-        bart_output_dir,
-        shp_file_dir,
-    )
-    bart_map(
-        "Boardings",
-        ["Station", "TOD"],
-        "AM",
-        obs_BART_line,
-        model_BART_line,
-        BART_br_am,
-        BART_br_map_am,
-        station,
-        bart_output_dir,
-        shp_file_dir,
-    )
-    bart_map(
-        "Boardings",
-        ["Station", "TOD"],
-        "PM",
-        obs_BART_line,
-        model_BART_line,
-        BART_br_pm,
-        BART_br_map_pm,
-        station,
-        bart_output_dir,
-        shp_file_dir,
-    )
-    bart_map(
-        "Alightings",
-        ["Station"],
-        None,
-        obs_BART_line,
-        model_BART_line,
-        BART_at,
-        BART_at_map,
-        station,
-        bart_output_dir,
-        shp_file_dir,
-    )
-    bart_map(
-        "Alightings",
-        ["Station", "TOD"],
-        "AM",
-        obs_BART_line,
-        model_BART_line,
-        BART_at_am,
-        BART_at_map_am,
-        station,
-        bart_output_dir,
-        shp_file_dir,
-    )
-    bart_map(
-        "Alightings",
-        ["Station", "TOD"],
-        "PM",
-        obs_BART_line,
-        model_BART_line,
-        BART_at_pm,
-        BART_at_map_pm,
-        station,
-        bart_output_dir,
-        shp_file_dir,
+    layers = [
+        ("Boardings", None, BART_br, BART_br_map),
+        ("Boardings", "AM", BART_br_am, BART_br_map_am),
+        ("Boardings", "PM", BART_br_pm, BART_br_map_pm),
+        ("Alightings", None, BART_at, BART_at_map),
+        ("Alightings", "AM", BART_at_am, BART_at_map_am),
+        ("Alightings", "PM", BART_at_pm, BART_at_map_pm),
+    ]
+    tables = bart_layer_tables(
+        obs_BART_line, model_BART_line, [(type, TOD) for type, TOD, _, _ in layers]
     )
+    for (_, _, csv, shp), BART in zip(layers, tables):
+        BART.to_csv(os.path.join(bart_output_dir, csv), index=False)
+        bart_map = bart_map_layer(BART, station)
+        write_map_layer(bart_map, os.path.join(shp_file_dir, shp), map_format)
+        if BART_map_layers is not None:
+            bart_map.to_file(
+                os.path.join(shp_file_dir, BART_map_layers),
+                layer=Path(shp).stem,
+                driver="GPKG",
+            )
 
 
 if __name__ == "__main__":
@@ -3,32 +3,11 @@ from pathlib import Path
 # import numpy as np
 import pandas as pd
 import toml
+from shared.inputs import read_static_csv
+from transit.routes import muni_direction_rules, route_direction, route_mode
 from transit.utils import read_dbf_and_groupby_sum, read_transit_assignments, time_periods
 
 
-def map_name_to_direction(name):
-    if name.endswith("I") or name in ["MUN61R"]:
-        return "IB"
-    elif name.endswith("O") or name in ["MUN61"]:
-        return "OB"
-    else:
-        return None  # Return None for other cases
-
-def routeType(x):
-    if x in ['J-Church', 'KT-Ingleside/Third Street','M-Ocean View','N-Judah','T-Third Street']:
-        return 'Rail'
-    elif x in ['59', '60', '61', '61R']:
-        return 'Cable Car'
-    elif x in ['F-Market & Wharves']:
-        return 'Streetcar'
-    elif 'X' in str(x) or x in ['8']:
-        return 'Express Bus'
-    elif 'R' in str(x) and x not in ['94R']:
-        return 'Rapid'  # Perhaps change to Rapid later
-    else:
-        return 'Local Bus'
-
-
 def process_muni(
     combined_gdf,
     muni_name_match,
@@ -37,10 +16,12 @@ def process_muni(
     observed_MUNI_Line,
     output_transit_dir,
     model_MUNI_Line,
+    mode_rules=None,
+    direction_rules=None,
 ):
     # line_names = read_transit_lines(model_run_dir, transit_line_rename_filepath)
-    rename = pd.read_csv(transit_line_rename_filepath)
-    obs_model_name_match = pd.read_csv(transit_input_dir / muni_name_match)
+    rename = read_static_csv(transit_line_rename_filepath)
+    obs_model_name_match = read_static_csv(transit_input_dir / muni_name_match)
     obs_model_name_match = obs_model_name_match[["obs_line", "Name"]]
     obs_model_name_match = obs_model_name_match.rename(
         columns={"Name": "NAME"}
@@ -50,7 +31,7 @@ def process_muni(
     MUNI = read_dbf_and_groupby_sum(
         combined_gdf, "SF MUNI", ["NAME", "MODE","TOD"], "AB_BRDA"
     )
-    MUNI["Direction"] = MUNI["NAME"].apply(map_name_to_direction)
+    MUNI["Direction"] = route_direction(MUNI["NAME"], direction_rules or muni_direction_rules)
 
     MUNI = MUNI.sort_values(by="NAME").reset_index(drop=True)
     # Merge df1 with df2 based on the Name/NAME column
@@ -66,10 +47,10 @@ def process_muni(
     )
 
     # Apply the transformation function to the 'Line' column
-    # obs_MUNI_line = pd.read_csv(transit_input_dir / observed_MUNI_Line)
+    # obs_MUNI_line = read_static_csv(transit_input_dir / observed_MUNI_Line)
     # mode = obs_MUNI_line[["Line", "Mode"]].drop_duplicates().reset_index(drop=True)
     # mode_dict = mode.set_index("Line")["Mode"].to_dict()
-    MUNI_full["Mode"] = MUNI_full["Line"].apply(lambda x: routeType(x))
+    MUNI_full["Mode"] = route_mode(MUNI_full["Line"], mode_rules)
     MUNI_full["Key_line_dir"] = MUNI_full["Line"].astype(str) + MUNI_full["Direction"]
     MUNI_full["Key_line_tod"] = (
         MUNI_full["Line"].astype(str) + MUNI_full["TOD"] + MUNI_full["Direction"]
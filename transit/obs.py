@@ -2,6 +2,7 @@ from pathlib import Path
 
 import pandas as pd
 import toml
+from shared.inputs import read_static_csv
 from transit.utils import (
     dataframe_to_markdown,
     format_numeric,
@@ -26,7 +27,7 @@ def process_obs_data(
     obs_Screenlines_md,
     obs_NTD_md,
 ):
-    obs_MUNI_line = pd.read_csv(transit_input_dir / observed_MUNI_Line)
+    obs_MUNI_line = read_static_csv(transit_input_dir / observed_MUNI_Line)
     obs_MUNI_line["Ridership"] = obs_MUNI_line["Ridership"].apply(
         lambda x: format_numeric(x)
     )
@@ -44,7 +45,7 @@ def process_obs_data(
         column_widths=100,
     )
 
-    obs_BART_line = pd.read_csv(transit_input_dir / observed_BART)
+    obs_BART_line = read_static_csv(transit_input_dir / observed_BART)
     obs_BART_line["Boardings"] = obs_BART_line["Boardings"].apply(
         lambda x: format_numeric(x)
     )
@@ -59,7 +60,7 @@ def process_obs_data(
         column_widths=100,
     )
 
-    obs_BART_county = pd.read_csv(transit_input_dir / observed_BART_county)
+    obs_BART_county = read_static_csv(transit_input_dir / observed_BART_county)
     obs_BART_county["Boardings"] = obs_BART_county["Boardings"].apply(
         lambda x: format_numeric(x)
     )
@@ -74,7 +75,7 @@ def process_obs_data(
         column_widths=100,
     )
 
-    obs_BART_Screenline = pd.read_csv(transit_input_dir / observed_BART_Screenline)
+    obs_BART_Screenline = read_static_csv(transit_input_dir / observed_BART_Screenline)
     obs_BART_Screenline["Ridership"] = obs_BART_Screenline["Ridership"].apply(
         lambda x: format_numeric(x)
     )
@@ -86,7 +87,7 @@ def process_obs_data(
         column_widths=100,
     )
 
-    obs_Screenline = pd.read_csv(transit_input_dir / observed_Screenline)
+    obs_Screenline = read_static_csv(transit_input_dir / observed_Screenline)
     obs_Screenline["Ridership"] = obs_Screenline["Ridership"].apply(
         lambda x: format_numeric(x)
     )
@@ -98,7 +99,7 @@ def process_obs_data(
         column_widths=100,
     )
 
-    obs_NTD_df = pd.read_csv(transit_input_dir / observed_NTD)
+    obs_NTD_df = read_static_csv(transit_input_dir / observed_NTD)
     dataframe_to_markdown(
         obs_NTD_df,
         Path(markdown_output_dir / obs_NTD_md),
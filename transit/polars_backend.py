@@ -0,0 +1,78 @@
+import threading
+import weakref
+
+_registered = {"frame": None, "lazy": None}
+# The lazy frame is shared by the threads of the --serve mode
+_lock = threading.Lock()
+
+
+def polars():
+    """The polars module, imported on first use."""
+    try:
+        import polars
+    except ImportError as error:
+        raise ImportError(
+            "The polars backend needs the polars package: pip install polars"
+        ) from error
+    return polars
+
+
+def lazy_frame(df):
+    """
+    Polars lazy frame of a pandas frame, without its geometry. The conversion is reused
+    while the same frame is queried, e.g. the assignment table by every BART, MUNI,
+    screenline and operator aggregation.
+    """
+    with _lock:
+        registered = _registered["frame"]
+        if registered is None or registered() is not df:
+            columns = [col for col in df.columns if col != "geometry"]
+            pl = polars()
+            # Categorical keys as strings, so they sort like the pandas values
+            _registered["lazy"] = (
+                pl.from_pandas(df[columns])
+                .lazy()
+                .with_columns(pl.col(pl.Categorical).cast(pl.String))
+            )
+            _registered["frame"] = weakref.ref(df)
+        return _registered["lazy"]
+
+
+def groupby_sum(df, system_filter, groupby_columns, sum_column):
+    """
+    Lazy query version of `read_dbf_and_groupby_sum`: filter on SYSTEM, group by the
+    columns (rows with a missing key dropped, sorted like pandas) and sum a column. Only
+    the filter, key and sum columns are scanned and the query runs on all cores; the
+    result is converted back to pandas.
+    """
+    pl = polars()
+    if isinstance(groupby_columns, str):
+        groupby_columns = [groupby_columns]
+    query = lazy_frame(df)
+    if system_filter is not None:
+        query = query.filter(pl.col("SYSTEM") == system_filter)
+    query = (
+        query.select(groupby_columns + [sum_column])
+        .drop_nulls(groupby_columns)
+        .group_by(groupby_columns)
+        .agg(pl.col(sum_column).sum())
+        .sort(groupby_columns)
+    )
+    result = query.collect().to_pandas()
+    # Polars widens integer sums, keep the pandas dtypes
+    for col in groupby_columns + [sum_column]:
+        if len(result) and result[col].dtype != df[col].dtype:
+            result[col] = result[col].astype(df[col].dtype)
+    return result
+
+
+def read_csv_links(path, column_names, keys):
+    """
+    Lazy scan of a CSV (e.g. a loaded network) with Polars, reading only `column_names`
+    and keeping the rows whose packed A/B key (see `shared.inputs.pack_link_keys`) is in
+    `keys`. Both are pushed down into the multi-threaded reader.
+    """
+    pl = polars()
+    key = pl.col("A").cast(pl.Int64) * (1 << 32) + pl.col("B").cast(pl.Int64)
+    query = pl.scan_csv(str(path)).filter(key.is_in(pl.Series(keys).implode())).select(column_names)
+    return query.collect().to_pandas()
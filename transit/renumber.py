@@ -0,0 +1,238 @@
+import copy
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+from shared.inputs import network_fingerprint, read_static_csv, read_static_layer
+
+# Node crosswalks built in this process, by network pair
+node_crosswalks = {}
+
+
+def network_nodes(links):
+    """
+    Node locations of a network, from its links: A at the first and B at the last point
+    of each link geometry.
+
+    Parameters:
+    links (GeoDataFrame): Network links with 'A' and 'B' columns.
+
+    Returns:
+    DataFrame: One row per node with its 'Node' id and point 'geometry'.
+    """
+    links = links[links.geometry.notna()]
+    lines = links.geometry.values
+    nodes = pd.DataFrame(
+        {
+            "Node": np.concatenate([links["A"].to_numpy(), links["B"].to_numpy()]),
+            "geometry": np.concatenate(
+                [shapely.get_point(lines, 0), shapely.get_point(lines, -1)]
+            ),
+        }
+    )
+    nodes = nodes[nodes["geometry"].notna()]
+    return nodes.drop_duplicates("Node").reset_index(drop=True)
+
+
+def match_nodes_by_links(old_links, new_links, nodes, link_tolerance):
+    """
+    Matches nodes through their links: each old link is matched to the new link of
+    smallest Hausdorff distance (at most `link_tolerance`) running the same way, and its
+    A/B nodes to the new link's A/B. Used for the nodes that moved, e.g. after a link
+    was redrawn or split.
+
+    Returns:
+    DataFrame: 'Old Node', 'New Node' and the Hausdorff 'Distance' of the matched links.
+    """
+    old_links = old_links[old_links["A"].isin(nodes) | old_links["B"].isin(nodes)]
+    old_lines = old_links.geometry.values
+    new_lines = new_links.geometry.values
+    old_positions, new_positions = shapely.STRtree(new_lines).query(
+        old_lines, predicate="dwithin", distance=link_tolerance
+    )
+    candidates = pd.DataFrame(
+        {
+            "old": old_positions,
+            "new": new_positions,
+            "Distance": shapely.hausdorff_distance(
+                old_lines[old_positions], new_lines[new_positions]
+            ),
+            # Same way: the old start point is nearer the new start than the new end
+            "same_way": shapely.distance(
+                shapely.get_point(old_lines[old_positions], 0),
+                shapely.get_point(new_lines[new_positions], 0),
+            )
+            <= shapely.distance(
+                shapely.get_point(old_lines[old_positions], 0),
+                shapely.get_point(new_lines[new_positions], -1),
+            ),
+        }
+    )
+    candidates = candidates[candidates["same_way"] & (candidates["Distance"] <= link_tolerance)]
+    best = candidates.sort_values(["old", "Distance"], kind="stable").drop_duplicates("old")
+    matches = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "Old Node": old_links[end].to_numpy()[best["old"]],
+                    "New Node": new_links[end].to_numpy()[best["new"]],
+                    "Distance": best["Distance"].to_numpy(),
+                }
+            )
+            for end in ["A", "B"]
+        ],
+        ignore_index=True,
+    )
+    matches = matches[matches["Old Node"].isin(nodes)]
+    return matches.sort_values(["Old Node", "Distance"], kind="stable").drop_duplicates("Old Node")
+
+
+def build_node_crosswalk(old_freeflow, new_freeflow, tolerance=1, link_tolerance=50):
+    """
+    Crosswalk of the node ids of one network to another by geometry. Nodes are matched
+    to the nearest node of the new network within `tolerance` (one bulk STRtree query);
+    the others through their links, by Hausdorff distance (`match_nodes_by_links`).
+
+    Parameters:
+    old_freeflow (str): Network layer the ids to remap refer to, with 'A' and 'B' columns.
+    new_freeflow (str): Network layer of the model run.
+    tolerance (float): Largest node distance, in network units (feet).
+    link_tolerance (float): Largest Hausdorff distance of matched links.
+
+    Returns:
+    DataFrame: One row per old node with its 'New Node' (-1 if unmatched), the match
+        'Distance' and 'Method' ("endpoint", "link" or "unmatched").
+    """
+    old_links = read_static_layer(old_freeflow)
+    new_links = read_static_layer(new_freeflow)
+    if new_links.crs is not None and old_links.crs is not None and new_links.crs != old_links.crs:
+        old_links = old_links.to_crs(new_links.crs)
+    old_nodes = network_nodes(old_links)
+    new_nodes = network_nodes(new_links)
+
+    old_positions, new_positions = shapely.STRtree(new_nodes["geometry"].values).query_nearest(
+        old_nodes["geometry"].values, max_distance=tolerance, all_matches=False
+    )
+    crosswalk = pd.DataFrame(
+        {"Old Node": old_nodes["Node"], "New Node": -1, "Distance": np.nan, "Method": "unmatched"}
+    )
+    crosswalk.loc[old_positions, "New Node"] = new_nodes["Node"].to_numpy()[new_positions]
+    crosswalk.loc[old_positions, "Distance"] = shapely.distance(
+        old_nodes["geometry"].values[old_positions], new_nodes["geometry"].values[new_positions]
+    )
+    crosswalk.loc[old_positions, "Method"] = "endpoint"
+
+    unmatched = crosswalk["Method"] == "unmatched"
+    if unmatched.any():
+        by_links = match_nodes_by_links(
+            old_links[old_links.geometry.notna()],
+            new_links[new_links.geometry.notna()],
+            crosswalk.loc[unmatched, "Old Node"],
+            link_tolerance,
+        ).set_index("Old Node")
+        rows = unmatched & crosswalk["Old Node"].isin(by_links.index)
+        old_ids = crosswalk.loc[rows, "Old Node"]
+        crosswalk.loc[rows, "New Node"] = by_links.loc[old_ids, "New Node"].to_numpy()
+        crosswalk.loc[rows, "Distance"] = by_links.loc[old_ids, "Distance"].to_numpy()
+        crosswalk.loc[rows, "Method"] = "link"
+    crosswalk = crosswalk.astype({"Old Node": "int64", "New Node": "int64"})
+    methods = crosswalk["Method"].value_counts()
+    print(
+        f"Node crosswalk: {methods.get('endpoint', 0)} nodes matched by endpoint, "
+        f"{methods.get('link', 0)} by link geometry, {methods.get('unmatched', 0)} unmatched"
+    )
+    return crosswalk
+
+
+def cached_node_crosswalk(old_freeflow, new_freeflow, cache_dir, tolerance=1, link_tolerance=50):
+    """
+    `build_node_crosswalk`, cached per network pair: the crosswalk is saved to
+    `cache_dir` under the content hashes of both networks and of the tolerances, and
+    reused by every run (and batch worker) on the same pair.
+    """
+    key = hashlib.sha256(
+        f"{network_fingerprint(old_freeflow)} {network_fingerprint(new_freeflow)} "
+        f"{tolerance} {link_tolerance}".encode()
+    ).hexdigest()[:16]
+    if key not in node_crosswalks:
+        cache_path = Path(cache_dir) / f"node_crosswalk_{key}.csv"
+        if cache_path.exists():
+            print(f"Reusing node crosswalk {cache_path}")
+            node_crosswalks[key] = pd.read_csv(cache_path)
+        else:
+            crosswalk = build_node_crosswalk(old_freeflow, new_freeflow, tolerance, link_tolerance)
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name, batch workers may build the same pair at once
+            temporary_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+            crosswalk.to_csv(temporary_path, index=False)
+            os.replace(temporary_path, cache_path)
+            print(f"Node crosswalk saved to {cache_path}")
+            node_crosswalks[key] = crosswalk
+    return node_crosswalks[key]
+
+
+def remap_nodes(values, node_map):
+    """Node id column remapped with a crosswalk dict, -1 (matching no link) for the unmatched ids."""
+    return values.map(node_map).fillna(-1).astype("int64")
+
+
+def remap_config_nodes(table, node_map):
+    """
+    Copy of a config table with its node ids remapped: every integer, list of integers
+    and integer list inside a list (e.g. the A and B lists of the screenlines). Every
+    integer of the table is taken as a node id, so a non-node integer setting added to
+    a table listed in `node_tables` would be silently rewritten (to -1 if it is not a
+    node of the old network).
+    """
+    def remap(value):
+        if isinstance(value, bool) or isinstance(value, str):
+            return value
+        if isinstance(value, int):
+            return node_map.get(value, -1)
+        if isinstance(value, list):
+            return [remap(item) for item in value]
+        return value
+
+    return {name: remap(value) for name, value in table.items()}
+
+
+def renumbered_config(config):
+    """
+    Config of a run with the node-keyed inputs remapped to the run's freeflow network,
+    when [input.renumber] names the network they refer to. The node columns of the
+    observed files in `node_files` are remapped into copies written to the output
+    directory, and the node ids of the config tables in `node_tables` are remapped.
+    """
+    renumber = config["input"].get("renumber")
+    if not renumber:
+        return config
+    output_dir = Path(config["output"]["dir"])
+    new_freeflow = Path(config["input"]["model"]["dir"]) / config["input"]["model"]["freeflow"]
+    crosswalk = cached_node_crosswalk(
+        renumber["freeflow"],
+        new_freeflow,
+        renumber.get("cache_dir", config["output"].get("cache_dir", output_dir / ".cache")),
+        renumber.get("tolerance", 1),
+        renumber.get("link_tolerance", 50),
+    )
+    node_map = dict(zip(crosswalk["Old Node"], crosswalk["New Node"]))
+
+    config = copy.deepcopy(config)
+    transit_input_dir = Path(config["input"]["observed"]["dir"])
+    for name, columns in renumber.get("node_files", {"station_node_match": ["Node"]}).items():
+        df = read_static_csv(transit_input_dir / config["input"]["observed"][name])
+        for col in columns:
+            df[col] = remap_nodes(df[col], node_map)
+            unmatched = df[col] == -1
+            if unmatched.any():
+                print(f"{unmatched.sum()} {name} {col} ids have no node in {new_freeflow}")
+        remapped_path = output_dir / ".cache" / Path(config["input"]["observed"][name]).name
+        remapped_path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(remapped_path, index=False)
+        config["input"]["observed"][name] = str(remapped_path.resolve())
+    for name in renumber.get("node_tables", ["screenline"]):
+        config[name] = remap_config_nodes(config[name], node_map)
+    return config
@@ -0,0 +1,224 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+from shared.inputs import network_fingerprint, pack_link_keys, read_static_layer
+from transit.utils import time_periods
+
+# Route indexes loaded or built in this process, by cache file
+route_indexes = {}
+
+
+def build_route_index(combined_gdf, links):
+    """
+    Route topology of a transit assignment: the links of every route NAME in SEQ order,
+    stored CSR-style. The links of route i are the positions offsets[i] to
+    offsets[i + 1] of the link arrays.
+
+    Parameters:
+    combined_gdf (DataFrame): The transit assignment (any time periods).
+    links (GeoDataFrame): The freeflow network links, with 'A' and 'B' columns.
+
+    Returns:
+    dict: Arrays by route ('names', 'fullnames', 'systems', 'offsets') and by route
+        link ('seq', 'a', 'b', and 'link_ids', the position of the link in `links`,
+        -1 if it is not in the network).
+    """
+    routes = combined_gdf[["SYSTEM", "FULLNAME", "NAME", "SEQ", "A", "B"]].drop_duplicates(["NAME", "SEQ"])
+    routes = routes.astype({"SYSTEM": str, "FULLNAME": str, "NAME": str})
+    routes = routes.sort_values(["NAME", "SEQ"], kind="stable")
+    names, starts, sizes = np.unique(routes["NAME"].to_numpy(dtype=str), return_index=True, return_counts=True)
+
+    network_keys = pd.Series(np.arange(len(links)), index=pack_link_keys(links["A"], links["B"]))
+    network_keys = network_keys[~network_keys.index.duplicated()]
+    link_ids = network_keys.reindex(pack_link_keys(routes["A"], routes["B"])).fillna(-1)
+    return {
+        "names": names,
+        "fullnames": routes["FULLNAME"].to_numpy()[starts].astype(str),
+        "systems": routes["SYSTEM"].to_numpy()[starts].astype(str),
+        "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+        "seq": routes["SEQ"].to_numpy(dtype=np.int32),
+        "a": routes["A"].to_numpy(dtype=np.int64),
+        "b": routes["B"].to_numpy(dtype=np.int64),
+        "link_ids": link_ids.to_numpy(dtype=np.int64),
+    }
+
+
+def category_codes(values, categories):
+    """Position of each value in `categories` (-1 if absent), looked up once per distinct value of a categorical."""
+    categories = pd.Index(categories)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = categories.get_indexer(values.cat.categories.astype(str))
+        return np.append(lookup, -1)[values.cat.codes.to_numpy()]
+    return categories.get_indexer(values.astype(str))
+
+
+def route_of_links(index):
+    """Route number of each route link."""
+    return np.repeat(np.arange(len(index["names"])), np.diff(index["offsets"]))
+
+
+def route_link_positions(index, combined_gdf):
+    """
+    Position in the route link arrays of each assignment row, found by its NAME and SEQ
+    with a binary search, -1 for the rows that are not in the index.
+    """
+    codes = category_codes(combined_gdf["NAME"], index["names"])
+    keys = (codes.astype(np.int64) << 32) | combined_gdf["SEQ"].to_numpy(dtype=np.int64)
+    index_keys = (route_of_links(index).astype(np.int64) << 32) | index["seq"]
+    positions = np.minimum(np.searchsorted(index_keys, keys), len(index_keys) - 1)
+    found = (codes >= 0) & (index_keys[positions] == keys)
+    return np.where(found, positions, -1)
+
+
+def load_route_index(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def save_route_index(index, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written under a temporary name, batch workers may build the same index at once
+    temporary_path = path.with_suffix(f".{os.getpid()}.tmp.npz")
+    np.savez(temporary_path, **index)
+    os.replace(temporary_path, path)
+
+
+def route_link_index(combined_gdf, freeflow_path, cache_dir=None):
+    """
+    The route index of a network, built once and stored in `cache_dir` under the
+    content hash of the freeflow network. A stored index is reused while every
+    assignment row is found in it with the same A/B, so it is rebuilt when a route
+    changes.
+
+    Parameters:
+    combined_gdf (DataFrame): The transit assignment.
+    freeflow_path (str): The freeflow network layer.
+    cache_dir (str): Directory of the stored indexes, the index is not stored if None.
+
+    Returns:
+    tuple: (the index from `build_route_index`, the position of each assignment row in
+        it from `route_link_positions`).
+    """
+    path = None
+    if cache_dir is not None:
+        path = Path(cache_dir) / f"route_index_{network_fingerprint(freeflow_path)[:16]}.npz"
+        index = route_indexes.get(str(path))
+        if index is None and path.exists():
+            index = load_route_index(path)
+        if index is not None:
+            positions = route_link_positions(index, combined_gdf)
+            if (positions >= 0).all() and (
+                index["a"][positions] == combined_gdf["A"].to_numpy()
+            ).all() and (index["b"][positions] == combined_gdf["B"].to_numpy()).all():
+                route_indexes[str(path)] = index
+                print(f"Reusing route index {path}")
+                return index, positions
+
+    index = build_route_index(combined_gdf, read_static_layer(freeflow_path))
+    if path is not None:
+        save_route_index(index, path)
+        route_indexes[str(path)] = index
+        print(f"Route index saved to {path}")
+    return index, route_link_positions(index, combined_gdf)
+
+
+def route_polylines(index, links, system=None):
+    """
+    Polyline of each route: the coordinates of its links in SEQ order, the links that
+    are not in the network or have no geometry left out.
+
+    Parameters:
+    index (dict): Route index, from `route_link_index`.
+    links (GeoDataFrame): The network links the index refers to (in any CRS).
+    system (str): Only the routes of this SYSTEM.
+
+    Returns:
+    DataFrame: 'Name', 'AB' (the smallest AB of its links, as the MUNI map layers have
+        always carried) and 'geometry' of each route with a link geometry in the network.
+    """
+    routes = route_of_links(index)
+    present = index["link_ids"] >= 0
+    if system is not None:
+        present &= index["systems"][routes] == system
+    # Links with a null or empty geometry add no coordinates, nor an AB
+    geometries = links.geometry.values[index["link_ids"][present]]
+    present[present] = ~shapely.is_missing(geometries) & ~shapely.is_empty(geometries)
+    link_ids = index["link_ids"][present]
+    routes = routes[present]
+    coordinates, coordinate_links = shapely.get_coordinates(
+        links.geometry.values[link_ids], return_index=True
+    )
+    route_numbers, dense_routes = np.unique(routes[coordinate_links], return_inverse=True)
+    first_ab = (
+        pd.DataFrame({"route": routes, "AB": links["AB"].to_numpy()[link_ids]})
+        .sort_values(["route", "AB"])
+        .drop_duplicates("route")
+    )
+    return pd.DataFrame(
+        {
+            "Name": index["names"][route_numbers],
+            "AB": first_ab["AB"].to_numpy(),
+            "geometry": shapely.linestrings(coordinates, indices=dense_routes),
+        }
+    )
+
+
+def route_load_profiles(index, combined_gdf, positions, system=None, columns=("AB_VOL", "AB_BRDA", "AB_XITB")):
+    """
+    Ridership along every route, link by link in SEQ order, for each time period. The
+    assignment rows are summed onto their route link positions (one bincount per
+    column), without grouping the assignment.
+
+    Parameters:
+    index (dict): Route index, from `route_link_index`.
+    combined_gdf (DataFrame): The transit assignment.
+    positions (array): Route link position of each assignment row.
+    system (str): Only the routes of this SYSTEM.
+    columns (tuple): The summed columns.
+
+    Returns:
+    DataFrame: One row per route link and time period in which the route runs.
+    """
+    present = {str(tod) for tod in pd.unique(combined_gdf["TOD"])}
+    periods = [tod for tod in time_periods if tod in present]
+    period_codes = category_codes(combined_gdf["TOD"], periods)
+    rows = (positions >= 0) & (period_codes >= 0)
+    cells = positions[rows] * len(periods) + period_codes[rows]
+    size = len(index["seq"]) * len(periods)
+
+    routes = np.repeat(route_of_links(index), len(periods))
+    profiles = pd.DataFrame(
+        {
+            "SYSTEM": index["systems"][routes],
+            "NAME": index["names"][routes],
+            "SEQ": np.repeat(index["seq"], len(periods)),
+            "A": np.repeat(index["a"], len(periods)),
+            "B": np.repeat(index["b"], len(periods)),
+            "TOD": np.tile(periods, len(index["seq"])),
+        }
+    )
+    for col in columns:
+        profiles[col] = np.bincount(
+            cells, weights=combined_gdf[col].to_numpy(dtype=float)[rows], minlength=size
+        )
+    runs = np.bincount(cells, minlength=size) > 0
+    if system is not None:
+        runs &= profiles["SYSTEM"].to_numpy() == system
+    return profiles[runs].reset_index(drop=True)
+
+
+def route_stop_summary(profiles):
+    """
+    Daily boardings, alightings and departing load at each stop of each route, from its
+    load profiles: the A node of the route links with boardings or alightings.
+    """
+    daily = profiles.groupby(["SYSTEM", "NAME", "SEQ", "A"], sort=False, as_index=False)[
+        ["AB_BRDA", "AB_XITB", "AB_VOL"]
+    ].sum()
+    daily = daily[(daily["AB_BRDA"] > 0) | (daily["AB_XITB"] > 0)]
+    return daily.rename(
+        columns={"A": "Stop", "AB_BRDA": "Boardings", "AB_XITB": "Alightings", "AB_VOL": "Load"}
+    ).reset_index(drop=True)
@@ -0,0 +1,130 @@
+import pandas as pd
+from transit.utils import classify_unique
+
+# Default rule tables (see `transit.utils.rule_classifier`); the config can
+# override them with [muni.route_modes] and [muni.directions]
+route_mode_rules = {
+    "default": "Local Bus",
+    "rules": [
+        {
+            "value": "Rail",
+            "in": [
+                "J-Church",
+                "KT-Ingleside/Third Street",
+                "M-Ocean View",
+                "N-Judah",
+                "T-Third Street",
+            ],
+        },
+        {"value": "Cable Car", "in": ["59", "60", "61", "61R"]},
+        {"value": "Streetcar", "in": ["F-Market & Wharves"]},
+        {"value": "Express Bus", "contains": "X"},
+        {"value": "Express Bus", "in": ["8"]},
+        {"value": "Rapid", "contains": "R", "not_in": ["94R"]},
+    ],
+}
+direction_rules = {
+    "rules": [
+        {"value": "IB", "endswith": "I"},
+        {"value": "OB", "endswith": "O"},
+    ],
+}
+# MUN61/MUN61R do not end in I/O
+muni_direction_rules = {
+    "rules": [
+        {"value": "IB", "in": ["MUN61R"]},
+        {"value": "OB", "in": ["MUN61"]},
+    ]
+    + direction_rules["rules"],
+}
+
+
+def route_direction(names, rules=None):
+    """
+    Map model line NAMEs to their direction (IB/OB), or None when it cannot be
+    determined.
+
+    Parameters:
+    names (Series): Model line NAMEs.
+    rules (dict): Direction rule table, defaults to the trailing I/O rule.
+
+    Returns:
+    Series: The direction of each NAME.
+    """
+    return classify_unique(names, rules or direction_rules)
+
+
+def route_mode(lines, rules=None):
+    """
+    Classify observed MUNI lines (e.g. 14R, J-Church) into route modes.
+
+    Parameters:
+    lines (Series): Observed line names.
+    rules (dict): Mode rule table, defaults to `route_mode_rules`.
+
+    Returns:
+    Series: The mode of each line.
+    """
+    return classify_unique(lines, rules or route_mode_rules)
+
+
+def route_order(routes):
+    """
+    Sort the unique route identifiers: routes starting with a digit first, by
+    their numeric part, then everything else alphabetically.
+
+    Parameters:
+    routes (Series): Route identifiers, as numbers or strings.
+
+    Returns:
+    list: The unique route identifiers as strings, in sorted order.
+    """
+    unique_routes = pd.Series(pd.unique(routes.astype(str)), dtype=object)
+    numbered = unique_routes.str.match(r"\d")
+    number = pd.to_numeric(
+        unique_routes.str.replace(r"\D", "", regex=True).where(numbered),
+        errors="coerce",
+    )
+    keys = pd.DataFrame(
+        {"group": ~numbered, "number": number.fillna(0), "route": unique_routes}
+    )
+    return keys.sort_values(["group", "number", "route"])["route"].tolist()
+
+
+def route_sort_key(routes):
+    """
+    Ordered categorical sort key for a route column, usable as
+    `df.sort_values(by="Route", key=route_sort_key)`.
+
+    Parameters:
+    routes (Series): Route identifiers, as numbers or strings.
+
+    Returns:
+    Series: The routes as an ordered categorical following `route_order`.
+    """
+    text = routes.astype(str)
+    return pd.Series(
+        pd.Categorical(text, categories=route_order(text), ordered=True),
+        index=routes.index,
+    )
+
+
+def normalize_route_keys(keys):
+    """
+    Convert integer-like strings (e.g. "14") to integers and leave other
+    identifiers unchanged, so numeric routes match across files.
+
+    Parameters:
+    keys (Series): Identifiers as read from csv.
+
+    Returns:
+    Series: The normalized identifiers.
+    """
+    if keys.dtype != object:
+        return keys
+    is_integer = keys.str.fullmatch(r"\s*[+-]?\d+\s*").eq(True)
+    if not is_integer.any():
+        return keys
+    normalized = keys.copy()
+    normalized[is_integer] = pd.to_numeric(keys[is_integer]).astype(object)
+    return normalized
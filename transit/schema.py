@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Compact dtypes of the known columns of the large frames: the combined transit
+# assignment (SFALLMSA{TOD}.DBF) and the loaded network links. Repeated strings are
+# categorical and node ids, modes and sequence numbers are narrow integers. The summed
+# volumes (AB_VOL, AB_BRDA, AB_XITB, V_1) stay float64 so the published totals are
+# unchanged.
+column_schema = {
+    "A": "int32",
+    "B": "int32",
+    "AB": "category",
+    "MODE": "uint16",
+    "SEQ": "uint16",
+    "SYSTEM": "category",
+    "NAME": "category",
+    "FULLNAME": "category",
+    "TOD": "category",
+    "AT": "uint16",
+    "FT": "uint16",
+}
+
+
+def fits_integer(series, dtype):
+    """Whether a numeric column has no missing values and fits in the integer dtype."""
+    if not pd.api.types.is_numeric_dtype(series) or series.isna().any():
+        return False
+    if len(series) == 0:
+        return True
+    if pd.api.types.is_float_dtype(series) and (series % 1 != 0).any():
+        return False
+    bounds = np.iinfo(dtype)
+    return bool(series.min() >= bounds.min and series.max() <= bounds.max)
+
+
+def compact_dtypes(df, schema=None):
+    """
+    Cast the known columns of a frame to their compact dtypes, in place. Integer casts
+    are skipped for columns with missing or out-of-range values.
+
+    Parameters:
+    df (DataFrame): The frame to compact.
+    schema (dict): Column to dtype, `column_schema` by default.
+
+    Returns:
+    DataFrame: The same frame.
+    """
+    schema = column_schema if schema is None else schema
+    for col, dtype in schema.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype == "category":
+            df[col] = df[col].astype("category")
+        elif fits_integer(df[col], dtype):
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def wide_dtypes(df, schema=None):
+    """
+    Copy of a frame with the compact dtypes of its known columns widened back
+    (categorical to their values, integers to int64, float32 to float64), for the small
+    aggregated tables handed to the table and dashboard writers.
+    """
+    schema = column_schema if schema is None else schema
+    df = df.copy()
+    for col in df.columns:
+        if col not in schema:
+            continue
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(dtype.categories.dtype)
+        elif pd.api.types.is_integer_dtype(dtype) and dtype != "int64":
+            df[col] = df[col].astype("int64")
+        elif dtype == "float32":
+            df[col] = df[col].astype("float64")
+    return df
+
+
+def concat_compact(frames):
+    """
+    Concatenate compact frames, keeping the categorical columns categorical: the
+    categories of each column are unioned (sorted) before concatenating, as pandas
+    falls back to object for categoricals with different categories.
+    """
+    frames = list(frames)
+    for col in frames[0].columns:
+        if not isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            continue
+        if not all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        categories = sorted(set().union(*(f[col].cat.categories for f in frames)))
+        for f in frames:
+            f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(frames):
+    """
+    Memory of each column of the frames, with its dtype and the memory it would take
+    with the wide dtypes (object strings, int64 and float64).
+
+    Parameters:
+    frames (dict): Frame name to DataFrame.
+
+    Returns:
+    DataFrame: One row per frame column and one total row per frame, memory in MB.
+    """
+    rows = []
+    for name, df in frames.items():
+        for col in df.columns:
+            memory = df[col].memory_usage(deep=True, index=False)
+            wide_memory = wide_dtypes(df[[col]])[col].memory_usage(deep=True, index=False)
+            rows.append([name, col, str(df[col].dtype), memory / 1e6, wide_memory / 1e6])
+    report = pd.DataFrame(rows, columns=["Frame", "Column", "Dtype", "MB", "Wide MB"])
+    totals = report.groupby("Frame", sort=False)[["MB", "Wide MB"]].sum().reset_index()
+    totals["Column"] = "Total"
+    totals["Dtype"] = ""
+    for _, total in totals.iterrows():
+        print(
+            f"{total['Frame']}: {total['MB']:.1f} MB "
+            f"({total['Wide MB']:.1f} MB with wide dtypes)"
+        )
+    return pd.concat([report, totals[report.columns]], ignore_index=True)
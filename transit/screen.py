@@ -1,5 +1,6 @@
 import pandas as pd
 import toml
+from shared.inputs import in_link_keys, link_keys
 from transit.utils import read_dbf_and_groupby_sum, read_transit_assignments
 
 
@@ -35,6 +36,22 @@ def group_screenline_ridership(combined_gdf, system, A, B, Screenline, Operator,
     return screenline_total
 
 
+def screenline_link_keys(screens):
+    """
+    Packed keys of every link a screenline can match: all the A x B pairs of each screen,
+    in both directions.
+    """
+    pairs = [
+        (a, b)
+        for A, B, _ in screens
+        for a in A
+        for b in B
+    ]
+    a = [pair[0] for pair in pairs]
+    b = [pair[1] for pair in pairs]
+    return link_keys(a + b, b + a)
+
+
 def process_screenline_data(
     combined_gdf, SamTrans, GG_Transit, GG_Ferry, CalTrain, AC_transit
 ):
@@ -48,10 +65,14 @@ def process_screenline_data(
         "CalTrain": CalTrain,
         "AC transit": AC_transit,
     }
+    screenline_links = screenline_link_keys(HWY_SCREENS.values())
+    screenline_gdf = combined_gdf[
+        in_link_keys(combined_gdf["A"], combined_gdf["B"], screenline_links)
+    ]
     screenline_total = []
     for i in HWY_SCREENS.keys():
         screenline = group_screenline_ridership(
-            combined_gdf,
+            screenline_gdf,
             HWY_SCREENS[i][2][0],
             HWY_SCREENS[i][0],
             HWY_SCREENS[i][1],
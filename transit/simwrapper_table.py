@@ -2,22 +2,54 @@ from pathlib import Path
 
 import pandas as pd
 import toml
+from shared.inputs import read_static_csv
+from transit.routes import normalize_route_keys, route_sort_key
 from transit.utils import dataframe_to_markdown, format_dataframe
 
 
-def convert_to_integer(value):
-    try:
-        return int(value)
-    except ValueError:
-        return value
-    
-def custom_sort(route):
-    route = str(route)  # Ensure everything is treated as a string
-    if route[0].isdigit():  # If starts with a number
-        num_part = int(''.join(filter(str.isdigit, route)))  # Extract numeric part
-        return (0, num_part, route)  # Prioritize numbers first
-    else:
-        return (1, route)
+def build_cube(obs_df, model_df, keys, sum_columns):
+    """
+    Pre-aggregate observed and modeled data on every key the tables of a dataset
+    filter or group by, so each table becomes a slice of the cube.
+
+    Parameters:
+    obs_df (DataFrame): The observed data.
+    model_df (DataFrame): The modeled data.
+    keys (list of str): Columns to aggregate on (line/station/screenline, operator, direction, TOD, mode).
+    sum_columns (list of str): Columns to sum.
+
+    Returns:
+    dict: The aggregated "Observed" and "Modeled" DataFrames, one row per key combination present in each.
+    """
+    cube = {}
+    for source, df in (("Observed", obs_df), ("Modeled", model_df)):
+        agg = df.groupby(keys, dropna=False, sort=False)[sum_columns].sum().reset_index()
+        for key in keys:
+            agg[key] = normalize_route_keys(agg[key])
+        cube[source] = agg
+    return cube
+
+
+def slice_cube(cube, filters, groupby_column, sum_column):
+    """
+    Filter a cube and regroup it on one of its keys.
+
+    Parameters:
+    cube (dict): The cube built by `build_cube`.
+    filters (list of tuples): List of filter conditions, where each tuple contains (column_name, value).
+    groupby_column (str): Column name to group by.
+    sum_column (str): Column name to sum.
+
+    Returns:
+    tuple: The grouped observed and modeled DataFrames.
+    """
+    grouped = {}
+    for source, agg in cube.items():
+        if filters is not None:
+            for filter_col, filter_val in filters:
+                agg = agg[agg[filter_col] == filter_val]
+        grouped[source] = agg.groupby(groupby_column)[sum_column].sum().reset_index()
+    return grouped["Observed"], grouped["Modeled"]
 
 
 def process_data(
@@ -43,37 +75,51 @@ def process_data(
     Returns:
     DataFrame: The processed and formatted DataFrame.
     """
-
-    # Apply the custom function to convert values
-    model_MUNI_line[groupby_column] = model_MUNI_line[groupby_column].apply(
-        convert_to_integer
-    )
-    obs_MUNI_line[groupby_column] = obs_MUNI_line[groupby_column].apply(
-        convert_to_integer
+    keys = [groupby_column] + [filter_col for filter_col, _ in filters or []]
+    cube = build_cube(obs_MUNI_line, model_MUNI_line, list(dict.fromkeys(keys)), [sum_column])
+    return process_cube_data(
+        cube, filters, groupby_column, sum_column, rename_column, join_method
     )
 
-    # Apply filters
-    if filters is not None:
-        for filter_col, filter_val in filters:
-            obs_MUNI_line = obs_MUNI_line[obs_MUNI_line[filter_col] == filter_val]
-            model_MUNI_line = model_MUNI_line[model_MUNI_line[filter_col] == filter_val]
+
+def process_cube_data(
+    cube,
+    filters,
+    groupby_column,
+    sum_column,
+    rename_column,
+    join_method,
+):
+    """
+    Build an observed vs modeled table from a slice of a pre-aggregated cube.
+
+    Parameters:
+    cube (dict): The cube built by `build_cube`.
+    filters (list of tuples): List of filter conditions, where each tuple contains (column_name, value).
+    groupby_column (str): Column name to group by.
+    sum_column (str): Column name to sum.
+    rename_column (str): New name to rename the groupby column to in the output.
+    join_method (str): How to join the observed and modeled rows.
+
+    Returns:
+    DataFrame: The processed and formatted DataFrame.
+    """
+    MUNI_IB_obs, MUNI_IB_model = slice_cube(cube, filters, groupby_column, sum_column)
 
     # Processing observed data
-    MUNI_IB_obs = obs_MUNI_line.groupby(groupby_column)[sum_column].sum().reset_index()
     MUNI_IB_obs.rename(
         columns={groupby_column: rename_column, sum_column: "Observed"}, inplace=True
     )
 
     # Processing modeled data
-    MUNI_IB_model = (
-        model_MUNI_line.groupby(groupby_column)[sum_column].sum().reset_index()
-    )
     MUNI_IB_model.rename(
         columns={groupby_column: rename_column, sum_column: "Modeled"}, inplace=True
     )
 
     # Merging observed and modeled data
     MUNI_IB = pd.merge(MUNI_IB_obs, MUNI_IB_model, on=rename_column, how=join_method)
+    # Routes by number then name (`route_order`), the total row goes last
+    MUNI_IB = MUNI_IB.sort_values(by=rename_column, key=route_sort_key, ignore_index=True)
 
     # Calculating total row and appending it
     total_row = pd.Series(MUNI_IB[["Observed", "Modeled"]].sum(), name="Total")
@@ -92,26 +138,22 @@ def process_data(
         MUNI_IB, numeric_columns=numeric_cols, percentage_columns=["Percentage Diff"]
     )
     
-    MUNI_IB = MUNI_IB.sort_values(
-        by=rename_column, 
-        key=lambda col: col.where(col != "Total").str.zfill(5)
-    )
-
     return MUNI_IB
 
 
 # Valdiation for BART
-def append_group_total(df, stations, group_name):
-    # Filter the DataFrame for the specified stations
-    df_group = df[df["Station"].isin(stations)]
-
-    # Calculate the sum for the filtered rows
-    group_total = pd.Series(df_group[["Observed", "Modeled"]].sum(), name=group_name)
+def append_group_totals(df, station_groups):
+    # Sum the Observed and Modeled rows of each station group
+    group_totals = pd.DataFrame(
+        [
+            df.loc[df["Station"].isin(stations), ["Observed", "Modeled"]].sum()
+            for stations in station_groups.values()
+        ]
+    )
+    group_totals.insert(0, "Station", list(station_groups))
 
-    # Append the total row to the DataFrame with the group name
-    df = pd.concat([df, group_total.to_frame().T], ignore_index=True)
-    df.at[df.index[-1], "Station"] = group_name
-    return df
+    # Append all the group total rows in a single concat
+    return pd.concat([df, group_totals], ignore_index=True)
 
 
 def process_bart_data(
@@ -136,42 +178,50 @@ def process_bart_data(
     Returns:
     pd.DataFrame: The processed and formatted DataFrame.
     """
-
-    # Apply the custom function to convert values
-    model_bart_line[groupby_column] = model_bart_line[groupby_column].apply(
-        convert_to_integer
+    keys = [groupby_column]
+    if direction_filter is not None:
+        keys.append("Direction")
+    if tod_filter is not None:
+        keys.append("TOD")
+    cube = build_cube(obs_bart_line, model_bart_line, keys, [sum_column])
+    return process_bart_cube_data(
+        cube, direction_filter, tod_filter, groupby_column, sum_column
     )
 
-    # Determine filter conditions
-    obs_condition = pd.Series([True] * len(obs_bart_line))
-    model_condition = pd.Series([True] * len(model_bart_line))
 
-    if direction_filter is not None:
-        obs_condition &= obs_bart_line["Direction"] == direction_filter
-        model_condition &= model_bart_line["Direction"] == direction_filter
+def process_bart_cube_data(
+    cube,
+    direction_filter,
+    tod_filter,
+    groupby_column,
+    sum_column,
+):
+    """
+    Build a BART station table with station group totals from a slice of a cube.
 
+    Parameters:
+    cube (dict): The cube built by `build_cube`.
+    direction_filter (str): Direction to filter the data by.
+    tod_filter (str): Time of Day
+    groupby_column (str): Column name to group by.
+    sum_column (str): Column name to sum.
+
+    Returns:
+    pd.DataFrame: The processed and formatted DataFrame.
+    """
+    filters = []
+    if direction_filter is not None:
+        filters.append(("Direction", direction_filter))
     if tod_filter is not None:
-        obs_condition &= obs_bart_line["TOD"] == tod_filter
-        model_condition &= model_bart_line["TOD"] == tod_filter
+        filters.append(("TOD", tod_filter))
+    MUNI_IB_obs, MUNI_IB_model = slice_cube(cube, filters, groupby_column, sum_column)
 
     # Processing observed data
-    MUNI_IB_obs = (
-        obs_bart_line[obs_condition]
-        .groupby(groupby_column)[sum_column]
-        .sum()
-        .reset_index()
-    )
     MUNI_IB_obs.rename(
         columns={groupby_column: "Station", sum_column: "Observed"}, inplace=True
     )
 
     # Processing modeled data
-    MUNI_IB_model = (
-        model_bart_line[model_condition]
-        .groupby(groupby_column)[sum_column]
-        .sum()
-        .reset_index()
-    )
     MUNI_IB_model.rename(
         columns={groupby_column: "Station", sum_column: "Modeled"}, inplace=True
     )
@@ -200,10 +250,15 @@ def process_bart_data(
     station_oakland = ["12TH", "19TH"]
 
     # Use the function to append totals for each group
-    MUNI_IB = append_group_total(MUNI_IB, station_core_SF, "Core SF")
-    MUNI_IB = append_group_total(MUNI_IB, station_outer_SF, "Outer SF")
-    MUNI_IB = append_group_total(MUNI_IB, station_oakland, "Oakland Core")
-    MUNI_IB = append_group_total(MUNI_IB, all, "All Listed Stations")
+    MUNI_IB = append_group_totals(
+        MUNI_IB,
+        {
+            "Core SF": station_core_SF,
+            "Outer SF": station_outer_SF,
+            "Oakland Core": station_oakland,
+            "All Listed Stations": all,
+        },
+    )
 
     total_observed = MUNI_IB_obs["Observed"].sum()
     total_modeled = MUNI_IB_model["Modeled"].sum()
@@ -290,14 +345,19 @@ def process_mkd_muni(
     MUNI_IB,
     MUNI_OB,
 ):
-    obs_MUNI_line_df = pd.read_csv(transit_input_dir / observed_MUNI_Line)
+    obs_MUNI_line_df = read_static_csv(transit_input_dir / observed_MUNI_Line)
     model_MUNI_line_df = pd.read_csv(output_transit_dir / model_MUNI_Line)
     model_MUNI_line_df["Line"] = model_MUNI_line_df["Line"].astype(str)
     obs_MUNI_line_df["Line"] = obs_MUNI_line_df["Line"].astype(str)
-    tod_order = ["EA", "AM", "MD", "PM", "EV", "Total"]
-    MUNI_IB_df = process_data(
+    muni_cube = build_cube(
         obs_MUNI_line_df,
         model_MUNI_line_df,
+        ["Line", "Direction", "TOD", "Mode"],
+        ["Ridership"],
+    )
+    tod_order = ["EA", "AM", "MD", "PM", "EV", "Total"]
+    MUNI_IB_df = process_cube_data(
+        muni_cube,
         [("Direction", "IB")],
         "Line",
         "Ridership",
@@ -305,9 +365,8 @@ def process_mkd_muni(
         "outer",
     )
     
-    MUNI_OB_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_OB_df = process_cube_data(
+        muni_cube,
         [("Direction", "OB")],
         "Line",
         "Ridership",
@@ -315,9 +374,9 @@ def process_mkd_muni(
         "outer",
     )
     MUNI_IB_df = pd.merge(MUNI_OB_df[["Route"]], MUNI_IB_df, on="Route", how="outer")
-    MUNI_IB_df = MUNI_IB_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_IB_df = MUNI_IB_df.sort_values(by="Route", key=route_sort_key)
     MUNI_OB_df = pd.merge(MUNI_IB_df[["Route"]], MUNI_OB_df, on="Route", how="outer")
-    MUNI_OB_df = MUNI_OB_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_OB_df = MUNI_OB_df.sort_values(by="Route", key=route_sort_key)
     dataframe_to_markdown(
         MUNI_IB_df,
         file_name=Path(markdown_output_dir / MUNI_ib_day),
@@ -334,9 +393,8 @@ def process_mkd_muni(
     )
     MUNI_IB_df.to_csv(muni_output_dir / MUNI_IB, index=False)
     MUNI_OB_df.to_csv(muni_output_dir / MUNI_OB, index=False)
-    MUNI_IB_AM_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_IB_AM_df = process_cube_data(
+        muni_cube,
         [("Direction", "IB"), ("TOD", "AM")],
         "Line",
         "Ridership",
@@ -347,7 +405,7 @@ def process_mkd_muni(
     MUNI_IB_AM_df = pd.merge(
         MUNI_IB_df[["Route"]], MUNI_IB_AM_df, on="Route", how="outer"
     )
-    MUNI_IB_AM_df = MUNI_IB_AM_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_IB_AM_df = MUNI_IB_AM_df.sort_values(by="Route", key=route_sort_key)
     MUNI_IB_AM_df = MUNI_IB_AM_df.fillna("-")
     dataframe_to_markdown(
         MUNI_IB_AM_df,
@@ -356,9 +414,8 @@ def process_mkd_muni(
         center_align_columns=None,
         column_widths=70,
     )
-    MUNI_IB_PM_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_IB_PM_df = process_cube_data(
+        muni_cube,
         [("Direction", "IB"), ("TOD", "PM")],
         "Line",
         "Ridership",
@@ -368,7 +425,7 @@ def process_mkd_muni(
     MUNI_IB_PM_df = pd.merge(
         MUNI_IB_df[["Route"]], MUNI_IB_PM_df, on="Route", how="outer"
     )
-    MUNI_IB_PM_df = MUNI_IB_PM_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_IB_PM_df = MUNI_IB_PM_df.sort_values(by="Route", key=route_sort_key)
     MUNI_IB_PM_df = MUNI_IB_PM_df.fillna("-")
     dataframe_to_markdown(
         MUNI_IB_PM_df,
@@ -377,9 +434,8 @@ def process_mkd_muni(
         center_align_columns=None,
         column_widths=70,
     )
-    MUNI_OB_AM_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_OB_AM_df = process_cube_data(
+        muni_cube,
         [("Direction", "OB"), ("TOD", "AM")],
         "Line",
         "Ridership",
@@ -389,7 +445,7 @@ def process_mkd_muni(
     MUNI_OB_AM_df = pd.merge(
         MUNI_IB_df[["Route"]], MUNI_OB_AM_df, on="Route", how="outer"
     )
-    MUNI_OB_AM_df = MUNI_OB_AM_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_OB_AM_df = MUNI_OB_AM_df.sort_values(by="Route", key=route_sort_key)
     MUNI_OB_AM_df = MUNI_OB_AM_df.fillna("-")
     dataframe_to_markdown(
         MUNI_OB_AM_df,
@@ -398,9 +454,8 @@ def process_mkd_muni(
         center_align_columns=None,
         column_widths=70,
     )
-    MUNI_OB_PM_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_OB_PM_df = process_cube_data(
+        muni_cube,
         [("Direction", "OB"), ("TOD", "PM")],
         "Line",
         "Ridership",
@@ -410,7 +465,7 @@ def process_mkd_muni(
     MUNI_OB_PM_df = pd.merge(
         MUNI_IB_df[["Route"]], MUNI_OB_PM_df, on="Route", how="outer"
     )
-    MUNI_OB_PM_df = MUNI_OB_PM_df.sort_values(by="Route", key=lambda x: x.astype(str).map(custom_sort))
+    MUNI_OB_PM_df = MUNI_OB_PM_df.sort_values(by="Route", key=route_sort_key)
     MUNI_OB_PM_df = MUNI_OB_PM_df.fillna("-")
     dataframe_to_markdown(
         MUNI_OB_PM_df,
@@ -419,8 +474,8 @@ def process_mkd_muni(
         center_align_columns=None,
         column_widths=70,
     )
-    MUNI_mode_df = process_data(
-        obs_MUNI_line_df, model_MUNI_line_df, None, "Mode", "Ridership", "Mode", "outer"
+    MUNI_mode_df = process_cube_data(
+        muni_cube, None, "Mode", "Ridership", "Mode", "outer"
     )
     dataframe_to_markdown(
         MUNI_mode_df,
@@ -432,9 +487,8 @@ def process_mkd_muni(
     MUNI_mode_df[~MUNI_mode_df["Mode"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_mode), index=False
     )
-    MUNI_mode_am_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_mode_am_df = process_cube_data(
+        muni_cube,
         [("TOD", "AM")],
         "Mode",
         "Ridership",
@@ -451,9 +505,8 @@ def process_mkd_muni(
     MUNI_mode_am_df[~MUNI_mode_am_df["Mode"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_mode_am), index=False
     )
-    MUNI_mode_pm_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_mode_pm_df = process_cube_data(
+        muni_cube,
         [("TOD", "PM")],
         "Mode",
         "Ridership",
@@ -470,8 +523,8 @@ def process_mkd_muni(
     MUNI_mode_pm_df[~MUNI_mode_pm_df["Mode"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_mode_pm), index=False
     )
-    MUNI_tod_df = process_data(
-        obs_MUNI_line_df, model_MUNI_line_df, None, "TOD", "Ridership", "TOD", "outer"
+    MUNI_tod_df = process_cube_data(
+        muni_cube, None, "TOD", "Ridership", "TOD", "outer"
     )
     MUNI_tod_df["TOD"] = pd.Categorical(
         MUNI_tod_df["TOD"], categories=tod_order, ordered=True
@@ -488,9 +541,8 @@ def process_mkd_muni(
     MUNI_tod_df[~MUNI_tod_df["TOD"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_tod), index=False
     )
-    MUNI_EB_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_EB_df = process_cube_data(
+        muni_cube,
         [("Mode", "Express Bus")],
         "TOD",
         "Ridership",
@@ -512,9 +564,8 @@ def process_mkd_muni(
     MUNI_EB_df[~MUNI_EB_df["TOD"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_EB), index=False
     )
-    MUNI_LB_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_LB_df = process_cube_data(
+        muni_cube,
         [("Mode", "Local Bus")],
         "TOD",
         "Ridership",
@@ -536,9 +587,8 @@ def process_mkd_muni(
     MUNI_LB_df[~MUNI_LB_df["TOD"].isin(["Total"])].to_csv(
         Path(muni_output_dir / MUNI_LB), index=False
     )
-    MUNI_Rail_df = process_data(
-        obs_MUNI_line_df,
-        model_MUNI_line_df,
+    MUNI_Rail_df = process_cube_data(
+        muni_cube,
         [("Mode", "Rail")],
         "TOD",
         "Ridership",
@@ -629,10 +679,13 @@ def process_mkd_bart(
     ]
 
     # BART
-    obs_BART_line = pd.read_csv(transit_input_dir / observed_BART)
+    obs_BART_line = read_static_csv(transit_input_dir / observed_BART)
     model_BART_line = pd.read_csv(output_transit_dir / model_BART)
-    BART_boarding_allday = process_bart_data(
-        obs_BART_line, model_BART_line, None, None, "Station", "Boardings"
+    bart_cube = build_cube(
+        obs_BART_line, model_BART_line, ["Station", "TOD"], ["Boardings", "Alightings"]
+    )
+    BART_boarding_allday = process_bart_cube_data(
+        bart_cube, None, None, "Station", "Boardings"
     )
     BART_boarding_allday = sort_dataframe_by_custom_order(
         BART_boarding_allday, "Station", custom_order
@@ -645,8 +698,8 @@ def process_mkd_bart(
         column_widths=80,
     )
     BART_boarding_allday.to_csv(bart_output_dir / BART_boarding_allday_csv, index=False)
-    BART_boarding_am = process_bart_data(
-        obs_BART_line, model_BART_line, None, "AM", "Station", "Boardings"
+    BART_boarding_am = process_bart_cube_data(
+        bart_cube, None, "AM", "Station", "Boardings"
     )
     BART_boarding_am = sort_dataframe_by_custom_order(
         BART_boarding_am, "Station", custom_order
@@ -658,8 +711,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=80,
     )
-    BART_boarding_pm = process_bart_data(
-        obs_BART_line, model_BART_line, None, "PM", "Station", "Boardings"
+    BART_boarding_pm = process_bart_cube_data(
+        bart_cube, None, "PM", "Station", "Boardings"
     )
     BART_boarding_pm = sort_dataframe_by_custom_order(
         BART_boarding_pm, "Station", custom_order
@@ -671,8 +724,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=80,
     )
-    BART_at_allday = process_bart_data(
-        obs_BART_line, model_BART_line, None, None, "Station", "Alightings"
+    BART_at_allday = process_bart_cube_data(
+        bart_cube, None, None, "Station", "Alightings"
     )
     BART_at_allday = sort_dataframe_by_custom_order(
         BART_at_allday, "Station", custom_order
@@ -685,8 +738,8 @@ def process_mkd_bart(
         column_widths=80,
     )
     BART_at_allday.to_csv(bart_output_dir / BART_at_allday_csv, index=False)
-    BART_at_am = process_bart_data(
-        obs_BART_line, model_BART_line, None, "AM", "Station", "Alightings"
+    BART_at_am = process_bart_cube_data(
+        bart_cube, None, "AM", "Station", "Alightings"
     )
     BART_at_am = sort_dataframe_by_custom_order(BART_at_am, "Station", custom_order)
     dataframe_to_markdown(
@@ -696,8 +749,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=80,
     )
-    BART_at_pm = process_bart_data(
-        obs_BART_line, model_BART_line, None, "PM", "Station", "Alightings"
+    BART_at_pm = process_bart_cube_data(
+        bart_cube, None, "PM", "Station", "Alightings"
     )
     BART_at_pm = sort_dataframe_by_custom_order(BART_at_pm, "Station", custom_order)
     dataframe_to_markdown(
@@ -708,8 +761,11 @@ def process_mkd_bart(
         column_widths=80,
     )
 
-    obs_BART_county = pd.read_csv(transit_input_dir / observed_BART_county)
+    obs_BART_county = read_static_csv(transit_input_dir / observed_BART_county)
     model_BART_county_df = pd.read_csv(output_transit_dir / model_BART_county)
+    county_cube = build_cube(
+        obs_BART_county, model_BART_county_df, ["County", "TOD"], ["Boardings", "Alightings"]
+    )
     county_order = [
         "San Francisco",
         "San Mateo",
@@ -718,9 +774,8 @@ def process_mkd_bart(
         "Alameda",
         "Total",
     ]
-    county_br_day = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_br_day = process_cube_data(
+        county_cube,
         None,
         "County",
         "Boardings",
@@ -738,9 +793,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=90,
     )
-    county_br_am = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_br_am = process_cube_data(
+        county_cube,
         [("TOD", "AM")],
         "County",
         "Boardings",
@@ -758,9 +812,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=90,
     )
-    county_br_pm = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_br_pm = process_cube_data(
+        county_cube,
         [("TOD", "PM")],
         "County",
         "Boardings",
@@ -781,9 +834,8 @@ def process_mkd_bart(
     county_br_day.to_csv(bart_output_dir / county_br_day_csv, index=False)
     county_br_am.to_csv(bart_output_dir / county_br_am_csv, index=False)
     county_br_pm.to_csv(bart_output_dir / county_br_pm_csv, index=False)
-    county_at_day = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_at_day = process_cube_data(
+        county_cube,
         None,
         "County",
         "Alightings",
@@ -801,9 +853,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=90,
     )
-    county_at_am = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_at_am = process_cube_data(
+        county_cube,
         [("TOD", "AM")],
         "County",
         "Alightings",
@@ -821,9 +872,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=90,
     )
-    county_at_pm = process_data(
-        obs_BART_county,
-        model_BART_county_df,
+    county_at_pm = process_cube_data(
+        county_cube,
         [("TOD", "PM")],
         "County",
         "Alightings",
@@ -846,12 +896,17 @@ def process_mkd_bart(
     county_at_pm.to_csv(bart_output_dir / county_at_pm_csv, index=False)
 
     # BART Screenline
-    obs_BART_Screenline = pd.read_csv(transit_input_dir / observed_BART_Screenline)
+    obs_BART_Screenline = read_static_csv(transit_input_dir / observed_BART_Screenline)
     model_BART_Screenline_df = pd.read_csv(output_transit_dir / model_BART_Screenline)
-
-    transbay_BART_IB = process_data(
+    bart_screenline_cube = build_cube(
         obs_BART_Screenline,
         model_BART_Screenline_df,
+        ["Screenline", "Direction", "TOD"],
+        ["Ridership"],
+    )
+
+    transbay_BART_IB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "Transbay"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -871,9 +926,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=70,
     )
-    transbay_BART_OB = process_data(
-        obs_BART_Screenline,
-        model_BART_Screenline_df,
+    transbay_BART_OB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "Transbay"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -893,9 +947,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_BART_OB = process_data(
-        obs_BART_Screenline,
-        model_BART_Screenline_df,
+    Countyline_BART_OB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "Countyline"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -915,9 +968,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_BART_IB = process_data(
-        obs_BART_Screenline,
-        model_BART_Screenline_df,
+    Countyline_BART_IB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "Countyline"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -937,9 +989,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=70,
     )
-    Intra_SF_BART_OB = process_data(
-        obs_BART_Screenline,
-        model_BART_Screenline_df,
+    Intra_SF_BART_OB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "SF-San Mateo"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -959,9 +1010,8 @@ def process_mkd_bart(
         center_align_columns=None,
         column_widths=70,
     )
-    Intra_SF_BART_IB = process_data(
-        obs_BART_Screenline,
-        model_BART_Screenline_df,
+    Intra_SF_BART_IB = process_cube_data(
+        bart_screenline_cube,
         [("Screenline", "SF-San Mateo"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1048,13 +1098,18 @@ def process_mkd_screenline(
     screenline_overall_ob_md
 ):
     # Valdiation for Screenlines
-    obs_Screenline = pd.read_csv(transit_input_dir / observed_Screenline)
+    obs_Screenline = read_static_csv(transit_input_dir / observed_Screenline)
     model_Screenline_df = pd.read_csv(output_transit_dir / model_Screenline)
     model_Screenline_df = model_Screenline_df[model_Screenline_df['Screenline'] != 'SF-San Mateo']
     obs_Screenline = obs_Screenline[obs_Screenline['Screenline'] != 'SF-San Mateo']
-    screenline_overall_ib = process_data(
+    screenline_cube = build_cube(
         obs_Screenline,
         model_Screenline_df,
+        ["Screenline", "Operator", "Direction", "TOD"],
+        ["Ridership"],
+    )
+    screenline_overall_ib = process_cube_data(
+        screenline_cube,
         [("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1073,9 +1128,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    screenline_overall_ob = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    screenline_overall_ob = process_cube_data(
+        screenline_cube,
         [("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1094,9 +1148,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    transbay_AC_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    transbay_AC_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Transbay"), ("Operator", "AC Transit"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1115,9 +1168,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    transbay_AC_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    transbay_AC_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Transbay"), ("Operator", "AC Transit"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1136,9 +1188,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    transbay_overall_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    transbay_overall_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Transbay"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1157,9 +1208,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    transbay_overall_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    transbay_overall_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Transbay"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1190,9 +1240,8 @@ def process_mkd_screenline(
     transbay_AC_OB[~transbay_AC_OB["TOD"].isin(["Total"])].to_csv(
         screenline_output_dir / transbay_AC_OB_csv, index=False
     )
-    Countyline_CalTrain_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_CalTrain_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Operator", "CalTrain"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1211,9 +1260,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_CalTrain_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_CalTrain_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Operator", "CalTrain"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1232,9 +1280,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_SamTrans_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_SamTrans_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Operator", "SamTrans"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1253,9 +1300,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_SamTrans_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_SamTrans_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Operator", "SamTrans"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1274,9 +1320,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_overall_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_overall_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1295,9 +1340,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    Countyline_overall_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    Countyline_overall_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Countyline"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1344,9 +1388,8 @@ def process_mkd_screenline(
     Countyline_overall_OB[~Countyline_overall_OB["TOD"].isin(["Total"])].to_csv(
         screenline_output_dir / Countyline_overall_OB_csv, index=False
     )
-    GG_Transit_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_Transit_IB = process_cube_data(
+        screenline_cube,
         [
             ("Screenline", "Golden Gate"),
             ("Operator", "Golden Gate Transit"),
@@ -1369,9 +1412,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    GG_Transit_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_Transit_OB = process_cube_data(
+        screenline_cube,
         [
             ("Screenline", "Golden Gate"),
             ("Operator", "Golden Gate Transit"),
@@ -1394,9 +1436,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    GG_Ferry_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_Ferry_IB = process_cube_data(
+        screenline_cube,
         [
             ("Screenline", "Golden Gate"),
             ("Operator", "Golden Gate Ferry"),
@@ -1419,9 +1460,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    GG_Ferry_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_Ferry_OB = process_cube_data(
+        screenline_cube,
         [
             ("Screenline", "Golden Gate"),
             ("Operator", "Golden Gate Ferry"),
@@ -1444,9 +1484,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    GG_overall_IB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_overall_IB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Golden Gate"), ("Direction", "IB")],
         "TOD",
         "Ridership",
@@ -1465,9 +1504,8 @@ def process_mkd_screenline(
         center_align_columns=None,
         column_widths=70,
     )
-    GG_overall_OB = process_data(
-        obs_Screenline,
-        model_Screenline_df,
+    GG_overall_OB = process_cube_data(
+        screenline_cube,
         [("Screenline", "Golden Gate"), ("Direction", "OB")],
         "TOD",
         "Ridership",
@@ -1,6 +1,8 @@
 import pandas as pd
 import toml
+from shared.inputs import read_static_csv
 from transit.utils import (
+    classify_unique,
     dataframe_to_markdown,
     format_dataframe,
     read_dbf_and_groupby_sum,
@@ -11,7 +13,7 @@ from transit.utils import (
 
 # Get Observed data from NTD
 def obs_ntd_table(transit_input_dir, observed_NTD):
-    obs_NTD_df = pd.read_csv(transit_input_dir / observed_NTD)
+    obs_NTD_df = read_static_csv(transit_input_dir / observed_NTD)
     obs_NTD_df["average weekday_upt"] = obs_NTD_df.apply(
         lambda row: round(row["annual_upt"] / 261)
         if pd.isna(row["average weekday_upt"])
@@ -35,7 +37,7 @@ def obs_ntd_table(transit_input_dir, observed_NTD):
 
 
 def calcualte_weekday_upt(transit_input_dir, observed_NTD):
-    obs_NTD_df = pd.read_csv(transit_input_dir / observed_NTD)
+    obs_NTD_df = read_static_csv(transit_input_dir / observed_NTD)
     obs_NTD_avgupt, obs_NTD_df = obs_ntd_table(transit_input_dir, observed_NTD)
     # ratio = obs_NTD_df[["operator", "annual_upt", "average weekday_upt"]]
     # ratio["ratio"] = ratio["annual_upt"]/ratio["average weekday_upt"].fillna(261)
@@ -135,93 +137,170 @@ service_operator_dict = {
 }
 
 
-# Get Ferry data
-def assign_ferry_name(name):
-    if name.startswith("90_") or name.startswith("94_"):
-        return "SF Bay Ferry"
-    elif name.startswith("91_") or name.startswith("92_") or name.startswith("93_"):
-        return "GGT-Ferry"
-    else:
-        return "Other"
+# Model MODE number -> (mode name, service type)
+mode_mapping = {
+    11: ("Local Muni", "Local Bus"),
+    12: ("Express Muni", "Local Bus"),
+    13: ("BRT Muni", "Local Bus"),
+    14: ("Muni Cable Car", "Light Rail"),
+    15: ("LRT Muni", "Light Rail"),
+    16: ("Free and Open Shuttles", "Local Bus"),
+    17: ("SamTrans Local", "Local Bus"),
+    18: ("AC Local", "Local Bus"),
+    19: ("Other Local MTC Buses", "Local Bus"),
+    20: ("Regional BRT", "Local Bus"),
+    21: ("VTA LRT", "Light Rail"),
+    22: ("AC Transbay Buses", "Premium"),
+    23: ("Golden Gate Bus", "Premium"),
+    24: ("Sam Trans Express Bus", "Premium"),
+    25: ("Other Premium Bus", "Premium"),
+    26: ("Caltrain", "Premium"),
+    27: ("SMART", "Premium"),
+    28: ("eBART", "BART"),
+    29: ("Regional Rail/ACE/AMTRAK", "Premium"),
+    30: ("HSR", "Premium"),
+    31: ("Ferry", "Ferry"),
+    32: ("BART", "BART"),
+}
 
+# Operator submodes read from the model by SYSTEM and MODE. Submodes flagged as
+# `operator` are reported as their own operator row instead of a submode row.
+submode_mapping = {
+    "GGT-Bus": {"system": "Golden Gate Transit", "modes": [23]},
+    "Marin Transit": {"system": "Golden Gate Transit", "modes": [19], "operator": True},
+    "SCVTA-Bus": {"system": "SCVTA", "modes": [19, 20, 25]},
+    "SCVTA-LRT": {"system": "SCVTA", "modes": [21]},
+    "AC Transbay": {"system": "AC Transit", "modes": [22]},
+    "AC Eastbay": {"system": "AC Transit", "modes": [18]},
+}
 
-def process_total_val(combined_gdf, output_dir, model_MUNI_Line):
+# MUNI line mode (model_MUNI_Line 'Mode') -> MUNI submode
+muni_submode_mapping = {
+    "Local Bus": "MUNI-Bus",
+    "Express Bus": "MUNI-Bus",
+    "Rapid": "MUNI-Bus",
+    "Rail": "MUNI-Rail",
+    "Cable Car": "MUNI-Cable",
+    "Streetcar": "MUNI-Streetcar",
+}
 
-    all_mode = read_dbf_and_groupby_sum(combined_gdf, None, ["SYSTEM","MODE"], "AB_BRDA")
-    all_mode = all_mode.groupby(["SYSTEM","MODE"])["AB_BRDA"].sum().reset_index()
-    all_mode = all_mode.rename(columns={"MODE": "Operator", "AB_BRDA": "Modeled"})
+# Ferry name class -> submode
+ferry_submode_mapping = {
+    "GGT-Ferry": "GGT-Ferry",
+    "SF Bay Ferry": "SF Bay Ferry (WETA)",
+    "Other": "Ferry Other",
+}
 
+# Submode rows of the modeled table, in reporting order
+submode_order = [
+    "GGT-Ferry",
+    "GGT-Bus",
+    "SCVTA-Bus",
+    "SCVTA-LRT",
+    "SF Bay Ferry (WETA)",
+    "MUNI-Bus",
+    "MUNI-Rail",
+    "MUNI-Cable",
+    "MUNI-Streetcar",
+    "AC Transbay",
+    "AC Eastbay",
+    "Ferry Other",
+]
+
+
+def load_mode_lookup(total_config=None):
+    """
+    Compiles the MODE and submode tables into lookup frames for a categorical join
+    onto the (SYSTEM, MODE) boardings of the transit assignment.
+
+    Parameters:
+    total_config (dict): The [total] config section. Its optional `modes` and
+        `submodes` tables replace the module defaults.
+
+    Returns:
+    tuple: (modes, submodes). `modes` has one row per MODE with categorical 'Mode' and
+        'Service Type' columns; `submodes` has one row per (SYSTEM, MODE) with a
+        categorical 'Submode' column and a boolean 'Operator Row' column.
+    """
+    total_config = total_config or {}
+    mode_table = total_config.get("modes", mode_mapping)
+    submode_table = total_config.get("submodes", submode_mapping)
+
+    modes = pd.DataFrame(
+        [(int(mode), name, service) for mode, (name, service) in mode_table.items()],
+        columns=["MODE", "Mode", "Service Type"],
+    )
+    submodes = pd.DataFrame(
+        [
+            (spec["system"], int(mode), submode, spec.get("operator", False))
+            for submode, spec in submode_table.items()
+            for mode in spec["modes"]
+        ],
+        columns=["SYSTEM", "MODE", "Submode", "Operator Row"],
+    )
+    modes = modes.astype({"Mode": "category", "Service Type": "category"})
+    submodes = submodes.astype({"Submode": "category"})
+    return modes, submodes
+
+
+def summarize_mode_ridership(combined_gdf, mode_lookup):
+    """
+    Sums boardings by SYSTEM and MODE in a single grouped pass and joins the mode
+    name, service type and submode onto each group.
+
+    Parameters:
+    combined_gdf (DataFrame): The combined transit assignment.
+    mode_lookup (tuple): The (modes, submodes) frames from `load_mode_lookup`.
+
+    Returns:
+    DataFrame: One row per (SYSTEM, MODE) with 'AB_BRDA', 'Mode', 'Service Type',
+        'Submode' and 'Operator Row' columns.
+    """
+    modes, submodes = mode_lookup
+    all_mode = read_dbf_and_groupby_sum(combined_gdf, None, ["SYSTEM", "MODE"], "AB_BRDA")
+    all_mode = all_mode.merge(modes, on="MODE", how="left")
+    all_mode = all_mode.merge(submodes, on=["SYSTEM", "MODE"], how="left")
+    return all_mode
+
+
+# Ferry route NAME prefixes by operator
+ferry_name_rules = {
+    "default": "Other",
+    "rules": [
+        {"value": "SF Bay Ferry", "startswith": ["90_", "94_"]},
+        {"value": "GGT-Ferry", "startswith": ["91_", "92_", "93_"]},
+    ],
+}
+
+
+def process_total_val(
+    combined_gdf, output_dir, model_MUNI_Line, all_mode, ferry_rules=None
+):
     model_MUNI_line_df = pd.read_csv(output_dir / model_MUNI_Line)
-    muni_mode_df = model_MUNI_line_df.groupby("Mode")['Ridership'].sum().reset_index()
-    muni = {
-        "Operator": ["MUNI-Bus", "MUNI-Rail", "MUNI-Cable", "MUNI-Streetcar"],
-        "Modeled": [muni_mode_df[muni_mode_df["Mode"] == "Local Bus"]["Ridership"].iloc[0] 
-                    + muni_mode_df[muni_mode_df["Mode"] == "Express Bus"]["Ridership"].iloc[0]
-                    + muni_mode_df[muni_mode_df["Mode"] == "Rapid"]["Ridership"].iloc[0], 
-                    muni_mode_df[muni_mode_df["Mode"] == "Rail"]["Ridership"].iloc[0],
-                    muni_mode_df[muni_mode_df["Mode"] == "Cable Car"]["Ridership"].iloc[0],
-                    muni_mode_df[muni_mode_df["Mode"] == "Streetcar"]["Ridership"].iloc[0]],
-    }
-    muni = pd.DataFrame(muni)
+    muni = (
+        model_MUNI_line_df.groupby(
+            model_MUNI_line_df["Mode"].map(muni_submode_mapping)
+        )["Ridership"]
+        .sum()
+    )
 
     ferry_df = read_dbf_and_groupby_sum(
         combined_gdf, "Ferry", "NAME", "AB_BRDA"
     )  # List to collect DataFrames
-    ferry_df["Ferry_name"] = ferry_df["NAME"].apply(assign_ferry_name)
-    ferry = ferry_df.groupby("Ferry_name")["AB_BRDA"].sum().reset_index()
-
-    ac = read_dbf_and_groupby_sum(combined_gdf, "AC Transit", "MODE", "AB_BRDA")
-    vta = read_dbf_and_groupby_sum(combined_gdf, "SCVTA", "MODE", "AB_BRDA")
-    gg_transit = read_dbf_and_groupby_sum(combined_gdf, "Golden Gate Transit", "MODE", "AB_BRDA")
-
-    GG_bus_model = gg_transit[gg_transit["MODE"] == 23]["AB_BRDA"].iloc[0]
-    marin_model = gg_transit[gg_transit["MODE"] == 19]["AB_BRDA"].iloc[0]
-    VTA_LR_model = vta[vta["MODE"] == 21]["AB_BRDA"].iloc[0]
-    VTA_bus_model = vta[vta["MODE"] == 19]["AB_BRDA"].iloc[0] + vta[vta["MODE"] == 25]["AB_BRDA"].iloc[0] + vta[vta["MODE"] == 20]["AB_BRDA"].iloc[0]
-    model_muni_bus = muni[muni["Operator"] == "MUNI-Bus"]["Modeled"].iloc[0]
-    model_muni_cable = muni[muni["Operator"] == "MUNI-Cable"]["Modeled"].iloc[0]
-    model_muni_rail = muni[muni["Operator"] == "MUNI-Rail"]["Modeled"].iloc[0]
-    model_muni_street = muni[muni["Operator"] == "MUNI-Streetcar"]["Modeled"].iloc[0]
-    ac_trans = ac[ac["MODE"] == 22]["AB_BRDA"].mean()
-    ac_east = ac[ac["MODE"] == 18]["AB_BRDA"].mean()
-    model_GG_ferry = ferry[ferry["Ferry_name"] == "GGT-Ferry"]["AB_BRDA"].mean()
-    model_SF_Bay = ferry[ferry["Ferry_name"] == "SF Bay Ferry"]["AB_BRDA"].mean()
-    model_other_ferry = ferry[ferry["Ferry_name"] == "Other"]["AB_BRDA"].mean()
-
-
-    model_dic = {
-        "Operator": [
-            "GGT-Ferry",
-            "GGT-Bus",
-            "SCVTA-Bus",
-            "SCVTA-LRT",
-            "SF Bay Ferry (WETA)",
-            "MUNI-Bus",
-            "MUNI-Rail",
-            "MUNI-Cable",
-            "MUNI-Streetcar",
-            "AC Transbay",
-            "AC Eastbay",
-            "Ferry Other",
-        ],
-        "Modeled": [
-            model_GG_ferry,
-            GG_bus_model,
-            VTA_bus_model,
-            VTA_LR_model,
-            model_SF_Bay,
-            model_muni_bus,
-            model_muni_rail,
-            model_muni_cable,
-            model_muni_street,
-            ac_trans,
-            ac_east,
-            model_other_ferry,
-        ],
-    }
-    df_model_dic = pd.DataFrame(model_dic)
-    model_operator = read_dbf_and_groupby_sum(combined_gdf, None, ["SYSTEM"], "AB_BRDA")
-    model_operator = model_operator.groupby("SYSTEM")["AB_BRDA"].sum().reset_index()
+    ferry_df["Ferry_name"] = classify_unique(ferry_df["NAME"], ferry_rules or ferry_name_rules)
+    ferry = ferry_df.groupby(ferry_df["Ferry_name"].map(ferry_submode_mapping))["AB_BRDA"].sum()
+
+    # Submode totals all come from the one (SYSTEM, MODE) aggregation
+    submode = all_mode.groupby("Submode", observed=True)["AB_BRDA"].sum()
+    operator_rows = all_mode.loc[all_mode["Operator Row"].eq(True), "Submode"].unique()
+
+    df_model_dic = (
+        pd.concat([submode.drop(operator_rows), muni, ferry])
+        .reindex(submode_order)
+        .rename_axis("Operator")
+        .reset_index(name="Modeled")
+    )
+    model_operator = all_mode.groupby("SYSTEM")["AB_BRDA"].sum().reset_index()
     model_operator = model_operator.rename(
         columns={"SYSTEM": "Operator", "AB_BRDA": "Modeled"}
     )
@@ -231,12 +310,15 @@ def process_total_val(combined_gdf, output_dir, model_MUNI_Line):
     # Update the BART row
     model_operator.loc[model_operator["Operator"] == "BART", "Modeled"] = bart_update
     sol_row = pd.DataFrame({'Operator': ['SolTrans'], 'Modeled': [sol_update]})
-    marin_row = pd.DataFrame({'Operator': ['Marin Transit'], 'Modeled': [marin_model]})
-    model_operator = pd.concat([model_operator, sol_row,marin_row], ignore_index=True)
+    operator_submode_rows = (
+        submode.reindex(operator_rows).rename_axis("Operator").reset_index(name="Modeled")
+    )
+    operator_submode_rows["Operator"] = operator_submode_rows["Operator"].astype(str)
+    model_operator = pd.concat([model_operator, sol_row, operator_submode_rows], ignore_index=True)
     model_operator = model_operator[~model_operator["Operator"].isin(["EBART", "OAC", "Vallejo Transit", "Benicia"])].reset_index(drop=True)
     df_modeled = pd.concat([model_operator, df_model_dic])
     df_sf_ferry = pd.DataFrame(
-        {"Operator": ["SF Bay Ferry (WETA)"], "Modeled": [model_SF_Bay]}
+        {"Operator": ["SF Bay Ferry (WETA)"], "Modeled": [ferry.get("SF Bay Ferry (WETA)")]}
     )
     model_operator = pd.concat([model_operator, df_sf_ferry])
     model_operator["Operator"] = (
@@ -251,17 +333,24 @@ def process_valTotal_operator(
     observed_NTD,
     valTotal_Operator_md,
     valTotal_Operator,
-    model_MUNI_Line
+    model_MUNI_Line,
+    mode_lookup=None,
+    ferry_rules=None,
 ):
+    if mode_lookup is None:
+        mode_lookup = load_mode_lookup()
     observal_operator, obs_NTD_df = obs_ntd_table(transit_input_dir, observed_NTD)
     observal_operator["Operator"] = (
         observal_operator["Operator"].map(name_mapping).fillna(observal_operator["Operator"])
     )
-    gg_transit = read_dbf_and_groupby_sum(combined_gdf, "Golden Gate Transit", "MODE", "AB_BRDA")
-    df_modeled, model_operator = process_total_val(combined_gdf, output_dir, model_MUNI_Line)
+    all_mode = summarize_mode_ridership(combined_gdf, mode_lookup)
+    df_modeled, model_operator = process_total_val(
+        combined_gdf, output_dir, model_MUNI_Line, all_mode, ferry_rules
+    )
     df_operator = pd.merge(observal_operator, model_operator, on="Operator", how="outer")
     modeled_other_sum = df_operator[df_operator["Observed"].isna()]["Modeled"].sum()
-    modeled_other_sum = modeled_other_sum - gg_transit[gg_transit["MODE"] == 19]["AB_BRDA"].iloc[0]
+    # Operator-row submodes are also counted in their parent SYSTEM total
+    modeled_other_sum = modeled_other_sum - all_mode.loc[all_mode["Operator Row"].eq(True), "AB_BRDA"].sum()
 
     # Add a new row for "Other"
     new_row = {
@@ -310,8 +399,12 @@ def process_valTotal_Submode(
     valTotal_Submode_md,
     valTotal_Service_md,
     valTotal_Service,
-    model_MUNI_Line
+    model_MUNI_Line,
+    mode_lookup=None,
+    ferry_rules=None,
 ):
+    if mode_lookup is None:
+        mode_lookup = load_mode_lookup()
 
     df = pd.DataFrame(
         [
@@ -322,34 +415,18 @@ def process_valTotal_Submode(
         columns=["Service Type", "Operator"],
     )
 
-    mapping_data = {
-        "Mode Number": [11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 31, 32],
-        "Mode": [
-            "Local Muni", "Express Muni", "BRT Muni", "Muni Cable Car", "LRT Muni", 
-            "Free and Open Shuttles", "SamTrans Local", "AC Local", "Other Local MTC Buses", 
-            "Regional BRT", "VTA LRT", "AC Transbay Buses", "Golden Gate Bus", "Sam Trans Express Bus", 
-            "Other Premium Bus", "Caltrain", "SMART", "eBART", "Regional Rail/ACE/AMTRAK", 
-            "HSR", "Ferry", "BART"
-        ],
-        "Service Type": [
-            "Local Bus", "Local Bus", "Local Bus", "Light Rail", "Light Rail", 
-            "Local Bus", "Local Bus", "Local Bus", "Local Bus", 
-            "Local Bus", "Light Rail", "Premium", "Premium", "Premium", 
-            "Premium", "Premium", "Premium", "BART", 
-            "Premium", "Premium", "Ferry", "BART"
-        ]
-    }
-
-    mapping_df = pd.DataFrame(mapping_data)
-    
-    all_mode = read_dbf_and_groupby_sum(combined_gdf, None, ["SYSTEM","MODE"], "AB_BRDA")
-    all_mode = all_mode.groupby(["SYSTEM","MODE"])["AB_BRDA"].sum().reset_index()
-    all_mode = all_mode.rename(columns={"MODE": "Operator", "AB_BRDA": "Modeled"})
-    all_mode["Mode"] = all_mode["Operator"].map(mapping_df.set_index("Mode Number")["Mode"])
-    all_mode["Service Type"] = all_mode["Operator"].map(mapping_df.set_index("Mode Number")["Service Type"])
-    model_service_type = all_mode.groupby("Service Type")["Modeled"].sum().reset_index()
+    all_mode = summarize_mode_ridership(combined_gdf, mode_lookup)
+    model_service_type = (
+        all_mode.groupby("Service Type", observed=True)["AB_BRDA"]
+        .sum()
+        .reset_index()
+        .rename(columns={"AB_BRDA": "Modeled"})
+    )
+    model_service_type["Service Type"] = model_service_type["Service Type"].astype(str)
     df_filtered = calcualte_weekday_upt(transit_input_dir, observed_NTD)
-    df_modeled, model_operator = process_total_val(combined_gdf, output_dir, model_MUNI_Line)
+    df_modeled, model_operator = process_total_val(
+        combined_gdf, output_dir, model_MUNI_Line, all_mode, ferry_rules
+    )
     df_filtered["Operator"] = (
         df_filtered["Operator"].map(name_mapping).fillna(df_filtered["Operator"])
     )
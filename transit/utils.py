@@ -1,7 +1,10 @@
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+from transit.engine import active_backend, compare_results, engine
+from transit.schema import compact_dtypes, concat_compact, wide_dtypes
 
 time_periods = ["EA", "AM", "MD", "PM", "EV"]
 
@@ -9,27 +12,30 @@ def transit_assignment_filepaths(model_run_dir, time_periods):
     return {t: Path(model_run_dir) / f"SFALLMSA{t}.DBF" for t in time_periods}
 
 
-def read_transit_assignments(model_run_dir, time_periods):
-    """Reads the DBF files for each time period using Geopandas and concatenates them."""
-    filepaths = transit_assignment_filepaths(model_run_dir, time_periods)
+def read_transit_assignment(filepath, period):
+    """Reads the DBF file of one time period, adds its 'TOD' column and compacts its dtypes."""
+    # Read the DBF file using geopandas
+    gdf = gpd.read_file(str(filepath))
 
-    # List to store all GeoDataFrames
-    gdf_list = []
+    # Add a new column 'TOD' to represent the time period
+    gdf["TOD"] = period
+    compact_dtypes(gdf)
 
-    for period, filepath in filepaths.items():
-            # Read the DBF file using geopandas
-            gdf = gpd.read_file(str(filepath))
+    print(f"Successfully read and added 'TOD' to: {filepath}")
+    return gdf
 
-            # Add a new column 'TOD' to represent the time period
-            gdf["TOD"] = period
 
-            # Append to the list
-            gdf_list.append(gdf)
+def read_transit_assignments(model_run_dir, time_periods):
+    """Reads the DBF files for each time period using Geopandas and concatenates them."""
+    filepaths = transit_assignment_filepaths(model_run_dir, time_periods)
 
-            print(f"Successfully read and added 'TOD' to: {filepath}")
+    # List to store all GeoDataFrames
+    gdf_list = [
+        read_transit_assignment(filepath, period) for period, filepath in filepaths.items()
+    ]
     
     # Concatenate all GeoDataFrames in the list into a single DataFrame
-    combined_gdf = pd.concat(gdf_list, ignore_index=True)
+    combined_gdf = concat_compact(gdf_list)
     
     return combined_gdf
 
@@ -48,15 +54,102 @@ def read_dbf_and_groupby_sum(dbf_file, system_filter, groupby_columns, sum_colum
     Returns:
     DataFrame: Pandas DataFrame with the groupby and sum applied.
     """
+    backend = active_backend()
+    if backend is not None:
+        result = wide_dtypes(
+            backend.groupby_sum(dbf_file, system_filter, groupby_columns, sum_column)
+        )
+        if not engine["compare"]:
+            return result
     if system_filter is not None:
         dbf_file = dbf_file[dbf_file["SYSTEM"] == system_filter]  # filter on SYSTEM columns
     # group by `groupby_columns` and sum `sum_column`
-    grouped_sum = dbf_file.groupby(groupby_columns)[sum_column].sum()
-    # reset index to convert it back to a DataFrame
-    grouped_sum_df = grouped_sum.reset_index()
+    grouped_sum = dbf_file.groupby(groupby_columns, observed=True)[sum_column].sum()
+    # reset index to convert it back to a DataFrame, with the compact dtypes widened back
+    grouped_sum_df = wide_dtypes(grouped_sum.reset_index())
+    if backend is not None:
+        compare_results(result, grouped_sum_df, f"{system_filter} {sum_column} by {groupby_columns}")
     return grouped_sum_df
 
 
+def rule_classifier(rule_table):
+    """
+    Build a classifier from a rule table, e.g. as read from the config:
+
+        default = "Local Bus"
+        rules = [
+            { value = "Rail", in = ["J-Church", "N-Judah"] },
+            { value = "Rapid", contains = "R", not_in = ["94R"] },
+        ]
+
+    The first rule whose conditions all hold gives the class, otherwise `default`.
+    Conditions are `in`/`not_in` (the value is / is not in the list) and
+    `contains`/`startswith`/`endswith` (the value as a string matches any of the
+    given strings).
+
+    Parameters:
+    rule_table (dict): The "rules" list and optional "default" value.
+
+    Returns:
+    function: The classifier for a single value.
+    """
+    rules = rule_table.get("rules", [])
+    default = rule_table.get("default")
+
+    def as_tuple(patterns):
+        return (patterns,) if isinstance(patterns, str) else tuple(patterns)
+
+    def matches(rule, value):
+        text = str(value)
+        if "in" in rule and value not in rule["in"]:
+            return False
+        if "not_in" in rule and value in rule["not_in"]:
+            return False
+        if "contains" in rule and not any(p in text for p in as_tuple(rule["contains"])):
+            return False
+        if "startswith" in rule and not text.startswith(as_tuple(rule["startswith"])):
+            return False
+        if "endswith" in rule and not text.endswith(as_tuple(rule["endswith"])):
+            return False
+        return True
+
+    def classify(value):
+        for rule in rules:
+            if matches(rule, value):
+                return rule["value"]
+        return default
+
+    return classify
+
+
+def classify_unique(values, classifier):
+    """
+    Classify a column by evaluating the classifier once per distinct value and
+    broadcasting the results back to the rows.
+
+    Parameters:
+    values (Series): The values to classify.
+    classifier (function or dict): A function of one value, or a rule table (see `rule_classifier`).
+
+    Returns:
+    Series: The class of each value, aligned with `values`.
+    """
+    if not callable(classifier):
+        classifier = rule_classifier(classifier)
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    classes = np.empty(len(uniques), dtype=object)
+    classes[:] = [classifier(value) for value in uniques]
+    return pd.Series(classes[codes], index=values.index)
+
+
+
+def parse_formatted_number(values):
+    """Convert `format_numeric`/`format_percentage` strings ("1,234", "-5%") back to numbers."""
+    return pd.to_numeric(
+        values.astype(str).str.replace(",", "").str.rstrip("%"), errors="coerce"
+    )
+
+
 def dataframe_to_markdown(
     df,
     file_name="dataframe_table.md",